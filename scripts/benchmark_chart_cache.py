@@ -0,0 +1,86 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Compares the chart data cache serializers
+
+Times encoding and decoding of a synthetic chart dataframe and reports the
+number of bytes that would be stored in the cache, e.g.:
+
+    python scripts/benchmark_chart_cache.py --rows 200000
+"""
+import argparse
+from timeit import default_timer
+
+import numpy as np
+import pandas as pd
+
+from superset.utils.chart_cache import (
+    ArrowChartCacheSerializer,
+    ParquetChartCacheSerializer,
+    PickleChartCacheSerializer,
+)
+
+SERIALIZERS = [
+    ("pickle", PickleChartCacheSerializer()),
+    ("arrow", ArrowChartCacheSerializer()),
+    ("arrow+lz4", ArrowChartCacheSerializer(compression="lz4")),
+    ("arrow+zstd", ArrowChartCacheSerializer(compression="zstd")),
+    ("parquet", ParquetChartCacheSerializer()),
+    ("parquet+zstd", ParquetChartCacheSerializer(compression="zstd")),
+]
+
+
+def make_cache_value(rows):
+    rng = np.random.RandomState(42)
+    df = pd.DataFrame(
+        {
+            "__timestamp": pd.date_range("2019-01-01", periods=rows, freq="min"),
+            "name": rng.choice(["Aaron", "Abigail", "Adam", "Alex"], rows),
+            "state": rng.choice(["CA", "NY", "TX", "other"], rows),
+            "num": rng.randint(0, 10 ** 6, rows),
+            "sum__num": rng.rand(rows) * 1000,
+        }
+    )
+    return {"dttm": "2019-01-01T00:00:00", "df": df, "query": "SELECT ..."}
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = default_timer()
+        func()
+        timings.append(default_timer() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    cache_value = make_cache_value(args.rows)
+    print(f"{args.rows} rows, best of {args.repeat}")
+    print(f"{'serializer':<14}{'encode (ms)':>12}{'decode (ms)':>12}{'bytes':>14}")
+    for name, serializer in SERIALIZERS:
+        blob = serializer.dumps(cache_value)
+        encode = best_of(lambda: serializer.dumps(cache_value), args.repeat)
+        decode = best_of(lambda: serializer.loads(blob), args.repeat)
+        print(f"{name:<14}{encode * 1000:>12.1f}{decode * 1000:>12.1f}{len(blob):>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Times the post processing of two phase Druid queries
+
+Compares the row by row construction of the phase two filter and of the
+timestamp offsets with the vectorized one, e.g.:
+
+    python scripts/benchmark_druid_two_phase.py --rows 5000
+"""
+import argparse
+from datetime import timedelta
+from timeit import default_timer
+
+import numpy as np
+import pandas as pd
+from pydruid.utils.filters import Dimension, Filter
+
+from superset.connectors.druid.models import DRUID_TZ, DruidDatasource
+from superset.utils import core as utils
+
+
+def row_by_row_filter(df, dimensions):
+    new_filters = []
+    for unused, row in df.iterrows():
+        fields = [Dimension(dim) == row[dim] for dim in dimensions]
+        if len(fields) > 1:
+            new_filters.append(Filter(type="and", fields=fields))
+        else:
+            new_filters.append(fields[0])
+    return Filter(type="or", fields=new_filters)
+
+
+def row_by_row_timestamps(timestamps, time_offset):
+    def increment_timestamp(ts):
+        dt = utils.parse_human_datetime(ts).replace(tzinfo=DRUID_TZ)
+        return dt + timedelta(milliseconds=time_offset)
+
+    return timestamps.apply(increment_timestamp)
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = default_timer()
+        func()
+        timings.append(default_timer() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.RandomState(42)
+    df = pd.DataFrame(
+        {
+            "name": [f"name_{i}" for i in range(args.rows)],
+            "state": rng.choice(["CA", "NY", "TX", "other"], args.rows),
+            "count": rng.randint(0, 10 ** 6, args.rows),
+        }
+    )
+    timestamps = pd.Series(
+        pd.date_range("2019-01-05", periods=args.rows, freq="H").strftime(
+            "%Y-%m-%dT%H:%M:%S.000Z"
+        )
+    )
+    time_offset = DruidDatasource.time_offset("week_ending_saturday")
+    ds = DruidDatasource(datasource_name="benchmark")
+
+    cases = [
+        (
+            "filter, 1 dimension",
+            lambda: row_by_row_filter(df, ["name"]),
+            lambda: ds._add_filter_from_pre_query_data(df, ["name"], None),
+        ),
+        (
+            "filter, 2 dimensions",
+            lambda: row_by_row_filter(df, ["name", "state"]),
+            lambda: ds._add_filter_from_pre_query_data(df, ["name", "state"], None),
+        ),
+        (
+            "timestamp offset",
+            lambda: row_by_row_timestamps(timestamps, time_offset),
+            lambda: DruidDatasource.increment_timestamps(timestamps, time_offset),
+        ),
+    ]
+    print(f"{args.rows} rows, best of {args.repeat}")
+    print(f"{'case':<22}{'row by row (ms)':>18}{'vectorized (ms)':>18}")
+    for name, row_by_row, vectorized in cases:
+        before = best_of(row_by_row, args.repeat)
+        after = best_of(vectorized, args.repeat)
+        print(f"{name:<22}{before * 1000:>18.1f}{after * 1000:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
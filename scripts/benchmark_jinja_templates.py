@@ -0,0 +1,97 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Times the rendering of SQL templates with and without the template cache
+
+Compares a sandboxed environment created and a template compiled on each
+render, as the template processors used to do, with the shared environment
+and its compiled templates, e.g.:
+
+    python scripts/benchmark_jinja_templates.py --sql-file my_dataset.sql
+
+Without ``--sql-file`` a synthetic template of ``--blocks`` templated
+conditions is used.
+"""
+import argparse
+from timeit import default_timer
+
+from jinja2.sandbox import SandboxedEnvironment
+
+from superset import app, jinja_context
+
+
+def make_sql(blocks):
+    parts = []
+    for i in range(blocks):
+        parts.append(
+            f"""{{% if '{i}' in filter_values('column_{i}') %}}
+  AND column_{i} IN ({{{{ "'" + "', '".join(filter_values('column_{i}')) + "'" }}}})
+{{% else %}}
+  AND ds >= '{{{{ (datetime(2019, 1, 1) - timedelta(days={i})).date() }}}}'
+{{% endif %}}"""
+        )
+    return "SELECT * FROM warehouse.fact_orders\nWHERE 1 = 1\n" + "\n".join(parts)
+
+
+def render_uncached(tp, sql):
+    # what process_template did before the template cache
+    template = SandboxedEnvironment().from_string(sql)
+    return template.render(tp.context)
+
+
+def render_cached(tp, sql):
+    return tp.process_template(sql)
+
+
+def best_of(render, sql, repeat, renders):
+    timings = []
+    for _ in range(repeat):
+        jinja_context.template_cache.clear()
+        start = default_timer()
+        for _ in range(renders):
+            tp = jinja_context.BaseTemplateProcessor()
+            render(tp, sql)
+        timings.append(default_timer() - start)
+    return min(timings) / renders
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sql-file")
+    parser.add_argument("--blocks", type=int, default=20)
+    parser.add_argument("--renders", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.sql_file:
+        with open(args.sql_file) as f:
+            sql = f.read()
+    else:
+        sql = make_sql(args.blocks)
+
+    with app.test_request_context():
+        tp = jinja_context.BaseTemplateProcessor()
+        assert render_uncached(tp, sql) == render_cached(tp, sql)
+        uncached = best_of(render_uncached, sql, args.repeat, args.renders)
+        cached = best_of(render_cached, sql, args.repeat, args.renders)
+
+    print(f"{len(sql)} chars of SQL, {args.renders} renders, best of {args.repeat}")
+    print(f"uncached: {uncached * 1000:.2f} ms per render")
+    print(f"cached:   {cached * 1000:.2f} ms per render")
+
+
+if __name__ == "__main__":
+    main()
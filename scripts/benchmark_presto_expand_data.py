@@ -0,0 +1,138 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Times the expansion of nested Presto results
+
+Compares ``PrestoEngineSpec.expand_data`` with the implementation that
+inserted the unnested rows in place, on synthetic rows holding nested ROW and
+ARRAY columns, and checks that both return the same result, e.g.:
+
+    python scripts/benchmark_presto_expand_data.py --rows 10000 100000
+
+The in place implementation is quadratic, it's skipped above
+``--legacy-max-rows``.
+"""
+import argparse
+from collections import defaultdict, deque
+import copy
+import random
+from timeit import default_timer
+
+from superset import _feature_flags
+from superset.db_engine_specs.presto import get_children, PrestoEngineSpec
+
+COLUMNS = [
+    {"name": "id", "type": "BIGINT"},
+    {"name": "user", "type": "ROW(NAME VARCHAR, ADDRESS ROW(CITY VARCHAR))"},
+    {
+        "name": "orders",
+        "type": "ARRAY(ROW(ITEMS ARRAY(ROW(SKU VARCHAR, QTY BIGINT)), TOTAL DOUBLE))",
+    },
+]
+
+
+def legacy_expand_data(columns, data):
+    to_process = deque((column, 0) for column in columns)
+    all_columns = []
+    expanded_columns = []
+    current_array_level = None
+    while to_process:
+        column, level = to_process.popleft()
+        if column["name"] not in [column["name"] for column in all_columns]:
+            all_columns.append(column)
+        if level != current_array_level:
+            unnested_rows = defaultdict(int)
+            current_array_level = level
+        name = column["name"]
+        if column["type"].startswith("ARRAY("):
+            to_process.append((get_children(column)[0], level + 1))
+            i = 0
+            while i < len(data):
+                row = data[i]
+                values = row.get(name)
+                if values:
+                    extra_rows = len(values) - 1
+                    current_unnested_rows = unnested_rows[i]
+                    missing = extra_rows - current_unnested_rows
+                    for _ in range(missing):
+                        data.insert(i + current_unnested_rows + 1, {})
+                        unnested_rows[i] += 1
+                    for j, value in enumerate(values):
+                        data[i + j][name] = value
+                    i += unnested_rows[i]
+                i += 1
+        if column["type"].startswith("ROW("):
+            expanded = get_children(column)
+            to_process.extendleft((column, level) for column in expanded)
+            expanded_columns.extend(expanded)
+            for row in data:
+                for value, col in zip(row.get(name) or [], expanded):
+                    row[col["name"]] = value
+    data = [{k["name"]: row.get(k["name"], "") for k in all_columns} for row in data]
+    return all_columns, data, expanded_columns
+
+
+def make_rows(count, rng):
+    rows = []
+    for i in range(count):
+        orders = [
+            [
+                [[f"sku_{rng.randint(0, 999)}", rng.randint(1, 5)]]
+                * rng.randint(0, 4),
+                rng.random() * 100,
+            ]
+            for _ in range(rng.randint(0, 3))
+        ]
+        rows.append(
+            {
+                "id": i,
+                "user": [f"user_{i}", [f"city_{i % 50}"]],
+                "orders": orders or None,
+            }
+        )
+    return rows
+
+
+def timed(func, columns, rows):
+    # both implementations modify the rows they're given
+    columns, rows = copy.deepcopy(columns), copy.deepcopy(rows)
+    start = default_timer()
+    result = func(columns, rows)
+    return default_timer() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--legacy-max-rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    _feature_flags["PRESTO_EXPAND_DATA"] = True
+    rng = random.Random(42)
+    print(f"{'rows':>8}{'expanded':>10}{'in place (s)':>15}{'grouped (s)':>15}")
+    for count in args.rows:
+        rows = make_rows(count, rng)
+        after, result = timed(PrestoEngineSpec.expand_data, COLUMNS, rows)
+        before = "skipped"
+        if count <= args.legacy_max_rows:
+            seconds, legacy_result = timed(legacy_expand_data, COLUMNS, rows)
+            assert legacy_result == result, "the expanded data differs"
+            before = f"{seconds:.2f}"
+        print(f"{count:>8}{len(result[1]):>10}{before:>15}{after:>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
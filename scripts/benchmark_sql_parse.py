@@ -0,0 +1,101 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Times the parsing of virtual dataset SQL with and without the parse cache
+
+Runs the sqlparse calls a chart query and a SQL Lab query make on the same
+SQL: the table extraction of the security checks, the statement split, the
+limit and the formatting of the FROM clause, e.g.:
+
+    python scripts/benchmark_sql_parse.py --sql-file my_dataset.sql
+
+Without ``--sql-file`` a synthetic query of ``--ctes`` common table
+expressions is used.
+"""
+import argparse
+from timeit import default_timer
+
+from superset import sql_parse
+
+
+def make_sql(ctes):
+    parts = []
+    for i in range(ctes):
+        parts.append(
+            f"""cte_{i} AS (
+    SELECT a.id, a.ds, b.name AS name_{i}, SUM(a.amount) AS amount_{i}
+    FROM warehouse.fact_orders_{i} a
+    JOIN warehouse.dim_customers b ON a.customer_id = b.id
+    WHERE a.ds >= '2019-01-01' AND b.country IN ('ID', 'SG', 'MY', 'TH')
+    GROUP BY a.id, a.ds, b.name
+)"""
+        )
+    joins = "\n".join(
+        f"LEFT JOIN cte_{i} ON cte_{i}.id = cte_0.id" for i in range(1, ctes)
+    )
+    return f"WITH {', '.join(parts)}\nSELECT * FROM cte_0\n{joins}\nLIMIT 1000"
+
+
+def request(sql):
+    # what a request does with the SQL, see sql_lab, security and connectors
+    query = sql_parse.ParsedQuery(sql)
+    query.tables
+    query.get_statements()
+    query.get_query_with_new_limit(100)
+    sql_parse.ParsedQuery(sql).is_select()
+    sql_parse.parse(sql)
+    sql_parse.format_sql(sql, strip_comments=True)
+
+
+def best_of(sql, repeat, requests):
+    timings = []
+    for _ in range(repeat):
+        sql_parse.parse_cache.clear()
+        sql_parse.format_cache.clear()
+        start = default_timer()
+        for _ in range(requests):
+            request(sql)
+        timings.append(default_timer() - start)
+    return min(timings) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sql-file")
+    parser.add_argument("--ctes", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.sql_file:
+        with open(args.sql_file) as f:
+            sql = f.read()
+    else:
+        sql = make_sql(args.ctes)
+
+    maxsize = sql_parse.parse_cache.maxsize
+    sql_parse.parse_cache.maxsize = sql_parse.format_cache.maxsize = 0
+    uncached = best_of(sql, args.repeat, args.requests)
+    sql_parse.parse_cache.maxsize = sql_parse.format_cache.maxsize = maxsize or 128
+    cached = best_of(sql, args.repeat, args.requests)
+
+    print(f"{len(sql)} chars of SQL, {args.requests} requests, best of {args.repeat}")
+    print(f"uncached: {uncached * 1000:.1f} ms per request")
+    print(f"cached:   {cached * 1000:.1f} ms per request")
+
+
+if __name__ == "__main__":
+    main()
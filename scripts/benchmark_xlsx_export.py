@@ -0,0 +1,102 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Times the xlsx export of charts
+
+Compares the column width estimation and the xlsx writer against the former
+cell by cell loop and ``DataFrame.to_excel``, and reports the peak memory
+allocated by each writer, e.g.:
+
+    python scripts/benchmark_xlsx_export.py --rows 10000 100000 1000000
+"""
+import argparse
+from io import BytesIO
+from timeit import default_timer
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from superset.viz import BaseViz
+
+
+def make_df(rows):
+    rng = np.random.RandomState(42)
+    return pd.DataFrame(
+        {
+            "__timestamp": pd.date_range("2019-01-01", periods=rows, freq="min"),
+            "name": rng.choice(["Aaron", "Abigail", "Adam", "Alexandra"], rows),
+            "state": rng.choice(["CA", "NY", "TX", None], rows),
+            "num": rng.randint(0, 10 ** 6, rows),
+            "sum__num": rng.rand(rows) * 1000,
+        }
+    )
+
+
+def legacy_width_col(col, dataframe):
+    max_width = len(col)
+    row_c = 2
+    while row_c < len(dataframe):
+        if dataframe[col][row_c] is not None:
+            max_width = max(max_width, len(str(dataframe[col][row_c])))
+        row_c *= 4
+    return min(max_width, 100)
+
+
+def legacy_xlsx(df):
+    output = BytesIO()
+    writer = pd.ExcelWriter(output, engine="xlsxwriter")
+    df.to_excel(writer, index=False, merge_cells=False)
+    worksheet = writer.sheets["Sheet1"]
+    for index, col in enumerate(df.columns):
+        worksheet.set_column(index, index, legacy_width_col(col, df) + 2)
+    writer.close()
+    return output
+
+
+def measure(func):
+    tracemalloc.start()
+    start = default_timer()
+    func()
+    elapsed = default_timer() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+
+    # the export methods don't depend on the datasource, skip setting one up
+    viz = BaseViz.__new__(BaseViz)
+    print(f"{'rows':>9} {'step':<14} {'seconds':>9} {'peak MB':>9}")
+    for rows in args.rows:
+        df = make_df(rows)
+        steps = [
+            ("widths", lambda: viz.get_max_widths(df)),
+            ("legacy widths", lambda: [legacy_width_col(c, df) for c in df.columns]),
+            ("xlsx", lambda: viz.write_xlsx(df).close()),
+            ("legacy xlsx", lambda: legacy_xlsx(df)),
+        ]
+        for name, func in steps:
+            elapsed, peak = measure(func)
+            print(f"{rows:>9} {name:<14} {elapsed:>9.3f} {peak / 2 ** 20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
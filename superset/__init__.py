@@ -33,8 +33,14 @@ import wtforms_json
 from superset import config
 from superset.connectors.connector_registry import ConnectorRegistry
 from superset.security import SupersetSecurityManager
-from superset.utils.core import pessimistic_connection_handling, setup_cache
+from superset.utils.chart_cache import ChartDataCache
+from superset.utils.core import (
+    is_shared_cache,
+    pessimistic_connection_handling,
+    setup_cache,
+)
 from superset.utils.log import DBEventLogger, get_event_logger_from_cfg_value
+from superset.utils.versioned_cache import VersionedCache
 
 wtforms_json.init()
 
@@ -126,6 +132,28 @@ pessimistic_connection_handling(db.engine)
 
 cache = setup_cache(app, conf.get("CACHE_CONFIG"))
 tables_cache = setup_cache(app, conf.get("TABLE_NAMES_CACHE_CONFIG"))
+chart_data_cache = ChartDataCache(
+    cache,
+    conf.get("CHART_CACHE_SERIALIZER"),
+    conf.get("STATS_LOGGER"),
+    stale_timeout=conf.get("CHART_CACHE_STALE_TIMEOUT"),
+    lock_timeout=conf.get("CHART_CACHE_LOCK_TIMEOUT"),
+    lock_wait=conf.get("CHART_CACHE_LOCK_WAIT"),
+)
+# the cache, if other processes see what this one writes into it
+shared_cache = cache if is_shared_cache(conf.get("CACHE_CONFIG")) else None
+bootstrap_cache = VersionedCache(
+    shared_cache,
+    conf.get("STATS_LOGGER"),
+    timeout=conf.get("DASHBOARD_CACHE_TIMEOUT"),
+    prefix="bootstrap",
+)
+partition_cache = VersionedCache(
+    cache,
+    conf.get("STATS_LOGGER"),
+    timeout=conf.get("LATEST_PARTITION_CACHE_TIMEOUT"),
+    prefix="partition",
+)
 
 migrate = Migrate(app, db, directory=APP_DIR + "/migrations")
 
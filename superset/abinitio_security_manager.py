@@ -1,6 +1,3 @@
-from cgi import print_arguments
-from pickle import TRUE
-from unittest import result
 from flask import g, redirect, flash, session
 from flask_appbuilder._compat import as_unicode
 from flask_appbuilder.api import expose
@@ -12,8 +9,13 @@ import sqlalchemy
 from superset import config
 from superset.security import SupersetSecurityManager
 import requests
+from requests.adapters import HTTPAdapter
 import base64
+import hashlib
+import hmac
 import logging
+import threading
+import time
 from urllib.parse import urlencode
 from xml.etree import ElementTree
 
@@ -21,9 +23,10 @@ from xml.etree import ElementTree
 class AbinitioAuthView(AuthDBView):
     LOGIN_FAILED_AT_GATEWAY = "Login failed at gateway, please retry after some time."
 
-    def __init__(self):
-        super(AbinitioAuthView, self).__init__()
-        self.auth_gateway = AbinitioAuthGateway(config.ABINITIO_GATEWAY_CONFIG)
+    @property
+    def auth_gateway(self):
+        # shared with the security manager, along with its connection pool and role cache
+        return self.appbuilder.sm.abinitio_gateway
 
     @expose("/login/", methods=["GET", "POST"])
     def login(self):
@@ -53,7 +56,7 @@ class AbinitioAuthView(AuthDBView):
                         email=username + '@email.notfound',
                         role=self.appbuilder.sm.find_role(roles[0]),
                     )
-                    SliceUserView(username).insert_user_in_slice_n_dashboard()
+                    sync_slice_n_dashboard_user(username, member=True)
                 else:
                     #User exist but is inactive, then activate it
                     if not user.is_active:
@@ -65,10 +68,10 @@ class AbinitioAuthView(AuthDBView):
                         user.roles = [self.appbuilder.sm.find_role(roles[0])]
                         self.appbuilder.sm.update_user(user)
 
-                        if(str(user.roles[0]) == 'IOU_Admin'):
-                            SliceUserView(username).delete_user_in_slice_n_dashboard()
-                        elif(roles[0] == 'IOU_Admin'):
-                            SliceUserView(username).insert_user_in_slice_n_dashboard()
+                        if(str(user.roles[0]) == MEMBERSHIP_EXCLUDED_ROLE):
+                            sync_slice_n_dashboard_user(username, member=False)
+                        elif(roles[0] == MEMBERSHIP_EXCLUDED_ROLE):
+                            sync_slice_n_dashboard_user(username, member=True)
                     
             if not user:
                 #User not in AG but is presernt in IOU - deactivate user
@@ -89,9 +92,54 @@ class AbinitioAuthView(AuthDBView):
         )
 
 
+class RoleCache:
+    """
+    Short lived, in process, cache of the roles returned by the gateway, keyed by user.
+    Entries also hold a digest of the password they were fetched with, so that a wrong password never
+    gets a hit.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _digest(self, username, password):
+        return hmac.new(
+            config.SECRET_KEY.encode('utf-8'), "{}:{}".format(username, password).encode('utf-8'), hashlib.sha256
+        ).hexdigest()
+
+    def get(self, username, password):
+        with self._lock:
+            entry = self._entries.get(username)
+        if not entry:
+            return None
+        digest, roles, expires_at = entry
+        if expires_at < time.time() or not hmac.compare_digest(digest, self._digest(username, password)):
+            return None
+        return roles
+
+    def set(self, username, password, roles):
+        entry = (self._digest(username, password), roles, time.time() + self.ttl)
+        with self._lock:
+            self._entries[username] = entry
+
+    def invalidate(self, username):
+        with self._lock:
+            self._entries.pop(username, None)
+
+
 class AbinitioAuthGateway:
     def __init__(self, gateway_config):
         self.gateway_config = gateway_config
+        self.timeout = (gateway_config.get("connect_timeout", 3), gateway_config.get("read_timeout", 10))
+        self.role_cache = RoleCache(gateway_config.get("role_cache_ttl", 60))
+
+        # keep alive connections to the gateway, shared by all the requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=gateway_config.get("pool_size", 10))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
     def get_product_id(self, product_name):
         return product_name.replace(" ", "")
@@ -108,19 +156,36 @@ class AbinitioAuthGateway:
             "productName": self.gateway_config["product_name"]
         }
         encoded_params = urlencode(params)
-        resp = requests.get("http://{}:{}{}{}?{}".format(
+        resp = self.session.get("http://{}:{}{}{}?{}".format(
                 self.gateway_config["host"],
                 self.gateway_config["port"],
                 self.gateway_config["root_path"],
                 self.gateway_config["register_product_path"],
                 encoded_params
             ),
-            headers={"Authorization": auth})
+            headers={"Authorization": auth},
+            timeout=self.timeout)
         if resp.status_code != 200:
             raise Exception('Failed auth call register_product {}'.format(resp.status_code))
         return True
 
     def get_user_roles(self, username, password):
+        """
+        Returns the roles of the user, from the cache when the same credentials were checked less than
+        role_cache_ttl seconds ago. Users without roles aren't cached, so that newly granted users get in
+        right away.
+        """
+        roles = self.role_cache.get(username, password)
+        if roles is None:
+            roles = self.fetch_user_roles(username, password)
+            if roles:
+                self.role_cache.set(username, password, roles)
+        return roles
+
+    def invalidate_user_roles(self, username):
+        self.role_cache.invalidate(username)
+
+    def fetch_user_roles(self, username, password):
         auth = self.get_auth_header(username, password)
         params = {
             "userName": username,
@@ -134,9 +199,10 @@ class AbinitioAuthGateway:
                 self.gateway_config["get_user_roles_path"],
                 encoded_params
             )
-        resp = requests.get(
+        resp = self.session.get(
             url,
-            headers={"Authorization": auth, "content-type": "text/xml"})
+            headers={"Authorization": auth, "content-type": "text/xml"},
+            timeout=self.timeout)
         if resp.status_code != 200:
             raise Exception('Failed auth call get_user_roles {}'.format(resp.status_code))
         parsed_resp = ElementTree.fromstring(resp.content)
@@ -160,7 +226,7 @@ class AbinitioAuthGateway:
             "productName": self.gateway_config["product_name"]
         }
         encoded_params = urlencode(params)
-        resp = requests.post("http://{}:{}{}{}?{}".format(
+        resp = self.session.post("http://{}:{}{}{}?{}".format(
                 self.gateway_config["host"],
                 self.gateway_config["port"],
                 self.gateway_config["root_path"],
@@ -168,7 +234,8 @@ class AbinitioAuthGateway:
                 encoded_params
             ),
             headers={"Authorization": auth, "content-type": "text/xml"},
-            data=roles_payload)
+            data=roles_payload,
+            timeout=self.timeout)
         if resp.status_code != 200:
             raise Exception('Failed auth call post_user_roles {}'.format(resp.status_code))
         return True
@@ -182,60 +249,143 @@ class AbinitioSecurityManager(SupersetSecurityManager):
         self.gateway_config = config.ABINITIO_GATEWAY_CONFIG
         self.abinitio_gateway = AbinitioAuthGateway(self.gateway_config)
 
+    def update_user(self, user):
+        # the cached gateway roles may no longer match the user's
+        self.abinitio_gateway.invalidate_user_roles(user.username)
+        return super(AbinitioSecurityManager, self).update_user(user)
+
+
+# new users are members of every slice and dashboard, users switched to this role are removed from all of them
+MEMBERSHIP_EXCLUDED_ROLE = 'IOU_Admin'
+
+
+def _membership_tables():
+    # imported here as this module gets imported by the config, before the models
+    from superset.models.core import dashboard_user, slice_user
+    return ((slice_user, 'slice_id'), (dashboard_user, 'dashboard_id'))
+
+
+def _excluded_user_ids():
+    from superset import security_manager
+    user_role = security_manager.user_model.roles.property.secondary
+    role = security_manager.role_model.__table__
+    return sqlalchemy.select([user_role.c.user_id]) \
+        .select_from(user_role.join(role, role.c.id == user_role.c.role_id)) \
+        .where(role.c.name == MEMBERSHIP_EXCLUDED_ROLE)
+
+
+def insert_memberships(conn, users):
+    """
+    Makes the users (a selectable with an `id` column) members of every slice and dashboard, skipping the
+    memberships that already exist, so it's safe to run any number of times:
+
+      INSERT INTO slice_user (user_id, slice_id)
+      SELECT users.id, objects.slice_id
+      FROM users, (SELECT DISTINCT slice_id FROM slice_user) AS objects
+      WHERE NOT EXISTS (
+        SELECT * FROM slice_user AS existing
+        WHERE existing.user_id = users.id AND existing.slice_id = objects.slice_id
+      );
+
+    and likewise for dashboard_user. Returns the number of inserted rows.
+    """
+    inserted = 0
+    for table, column in _membership_tables():
+        objects = sqlalchemy.select([table.c[column].distinct().label(column)]).alias('objects')
+        existing = table.alias('existing')
+        query = sqlalchemy.select([users.c.id.label('user_id'), objects.c[column]]).where(
+            ~sqlalchemy.exists().where(sqlalchemy.and_(
+                existing.c.user_id == users.c.id, existing.c[column] == objects.c[column])))
+        inserted += conn.execute(table.insert().from_select(['user_id', column], query)).rowcount
+    return inserted
+
+
+def delete_memberships(conn, user_ids):
+    """
+    Removes the users (a select of user ids) from every slice and dashboard. Returns the number of deleted rows.
+    """
+    deleted = 0
+    for table, _ in _membership_tables():
+        deleted += conn.execute(sqlalchemy.delete(table).where(table.c.user_id.in_(user_ids))).rowcount
+    return deleted
+
+
+def delete_duplicate_memberships(conn):
+    """
+    Keeps only the oldest of identical memberships:
+
+      DELETE FROM slice_user WHERE id NOT IN (
+        SELECT id FROM (SELECT MIN(id) AS id FROM slice_user GROUP BY user_id, slice_id) AS keep
+      );
+
+    the extra derived table is required by MySQL. Returns the number of deleted rows.
+    """
+    deleted = 0
+    for table, column in _membership_tables():
+        keep = sqlalchemy.select([sqlalchemy.func.min(table.c.id).label('id')]) \
+            .group_by(table.c.user_id, table.c[column]).alias('keep')
+        query = sqlalchemy.delete(table).where(~table.c.id.in_(sqlalchemy.select([keep.c.id])))
+        deleted += conn.execute(query).rowcount
+    return deleted
+
+
+def reconcile_slice_n_dashboard_users(engine):
+    """
+    Repairs the slice and dashboard memberships of all the users in one transaction: removes duplicates and adds
+    the missing ones of the active users, but those with MEMBERSHIP_EXCLUDED_ROLE whose memberships are left as is.
+    """
+    from superset import security_manager
+    ab_user = security_manager.user_model.__table__
+    users = sqlalchemy.select([ab_user.c.id]) \
+        .where(ab_user.c.active == sqlalchemy.true()) \
+        .where(~ab_user.c.id.in_(_excluded_user_ids())).alias('users')
+    with engine.begin() as conn:
+        return {
+            'duplicates': delete_duplicate_memberships(conn),
+            'inserted': insert_memberships(conn, users),
+        }
+
+
+def sync_slice_n_dashboard_user(username, member):
+    """
+    Makes the user a member of every slice and dashboard, or of none, in a background task when
+    SLICE_USER_SYNC_ASYNC is set. The sync runs right away when the task can't be queued, so that logins don't
+    depend on the Celery broker.
+    """
+    if config.SLICE_USER_SYNC_ASYNC:
+        from superset.tasks.membership import sync_slice_n_dashboard_user_task
+        try:
+            sync_slice_n_dashboard_user_task.delay(username, member)
+            return
+        except Exception as e:
+            logging.warning("Failed to queue the membership sync of %s, running it now: %s", username, e)
+    SliceUserView(username).sync_slice_n_dashboard(member)
+
 
 class SliceUserView:
 
     def __init__(self,username):
-        self.engine = sqlalchemy.create_engine(config.SQLALCHEMY_DATABASE_URI)
-        self.conn = self.engine.connect()
-        self.metadata = sqlalchemy.MetaData()
+        from superset import db, security_manager
 
-        #set tables used
-        ab_user = sqlalchemy.Table('ab_user', self.metadata, autoload=TRUE, autoload_with=self.engine)
-        self.slice_user = sqlalchemy.Table('slice_user', self.metadata, autoload = TRUE, autoload_with = self.engine)
-        self.dashboard_user = sqlalchemy.Table('dashboard_user', self.metadata, autoload = TRUE, autoload_with = self.engine)
+        # reuse the app's engine, and its connection pool, and the tables declared by the models
+        self.engine = db.engine
+        ab_user = security_manager.user_model.__table__
 
         #Get USER ID
         query = sqlalchemy.select([ab_user.columns.id]).where(ab_user.columns.username == username)
-        result = self.conn.execute(query)
-        self.user_id = [i[0] for i in result.fetchall()].pop()
-        
-    def insert_user_in_slice_n_dashboard(self): 
-
-        #Get All Slice IDS
-        query1 = sqlalchemy.select([self.slice_user.columns.slice_id.distinct()])
-        result1 = self.conn.execute(query1)
-        slice_id_list = [i[0] for i in result1.fetchall()]
-        slice_id_cnt = len(slice_id_list)
-
-        #Get All Dashboard ID
-        query2 = sqlalchemy.select([self.dashboard_user.columns.dashboard_id.distinct()])
-        result2 = self.conn.execute(query2)
-        dash_id_list = [i[0] for i in result2.fetchall()]
-        dash_id_cnt = len(dash_id_list)
-
-        #Insert in Slice User
-        inst_slice_lst = []
-        for j in range(slice_id_cnt):
-            inst_slice_lst.append({"user_id":self.user_id,"slice_id":slice_id_list[j]})
-
-        query3 = sqlalchemy.insert(self.slice_user).values(inst_slice_lst)
-        result3 = self.conn.execute(query3)
-        
-        #Inset in Dashboard User
-        inst_dash_lst = []
-        for k in range(dash_id_cnt):
-            inst_dash_lst.append({"user_id":self.user_id,"dashboard_id":dash_id_list[k]})
-
-        query4 = sqlalchemy.insert(self.dashboard_user).values(inst_dash_lst)
-        result4 = self.conn.execute(query4)
-    
-    def delete_user_in_slice_n_dashboard(self): 
-        
-        #delete from slice user
-        query5 = sqlalchemy.delete(self.slice_user).where(self.slice_user.columns.user_id == self.user_id)
-        result5 = self.conn.execute(query5)
-
-        #delete from dashboard user
-        query6 = sqlalchemy.delete(self.dashboard_user).where(self.dashboard_user.columns.user_id == self.user_id)
-        result6 = self.conn.execute(query6)
+        with self.engine.connect() as conn:
+            self.user_id = [i[0] for i in conn.execute(query).fetchall()].pop()
+
+    def insert_user_in_slice_n_dashboard(self):
+        user = sqlalchemy.select([sqlalchemy.literal(self.user_id).label('id')]).alias('users')
+        with self.engine.begin() as conn:
+            return insert_memberships(conn, user)
+
+    def delete_user_in_slice_n_dashboard(self):
+        with self.engine.begin() as conn:
+            return delete_memberships(conn, [self.user_id])
+
+    def sync_slice_n_dashboard(self, member):
+        if member:
+            return self.insert_user_in_slice_n_dashboard()
+        return self.delete_user_in_slice_n_dashboard()
@@ -0,0 +1,13 @@
+const puppeteer = require('puppeteer');
+
+// Starts a headless browser and prints its DevTools websocket endpoint, so that
+// printPdf_singleTab.js runs can connect to it instead of starting their own.
+// The browser lives as long as this process does.
+(async () => {
+	const browser = await puppeteer.launch({headless: true, defaultViewport: null, args: ['--no-sandbox','--start-maximized']});
+	browser.on('disconnected', () => process.exit(1));
+	console.log(browser.wsEndpoint());
+})().catch(error => {
+	console.error(error);
+	process.exit(1);
+});
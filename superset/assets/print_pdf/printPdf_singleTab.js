@@ -12,25 +12,30 @@ var url = null;
 var file_name = 'report';
 var width = 1024;
 var height = 1024;
+// DevTools websocket endpoint of an already running browser, see launchBrowser.js
+var ws_endpoint = null;
 
 async function wait(ms) {
 	return new Promise(resolve => {
 	  setTimeout(resolve, ms);
 	});
 }
-//We are passing 3 arguments, other three are default arguments of any node script invocation
-if (process.argv.length === 6) {
+//We are passing 4 or 5 arguments, other two are default arguments of any node script invocation
+if (process.argv.length === 6 || process.argv.length === 7) {
 	url = process.argv[2];
 	file_name = process.argv[3];
 	tab_selector_id = process.argv[4];
 	origin = process.argv[5];
+	ws_endpoint = process.argv[6] || null;
 	// console.info(tab_selector_id);
 	// console.info(file_name);
 }
 
 if(url && origin) {
 (async () => {
-		const browser = await puppeteer.launch({headless: true, devtools: true,defaultViewport: null, args: ['--no-sandbox','--start-maximized']});
+		const browser = ws_endpoint
+			? await puppeteer.connect({browserWSEndpoint: ws_endpoint, defaultViewport: null})
+			: await puppeteer.launch({headless: true, devtools: true,defaultViewport: null, args: ['--no-sandbox','--start-maximized']});
 		const page = await browser.newPage();
 		let login_url = origin + "/login/";
 		try {
@@ -114,7 +119,13 @@ if(url && origin) {
 				process.exit(1);
 			}
 			await page2.close();
-			await browser.close();
+			if (ws_endpoint) {
+				// leave the browser running for the next report
+				browser.disconnect();
+			}
+			else {
+				await browser.close();
+			}
 			console.info("Pdf Downloaded");
 
 
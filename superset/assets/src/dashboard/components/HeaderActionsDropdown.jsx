@@ -60,6 +60,11 @@ const defaultProps = {
   colorScheme: undefined,
 };
 
+// How often to check whether a PDF export is ready, in milliseconds
+const PDF_POLL_INTERVAL = 2000;
+// Give up on the PDF after 5 minutes, when no worker picks up the job
+const PDF_POLL_MAX_ATTEMPTS = 150;
+
 function download_file(fileURL, fileName) {
   // for non-IE
     if (!window.ActiveXObject) {
@@ -154,19 +159,38 @@ class HeaderActionsDropdown extends React.PureComponent {
         "title": document.title,
         "tab_selected_id": tab_selected_id
       },
-    }).then(response => {
-      const url = response.json.link;
-      this.props.addSuccessToast(
-        t('Now Downloading...')
-      );
-      download_file(url, response.json.file_name);
-    }).catch(resp => {
+    }).then(response => this.wait_for_pdf(response.json))
+    .catch(resp => {
       this.props.addDangerToast(
-        t('Some Error Occurred! We\'re on it!!')
+        resp instanceof Error ? resp.message : t('Some Error Occurred! We\'re on it!!')
       )
     });
 
   }
+
+  wait_for_pdf (pdf, attempt = 0) {
+    // The PDF is rendered in the background, poll until it's ready
+    if (pdf.status === 'failed') {
+      throw new Error(t('The PDF could not be generated, please try again'));
+    }
+    if (pdf.status !== 'success') {
+      if (attempt >= PDF_POLL_MAX_ATTEMPTS) {
+        throw new Error(
+          t('The PDF is taking too long to generate, please try again later')
+        );
+      }
+      return new Promise(resolve => setTimeout(resolve, PDF_POLL_INTERVAL))
+        .then(() => SupersetClient.get({
+          endpoint: `/superset/downloadpdf/${pdf.task_id}/?origin=${encodeURIComponent(window.location.origin)}`,
+        }))
+        .then(response => this.wait_for_pdf(response.json, attempt + 1));
+    }
+    this.props.addSuccessToast(
+      t('Now Downloading...')
+    );
+    download_file(pdf.link, pdf.file_name);
+    return pdf;
+  }
   changeCss(css) {
     this.setState({ css }, () => {
       injectCustomCss(css);
@@ -28,9 +28,15 @@ from flask_appbuilder import Model
 from pathlib2 import Path
 import yaml
 
-from superset import app, appbuilder, db, examples, security_manager
+from superset import app, appbuilder, db, examples, security_manager, shared_cache
+from superset.abinitio_security_manager import reconcile_slice_n_dashboard_users
 from superset.common.tags import add_favorites, add_owners, add_types
-from superset.utils import core as utils, dashboard_import_export, dict_import_export
+from superset.utils import (
+    core as utils,
+    dashboard_import_export,
+    dict_import_export,
+    partition_cache,
+)
 
 config = app.config
 celery_app = utils.get_celery_app(config)
@@ -150,6 +156,30 @@ def set_database_uri(database_name, uri):
     utils.get_or_create_db(database_name, uri)
 
 
+@app.cli.command()
+@click.option("--database_name", "-d", help="Database name", required=True)
+@click.option("--schema", "-s", help="Schema name")
+@click.option(
+    "--table", "-t", help="Table name, if omitted all tables will be invalidated"
+)
+def invalidate_partition_cache(database_name, schema, table):
+    """Drops the cached latest partitions of a table or of a whole database
+
+    Only works with a cache shared between processes, the "simple" one lives
+    in the memory of each web server and Celery worker, out of reach of this
+    command."""
+    from superset.models.core import Database
+
+    if not shared_cache:
+        raise click.ClickException(
+            "CACHE_CONFIG isn't shared with the web servers and workers, the "
+            "partitions they cached expire after LATEST_PARTITION_CACHE_TIMEOUT"
+        )
+    database = db.session.query(Database).filter_by(database_name=database_name).one()
+    partition_cache.invalidate(database, schema, table)
+    print(f"Invalidated the partitions of [{database_name}] {table or ''}")
+
+
 @app.cli.command()
 @click.option(
     "--datasource",
@@ -171,7 +201,13 @@ def refresh_druid(datasource, merge):
 
     for cluster in session.query(DruidCluster).all():
         try:
-            cluster.refresh_datasources(datasource_name=datasource, merge_flag=merge)
+            timings = cluster.refresh_datasources(
+                datasource_name=datasource, merge_flag=merge
+            )
+            for ds_name, duration in sorted(
+                timings.items(), key=lambda timing: timing[1], reverse=True
+            ):
+                print(f"  [{ds_name}] {duration:.2f}s")
         except Exception as e:
             print("Error while processing cluster '{}'\n{}".format(cluster, str(e)))
             logging.exception(e)
@@ -465,6 +501,16 @@ def load_test_users_run():
         sm.get_session.commit()
 
 
+@app.cli.command()
+def reconcile_slice_users():
+    """Repairs the slice and dashboard memberships of all the users."""
+    counts = reconcile_slice_n_dashboard_users(db.engine)
+    print(
+        "Removed {duplicates} duplicate memberships, "
+        "added {inserted} missing ones".format(**counts)
+    )
+
+
 @app.cli.command()
 def sync_tags():
     """Rebuilds special tags (owner, type, favorited by)."""
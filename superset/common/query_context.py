@@ -17,13 +17,12 @@
 # pylint: disable=C,R,W
 from datetime import datetime, timedelta
 import logging
-import pickle as pkl
 from typing import Any, Dict, List, Optional
 
 import numpy as np
 import pandas as pd
 
-from superset import app, cache
+from superset import app, chart_data_cache
 from superset import db
 from superset.connectors.base.models import BaseDatasource
 from superset.connectors.connector_registry import ConnectorRegistry
@@ -168,32 +167,17 @@ class QueryContext:
             else None
         )
         logging.info("Cache key: {}".format(cache_key))
-        is_loaded = False
         stacktrace = None
         df = None
-        cached_dttm = datetime.utcnow().isoformat().split(".")[0]
         cache_value = None
         status = None
         query = ""
         error_message = None
-        if cache_key and cache and not self.force:
-            cache_value = cache.get(cache_key)
-            if cache_value:
-                stats_logger.incr("loaded_from_cache")
-                try:
-                    cache_value = pkl.loads(cache_value)
-                    df = cache_value["df"]
-                    query = cache_value["query"]
-                    status = utils.QueryStatus.SUCCESS
-                    is_loaded = True
-                except Exception as e:
-                    logging.exception(e)
-                    logging.error(
-                        "Error reading cache: " + utils.error_msg_from_exception(e)
-                    )
-                logging.info("Serving from cache")
 
-        if query_obj and not is_loaded:
+        def compute():
+            nonlocal stacktrace, status, query, error_message
+            cached_dttm = datetime.utcnow().isoformat().split(".")[0]
+            df = None
             try:
                 query_result = self.get_query_result(query_obj)
                 status = query_result["status"]
@@ -202,33 +186,24 @@ class QueryContext:
                 df = query_result["df"]
                 if status != utils.QueryStatus.FAILED:
                     stats_logger.incr("loaded_from_source")
-                    is_loaded = True
             except Exception as e:
                 logging.exception(e)
                 if not error_message:
                     error_message = "{}".format(e)
                 status = utils.QueryStatus.FAILED
                 stacktrace = utils.get_stacktrace()
+            cache_value = dict(dttm=cached_dttm, df=df, query=query)
+            return cache_value, status != utils.QueryStatus.FAILED
 
-            if is_loaded and cache_key and cache and status != utils.QueryStatus.FAILED:
-                try:
-                    cache_value = dict(dttm=cached_dttm, df=df, query=query)
-                    cache_binary = pkl.dumps(cache_value, protocol=pkl.HIGHEST_PROTOCOL)
-
-                    logging.info(
-                        "Caching {} chars at key {}".format(
-                            len(cache_binary), cache_key
-                        )
-                    )
-
-                    stats_logger.incr("set_cache_key")
-                    cache.set(cache_key, cache_binary, timeout=self.cache_timeout)
-                except Exception as e:
-                    # cache.set call can fail if the backend is down or if
-                    # the key is too large or whatever other reasons
-                    logging.warning("Could not cache key {}".format(cache_key))
-                    logging.exception(e)
-                    cache.delete(cache_key)
+        if query_obj:
+            cache_value, is_cached = chart_data_cache.fetch(
+                cache_key, compute, self.cache_timeout, force=self.force
+            )
+            df = cache_value["df"]
+            if is_cached:
+                logging.info("Serving from cache")
+                query = cache_value["query"]
+                status = utils.QueryStatus.SUCCESS
         return {
             "cache_key": cache_key,
             "cached_dttm": cache_value["dttm"] if cache_value is not None else None,
@@ -16,7 +16,7 @@
 # under the License.
 # pylint: disable=C,R,W
 from collections import OrderedDict
-from typing import Dict, List, Optional, Set, Type, TYPE_CHECKING
+from typing import Dict, Iterable, List, Optional, Set, Type, TYPE_CHECKING
 
 from sqlalchemy.orm import Session, subqueryload
 
@@ -101,6 +101,25 @@ class ConnectorRegistry(object):
             .one()
         )
 
+    @classmethod
+    def get_datasources_by_ids(
+        cls,
+        session: Session,
+        datasource_type: str,
+        datasource_ids: Iterable[int],
+        eager: bool = False,
+    ) -> List["BaseDatasource"]:
+        """Returns datasources, along with their columns and metrics if
+        ``eager``"""
+        datasource_class = ConnectorRegistry.sources[datasource_type]
+        qry = session.query(datasource_class)
+        if eager:
+            qry = qry.options(
+                subqueryload(datasource_class.columns),
+                subqueryload(datasource_class.metrics),
+            )
+        return qry.filter(datasource_class.id.in_(list(datasource_ids))).all()
+
     @classmethod
     def query_datasources_by_name(
         cls,
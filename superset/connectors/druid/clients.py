@@ -0,0 +1,260 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Shared HTTP sessions, version probes and health of the Druid clusters
+
+Every Druid query used to open a new connection to the broker, and most of
+them also asked the broker for its version first. Instead, each cluster gets
+a ``requests`` session here, keeping a pool of connections to the broker
+alive, which the PyDruid clients of all the queries post through. The broker
+version is cached for ``DRUID_VERSION_CACHE_TTL`` seconds, and the time
+boundaries of the datasources for ``DRUID_TIME_BOUNDARY_CACHE_TTL`` seconds.
+
+Connection errors and broker side errors are tracked per cluster: after
+``DRUID_FAILURE_THRESHOLD`` consecutive ones, requests to the cluster fail
+right away for ``DRUID_RETRY_AFTER`` seconds rather than each waiting for a
+timeout.
+"""
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from superset import conf
+
+try:
+    from pydruid.client import PyDruid
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:
+    pass
+
+stats_logger = conf.get("STATS_LOGGER")
+
+
+class DruidClusterUnavailable(IOError):
+    pass
+
+
+class ClusterState(object):
+    """The session, cached version and health of a cluster"""
+
+    def __init__(self, name: str, pool_size: int) -> None:
+        self.name = name
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.version: Optional[str] = None
+        self.version_expiry = 0.0
+        # datasource name: (expiry, max time)
+        self.time_boundaries: Dict[str, Tuple[float, Optional[str]]] = {}
+        self.failures = 0
+        self.down_until = 0.0
+        self.last_error: Optional[str] = None
+
+
+class DruidClientRegistry(object):
+    def __init__(
+        self,
+        timeout: Optional[int] = None,
+        pool_size: int = 10,
+        version_ttl: int = 600,
+        time_boundary_ttl: int = 300,
+        failure_threshold: int = 5,
+        retry_after: int = 30,
+    ) -> None:
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.version_ttl = version_ttl
+        self.time_boundary_ttl = time_boundary_ttl
+        self.failure_threshold = failure_threshold
+        self.retry_after = retry_after
+        self._states: Dict[tuple, ClusterState] = {}
+        self._lock = threading.Lock()
+
+    def _get_state(self, cluster) -> ClusterState:
+        # a change of the broker settings gets the cluster a new session
+        key = (
+            cluster.cluster_name,
+            cluster.broker_host,
+            cluster.broker_port,
+            cluster.broker_endpoint,
+            cluster.broker_user,
+            cluster.broker_pass,
+        )
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = ClusterState(cluster.cluster_name, self.pool_size)
+                self._states[key] = state
+            return state
+
+    def check_available(self, state: ClusterState) -> None:
+        if state.down_until > time.time():
+            stats_logger.incr("druid.unavailable")
+            raise DruidClusterUnavailable(
+                f"Druid cluster {state.name} is unavailable: {state.last_error}"
+            )
+
+    def record_success(self, state: ClusterState) -> None:
+        state.failures = 0
+        state.down_until = 0.0
+
+    def record_failure(self, state: ClusterState, error: Any) -> None:
+        state.failures += 1
+        state.last_error = str(error)
+        stats_logger.incr("druid.failure")
+        if state.failures >= self.failure_threshold:
+            logging.warning(
+                f"Druid cluster {state.name} failed {state.failures} times in a row, "
+                f"pausing requests for {self.retry_after}s"
+            )
+            state.down_until = time.time() + self.retry_after
+
+    def request(self, cluster, method: str, url: str, **kwargs) -> "requests.Response":
+        """Sends a request to the cluster through its session, tracking its health"""
+        state = self._get_state(cluster)
+        self.check_available(state)
+        if cluster.broker_user and cluster.broker_pass:
+            kwargs.setdefault("auth", (cluster.broker_user, cluster.broker_pass))
+        try:
+            response = state.session.request(
+                method, url, timeout=self.timeout, **kwargs
+            )
+        except requests.RequestException as e:
+            self.record_failure(state, e)
+            raise
+        # Druid answers invalid queries with a 500, which doesn't tell about
+        # the cluster health, unlike the gateway errors
+        if response.status_code in (502, 503, 504):
+            self.record_failure(state, f"HTTP {response.status_code}")
+        else:
+            self.record_success(state)
+        return response
+
+    def get_json(self, cluster, url: str) -> Any:
+        response = self.request(cluster, "GET", url)
+        response.raise_for_status()
+        return response.json()
+
+    def get_client(self, cluster) -> "PyDruid":
+        """Returns a PyDruid client posting through the cluster's session
+
+        Clients are cheap, and keep the last query they ran, so each query
+        gets its own while they share the session and its connections.
+        """
+        client = SessionPyDruid(
+            self,
+            cluster,
+            cluster.get_base_url(cluster.broker_host, cluster.broker_port),
+            cluster.broker_endpoint,
+        )
+        if cluster.broker_user and cluster.broker_pass:
+            client.set_basic_auth_credentials(cluster.broker_user, cluster.broker_pass)
+        return client
+
+    def get_version(self, cluster) -> str:
+        state = self._get_state(cluster)
+        if state.version is None or state.version_expiry < time.time():
+            url = cluster.get_base_url(cluster.broker_host, cluster.broker_port)
+            state.version = self.get_json(cluster, url + "/status")["version"]
+            state.version_expiry = time.time() + self.version_ttl
+        return state.version
+
+    def get_time_boundary(self, cluster, datasource_name: str) -> Optional[str]:
+        """Returns the max time of the datasource, None if it has no data"""
+        state = self._get_state(cluster)
+        cached = state.time_boundaries.get(datasource_name)
+        if cached and cached[0] > time.time():
+            return cached[1]
+        results = self.get_client(cluster).time_boundary(datasource=datasource_name)
+        max_time = results[0]["result"]["maxTime"] if results else None
+        expiry = time.time() + self.time_boundary_ttl
+        state.time_boundaries[datasource_name] = (expiry, max_time)
+        return max_time
+
+    def health(self) -> Dict[str, Dict[str, Any]]:
+        """Returns the health of every cluster queried by this process"""
+        with self._lock:
+            states = list(self._states.values())
+        now = time.time()
+        return {
+            state.name: {
+                "available": state.down_until <= now,
+                "failures": state.failures,
+                "last_error": state.last_error,
+                "version": state.version,
+            }
+            for state in states
+        }
+
+
+try:
+
+    class SessionPyDruid(PyDruid):
+        """PyDruid client that posts its queries through a shared session"""
+
+        def __init__(self, registry, cluster, url, endpoint):
+            super(SessionPyDruid, self).__init__(url, endpoint)
+            self.registry = registry
+            self.cluster = cluster
+
+        def _post(self, query):
+            headers, querystr, url = self._prepare_url_headers_and_body(query)
+            # the credentials are already in the headers
+            response = self.registry.request(
+                self.cluster, "POST", url, data=querystr, headers=headers, auth=None
+            )
+            if response.status_code >= 400:
+                err = response.text
+                if response.status_code == 500:
+                    # has Druid returned an error?
+                    try:
+                        err = response.json().get("error", None)
+                    except (ValueError, AttributeError):
+                        pass
+                raise IOError(
+                    "HTTP Error {0}: {1} \n Druid Error: {2} \n Query is: {3}".format(
+                        response.status_code,
+                        response.reason,
+                        err,
+                        json.dumps(
+                            query.query_dict,
+                            indent=4,
+                            sort_keys=True,
+                            separators=(",", ": "),
+                        ),
+                    )
+                )
+            query.parse(response.text)
+            return query
+
+
+except NameError:
+    pass
+
+
+druid_clients = DruidClientRegistry(
+    timeout=conf.get("DRUID_QUERY_TIMEOUT"),
+    pool_size=conf.get("DRUID_CONNECTION_POOL_SIZE"),
+    version_ttl=conf.get("DRUID_VERSION_CACHE_TTL"),
+    time_boundary_ttl=conf.get("DRUID_TIME_BOUNDARY_CACHE_TTL"),
+    failure_threshold=conf.get("DRUID_FAILURE_THRESHOLD"),
+    retry_after=conf.get("DRUID_RETRY_AFTER"),
+)
@@ -24,6 +24,7 @@ import json
 import logging
 from multiprocessing.pool import ThreadPool
 import re
+import time
 from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
 
 from dateutil.parser import parse as dparse
@@ -52,7 +53,6 @@ try:
         Quantile,
         Quantiles,
     )
-    import requests
 except ImportError:
     pass
 import sqlalchemy as sa
@@ -72,6 +72,7 @@ from sqlalchemy_utils import EncryptedType
 
 from superset import conf, db, security_manager
 from superset.connectors.base.models import BaseColumn, BaseDatasource, BaseMetric
+from superset.connectors.druid.clients import druid_clients
 from superset.exceptions import SupersetException
 from superset.models.core import Database
 from superset.models.helpers import AuditMixinNullable, ImportMixin, QueryResult
@@ -84,6 +85,7 @@ except ImportError:
 
 
 DRUID_TZ = conf.get("DRUID_TZ")
+stats_logger = conf.get("STATS_LOGGER")
 POST_AGG_TYPE = "postagg"
 metadata = Model.metadata  # pylint: disable=no-member
 
@@ -112,10 +114,85 @@ except NameError:
     pass
 
 
-# Function wrapper because bound methods cannot
-# be passed to processes
-def _fetch_metadata_for(datasource):
-    return datasource.latest_metadata()
+def _segment_metadata(client, datasource_name, lbound, rbound, merge_flag):
+    return client.segment_metadata(
+        datasource=datasource_name,
+        intervals=lbound + "/" + rbound,
+        merge=merge_flag,
+        analysisTypes=[],
+    )
+
+
+def fetch_latest_metadata(
+    cluster: "DruidCluster", datasource_name: str, merge_flag: bool
+) -> Optional[Dict]:
+    """Returns the columns of the latest segment of the datasource
+
+    This only reads the attributes of the cluster, so that it can run in
+    other threads than the one that loaded it.
+    """
+    logging.info("Syncing datasource [{}]".format(datasource_name))
+    client = cluster.get_pydruid_client()
+    old_druid = LooseVersion(cluster.druid_version) < LooseVersion("0.8.2")
+    try:
+        max_time = druid_clients.get_time_boundary(cluster, datasource_name)
+    except IOError as e:
+        logging.warning(f"Failed to get the time boundary of [{datasource_name}]")
+        logging.exception(e)
+        max_time = None
+    else:
+        if max_time is None:
+            # the datasource has no data
+            return None
+
+    segment_metadata = None
+    if max_time:
+        max_time = dparse(max_time)
+        # Query segmentMetadata for 7 days back. However, due to a bug,
+        # we need to set this interval to more than 1 day ago to exclude
+        # realtime segments, which triggered a bug (fixed in druid 0.8.2).
+        # https://groups.google.com/forum/#!topic/druid-user/gVCqqspHqOQ
+        lbound = (max_time - timedelta(days=7)).isoformat()
+        if old_druid:
+            rbound = (max_time - timedelta(1)).isoformat()
+        else:
+            rbound = max_time.isoformat()
+        try:
+            segment_metadata = _segment_metadata(
+                client, datasource_name, lbound, rbound, merge_flag
+            )
+        except Exception as e:
+            logging.warning("Failed first attempt to get latest segment")
+            logging.exception(e)
+    # all the segments are only scanned when the max time is unknown, or the
+    # last 7 days gave nothing: the query failed, or the latest segment starts
+    # at the max time, which the interval above excludes
+    if not segment_metadata:
+        lbound = datetime(1901, 1, 1).isoformat()[:10]
+        if old_druid:
+            rbound = datetime.now().isoformat()
+        else:
+            rbound = datetime(2050, 1, 1).isoformat()[:10]
+        try:
+            segment_metadata = _segment_metadata(
+                client, datasource_name, lbound, rbound, merge_flag
+            )
+        except Exception as e:
+            logging.warning("Failed 2nd attempt to get latest segment")
+            logging.exception(e)
+    if segment_metadata:
+        return segment_metadata[-1]["columns"]
+    return None
+
+
+def _fetch_metadata_for(cluster, datasource_name, merge_flag):
+    start = time.time()
+    try:
+        return fetch_latest_metadata(cluster, datasource_name, merge_flag)
+    finally:
+        duration = time.time() - start
+        logging.info(f"Fetched the metadata of [{datasource_name}] in {duration:.2f}s")
+        stats_logger.timing("druid.refresh.fetch_metadata", duration)
 
 
 class DruidCluster(Model, AuditMixinNullable, ImportMixin):
@@ -171,25 +248,16 @@ class DruidCluster(Model, AuditMixinNullable, ImportMixin):
         return f"{base_url}/{self.broker_endpoint}"
 
     def get_pydruid_client(self) -> PyDruid:
-        cli = PyDruid(
-            self.get_base_url(self.broker_host, self.broker_port), self.broker_endpoint
-        )
-        if self.broker_user and self.broker_pass:
-            cli.set_basic_auth_credentials(self.broker_user, self.broker_pass)
-        return cli
+        return druid_clients.get_client(self)
 
     def get_datasources(self) -> List[str]:
         endpoint = self.get_base_broker_url() + "/datasources"
-        auth = requests.auth.HTTPBasicAuth(self.broker_user, self.broker_pass)
-        return json.loads(requests.get(endpoint, auth=auth).text)
+        return druid_clients.get_json(self, endpoint)
 
     def get_druid_version(self) -> str:
-        endpoint = self.get_base_url(self.broker_host, self.broker_port) + "/status"
-        auth = requests.auth.HTTPBasicAuth(self.broker_user, self.broker_pass)
-        return json.loads(requests.get(endpoint, auth=auth).text)["version"]
+        return druid_clients.get_version(self)
 
-    @property  # noqa: T484
-    @utils.memoized
+    @property
     def druid_version(self) -> str:
         return self.get_druid_version()
 
@@ -198,9 +266,11 @@ class DruidCluster(Model, AuditMixinNullable, ImportMixin):
         datasource_name: Optional[str] = None,
         merge_flag: bool = True,
         refresh_all: bool = True,
-    ) -> None:
+    ) -> Dict[str, float]:
         """Refresh metadata of all datasources in the cluster
         If ``datasource_name`` is specified, only that datasource is updated
+
+        Returns the time taken by each datasource, in seconds.
         """
         ds_list = self.get_datasources()
         blacklist = conf.get("DRUID_DATA_SOURCE_BLACKLIST", [])
@@ -210,15 +280,17 @@ class DruidCluster(Model, AuditMixinNullable, ImportMixin):
         elif datasource_name not in blacklist and datasource_name in ds_list:
             ds_refresh.append(datasource_name)
         else:
-            return
-        self.refresh(ds_refresh, merge_flag, refresh_all)
+            return {}
+        return self.refresh(ds_refresh, merge_flag, refresh_all)
 
     def refresh(
         self, datasource_names: List[str], merge_flag: bool, refresh_all: bool
-    ) -> None:
+    ) -> Dict[str, float]:
         """
         Fetches metadata for the specified datasources and
         merges to the Superset database
+
+        Returns the time taken by each datasource, in seconds.
         """
         session = db.session
         ds_list = (
@@ -227,6 +299,15 @@ class DruidCluster(Model, AuditMixinNullable, ImportMixin):
             .filter(DruidDatasource.datasource_name.in_(datasource_names))
         )
         ds_map = {ds.name: ds for ds in ds_list}
+        if not refresh_all:
+            datasource_names = [name for name in datasource_names if name not in ds_map]
+        timings = {name: 0.0 for name in datasource_names}
+
+        # Druid is queried before anything gets written, so that the
+        # transaction isn't held while waiting on it
+        metadata = self.fetch_metadata(datasource_names, merge_flag, timings)
+
+        start = time.time()
         for ds_name in datasource_names:
             datasource = ds_map.get(ds_name, None)
             if not datasource:
@@ -235,50 +316,102 @@ class DruidCluster(Model, AuditMixinNullable, ImportMixin):
                     session.add(datasource)
                 flasher(_("Adding new datasource [{}]").format(ds_name), "success")
                 ds_map[ds_name] = datasource
-            elif refresh_all:
-                flasher(_("Refreshing datasource [{}]").format(ds_name), "info")
             else:
-                del ds_map[ds_name]
-                continue
+                flasher(_("Refreshing datasource [{}]").format(ds_name), "info")
             datasource.cluster = self
             datasource.merge_flag = merge_flag
         session.flush()
 
-        # Prepare multithreaded executation
-        pool = ThreadPool()
-        ds_refresh = list(ds_map.values())
-        metadata = pool.map(_fetch_metadata_for, ds_refresh)
-        pool.close()
-        pool.join()
-
-        for i in range(0, len(ds_refresh)):
-            datasource = ds_refresh[i]
-            cols = metadata[i]
-            if cols:
-                col_objs_list = (
-                    session.query(DruidColumn)
-                    .filter(DruidColumn.datasource_id == datasource.id)
-                    .filter(DruidColumn.column_name.in_(cols.keys()))
-                )
-                col_objs = {col.column_name: col for col in col_objs_list}
-                for col in cols:
+        ds_refresh = [ds_map[ds_name] for ds_name in datasource_names]
+        ds_ids = [ds.id for ds in ds_refresh if metadata[ds.datasource_name]]
+        # the columns and metrics of all the datasources are loaded at once,
+        # and only the ones that changed get written
+        columns: Dict[int, Dict[str, DruidColumn]] = {ds_id: {} for ds_id in ds_ids}
+        metrics: Dict[int, Dict[str, DruidMetric]] = {ds_id: {} for ds_id in ds_ids}
+        if ds_ids:
+            for col in session.query(DruidColumn).filter(
+                DruidColumn.datasource_id.in_(ds_ids)
+            ):
+                columns[col.datasource_id][col.column_name] = col
+            for metric in session.query(DruidMetric).filter(
+                DruidMetric.datasource_id.in_(ds_ids)
+            ):
+                metrics[metric.datasource_id][metric.metric_name] = metric
+
+        new_objs: List[Model] = []
+        for datasource in ds_refresh:
+            cols = metadata[datasource.datasource_name]
+            if not cols:
+                continue
+            ds_start = time.time()
+            ds_columns = columns[datasource.id]
+            with session.no_autoflush:
+                for col, col_metadata in cols.items():
                     if col == "__time":  # skip the time column
                         continue
-                    col_obj = col_objs.get(col)
+                    col_obj = ds_columns.get(col)
                     if not col_obj:
                         col_obj = DruidColumn(
                             datasource_id=datasource.id, column_name=col
                         )
-                        with session.no_autoflush:
-                            session.add(col_obj)
-                    col_obj.type = cols[col]["type"]
-                    col_obj.datasource = datasource
+                        ds_columns[col] = col_obj
+                        new_objs.append(col_obj)
+                    if col_obj.type != col_metadata["type"]:
+                        col_obj.type = col_metadata["type"]
                     if col_obj.type == "STRING":
-                        col_obj.groupby = True
-                        col_obj.filterable = True
-                datasource.refresh_metrics()
+                        if not col_obj.groupby:
+                            col_obj.groupby = True
+                        if not col_obj.filterable:
+                            col_obj.filterable = True
+                new_objs += DruidColumn.merge_metrics(
+                    datasource.id, ds_columns.values(), metrics[datasource.id]
+                )
+            timings[datasource.datasource_name] += time.time() - ds_start
+        session.add_all(new_objs)
         session.commit()
 
+        for ds_name, duration in timings.items():
+            logging.info(f"Refreshed datasource [{ds_name}] in {duration:.2f}s")
+        stats_logger.timing("druid.refresh", time.time() - start)
+        return timings
+
+    def fetch_metadata(
+        self,
+        datasource_names: List[str],
+        merge_flag: bool,
+        timings: Optional[Dict[str, float]] = None,
+    ) -> Dict[str, Optional[Dict]]:
+        """Fetches the latest segment metadata of the datasources, at most
+        ``DRUID_METADATA_REFRESH_WORKERS`` at once"""
+        if not datasource_names:
+            return {}
+        # this loads the attributes of the cluster in the current thread, the
+        # workers only read them
+        logging.info(
+            f"Fetching the metadata of {len(datasource_names)} datasources from "
+            f"[{self.cluster_name}], running Druid {self.druid_version}"
+        )
+
+        def fetch(datasource_name):
+            start = time.time()
+            cols = _fetch_metadata_for(self, datasource_name, merge_flag)
+            return cols, time.time() - start
+
+        workers = min(conf.get("DRUID_METADATA_REFRESH_WORKERS"), len(datasource_names))
+        pool = ThreadPool(workers)
+        try:
+            results = pool.map(fetch, datasource_names)
+        finally:
+            pool.close()
+            pool.join()
+
+        metadata = {}
+        for datasource_name, (cols, duration) in zip(datasource_names, results):
+            metadata[datasource_name] = cols
+            if timings is not None:
+                timings[datasource_name] = timings.get(datasource_name, 0) + duration
+        return metadata
+
     @property
     def perm(self) -> str:
         return "[{obj.cluster_name}].(id:{obj.id})".format(obj=self)
@@ -356,15 +489,35 @@ class DruidColumn(Model, BaseColumn):
             .filter(DruidMetric.metric_name.in_(metrics.keys()))
         )
         dbmetrics = {metric.metric_name: metric for metric in dbmetrics}
-        for metric in metrics.values():
-            dbmetric = dbmetrics.get(metric.metric_name)
-            if dbmetric:
-                for attr in ["json", "metric_type"]:
-                    setattr(dbmetric, attr, getattr(metric, attr))
-            else:
-                with db.session.no_autoflush:
-                    metric.datasource_id = self.datasource_id
-                    db.session.add(metric)
+        new_metrics = self.merge_metrics(self.datasource_id, [self], dbmetrics)
+        with db.session.no_autoflush:
+            db.session.add_all(new_metrics)
+
+    @staticmethod
+    def merge_metrics(
+        datasource_id: int,
+        columns: Iterable["DruidColumn"],
+        dbmetrics: Dict[str, "DruidMetric"],
+    ) -> List["DruidMetric"]:
+        """Updates the metrics of the datasource based on the column metadata,
+        only touching the ones that changed, and returns the new ones
+
+        ``dbmetrics`` holds the existing metrics by name, and gets the new ones
+        added to it.
+        """
+        new_metrics = []
+        for col in columns:
+            for metric in col.get_metrics().values():
+                dbmetric = dbmetrics.get(metric.metric_name)
+                if dbmetric:
+                    for attr in ["json", "metric_type"]:
+                        if getattr(dbmetric, attr) != getattr(metric, attr):
+                            setattr(dbmetric, attr, getattr(metric, attr))
+                else:
+                    metric.datasource_id = datasource_id
+                    dbmetrics[metric.metric_name] = metric
+                    new_metrics.append(metric)
+        return new_metrics
 
     @classmethod
     def import_obj(cls, i_column: "DruidColumn") -> "DruidColumn":
@@ -621,56 +774,9 @@ class DruidDatasource(Model, BaseDatasource):
 
     def latest_metadata(self):
         """Returns segment metadata from the latest segment"""
-        logging.info("Syncing datasource [{}]".format(self.datasource_name))
-        client = self.cluster.get_pydruid_client()
-        try:
-            results = client.time_boundary(datasource=self.datasource_name)
-        except IOError:
-            results = None
-        if results:
-            max_time = results[0]["result"]["maxTime"]
-            max_time = dparse(max_time)
-        else:
-            max_time = datetime.now()
-        # Query segmentMetadata for 7 days back. However, due to a bug,
-        # we need to set this interval to more than 1 day ago to exclude
-        # realtime segments, which triggered a bug (fixed in druid 0.8.2).
-        # https://groups.google.com/forum/#!topic/druid-user/gVCqqspHqOQ
-        lbound = (max_time - timedelta(days=7)).isoformat()
-        if LooseVersion(self.cluster.druid_version) < LooseVersion("0.8.2"):
-            rbound = (max_time - timedelta(1)).isoformat()
-        else:
-            rbound = max_time.isoformat()
-        segment_metadata = None
-        try:
-            segment_metadata = client.segment_metadata(
-                datasource=self.datasource_name,
-                intervals=lbound + "/" + rbound,
-                merge=self.merge_flag,
-                analysisTypes=[],
-            )
-        except Exception as e:
-            logging.warning("Failed first attempt to get latest segment")
-            logging.exception(e)
-        if not segment_metadata:
-            # if no segments in the past 7 days, look at all segments
-            lbound = datetime(1901, 1, 1).isoformat()[:10]
-            if LooseVersion(self.cluster.druid_version) < LooseVersion("0.8.2"):
-                rbound = datetime.now().isoformat()
-            else:
-                rbound = datetime(2050, 1, 1).isoformat()[:10]
-            try:
-                segment_metadata = client.segment_metadata(
-                    datasource=self.datasource_name,
-                    intervals=lbound + "/" + rbound,
-                    merge=self.merge_flag,
-                    analysisTypes=[],
-                )
-            except Exception as e:
-                logging.warning("Failed 2nd attempt to get latest segment")
-                logging.exception(e)
-        if segment_metadata:
-            return segment_metadata[-1]["columns"]
+        return fetch_latest_metadata(
+            self.cluster, self.datasource_name, self.merge_flag
+        )
 
     def refresh_metrics(self) -> None:
         for col in self.columns:
@@ -988,42 +1094,54 @@ class DruidDatasource(Model, BaseDatasource):
     ):
         ret = dim_filter
         if df is not None and not df.empty:
-            new_filters = []
-            for unused, row in df.iterrows():
-                fields = []
-                for dim in dimensions:
-                    f = None
-                    # Check if this dimension uses an extraction function
-                    # If so, create the appropriate pydruid extraction object
-                    if isinstance(dim, dict) and "extractionFn" in dim:
-                        (col, extraction_fn) = DruidDatasource._create_extraction_fn(
-                            dim
-                        )
-                        dim_val = dim["outputName"]
-                        f = Filter(
-                            dimension=col,
-                            value=row[dim_val],
-                            extraction_function=extraction_fn,
-                        )
-                    elif isinstance(dim, dict):
-                        dim_val = dim["outputName"]
-                        if dim_val:
-                            f = Dimension(dim_val) == row[dim_val]
-                    else:
-                        f = Dimension(dim) == row[dim]
-                    if f:
-                        fields.append(f)
-                if len(fields) > 1:
-                    term = Filter(type="and", fields=fields)
-                    new_filters.append(term)
-                elif fields:
-                    new_filters.append(fields[0])
-            if new_filters:
-                ff = Filter(type="or", fields=new_filters)
-                if not dim_filter:
-                    ret = ff
+            # (column of the phase one results, dimension, extraction function)
+            specs = []
+            for dim in dimensions:
+                # Check if this dimension uses an extraction function
+                # If so, create the appropriate pydruid extraction object
+                if isinstance(dim, dict) and "extractionFn" in dim:
+                    (col, extraction_fn) = DruidDatasource._create_extraction_fn(dim)
+                    specs.append((dim["outputName"], col, extraction_fn))
+                elif isinstance(dim, dict):
+                    if dim["outputName"]:
+                        specs.append((dim["outputName"], dim["outputName"], None))
                 else:
-                    ret = Filter(type="and", fields=[ff, dim_filter])
+                    specs.append((dim, dim, None))
+            if not specs:
+                return ret
+
+            # a filter term per distinct combination of values, rather than
+            # per row of the phase one results
+            rows = df[[output for output, _, _ in specs]].drop_duplicates()
+            rows = rows.astype(object).where(pd.notnull(rows), None)
+            if len(specs) == 1:
+                output, col, extraction_fn = specs[0]
+                ff = Filter(
+                    type="in",
+                    dimension=col,
+                    values=rows[output].tolist(),
+                    extraction_function=extraction_fn,
+                )
+            else:
+                new_filters = [
+                    Filter(
+                        type="and",
+                        fields=[
+                            Filter(
+                                dimension=col,
+                                value=value,
+                                extraction_function=extraction_fn,
+                            )
+                            for (_, col, extraction_fn), value in zip(specs, values)
+                        ],
+                    )
+                    for values in rows.itertuples(index=False, name=None)
+                ]
+                ff = Filter(type="or", fields=new_filters)
+            if not dim_filter:
+                ret = ff
+            else:
+                ret = Filter(type="and", fields=[ff, dim_filter])
         return ret
 
     @staticmethod
@@ -1169,9 +1287,9 @@ class DruidDatasource(Model, BaseDatasource):
         metrics_dict = {m.metric_name: m for m in self.metrics}
         columns_dict = {c.column_name: c for c in self.columns}
 
-        if self.cluster and LooseVersion(
-            self.cluster.get_druid_version()
-        ) < LooseVersion("0.11.0"):
+        if self.cluster and LooseVersion(self.cluster.druid_version) < LooseVersion(
+            "0.11.0"
+        ):
             for metric in metrics:
                 self.sanitize_metric_object(metric)
             self.sanitize_metric_object(timeseries_limit_metric)
@@ -1403,18 +1521,35 @@ class DruidDatasource(Model, BaseDatasource):
         df = df[cols]
 
         time_offset = DruidDatasource.time_offset(query_obj["granularity"])
-
-        def increment_timestamp(ts):
-            dt = utils.parse_human_datetime(ts).replace(tzinfo=DRUID_TZ)
-            return dt + timedelta(milliseconds=time_offset)
-
         if DTTM_ALIAS in df.columns and time_offset:
-            df[DTTM_ALIAS] = df[DTTM_ALIAS].apply(increment_timestamp)
+            df[DTTM_ALIAS] = self.increment_timestamps(df[DTTM_ALIAS], time_offset)
 
         return QueryResult(
             df=df, query=query_str, duration=datetime.now() - qry_start_dttm
         )
 
+    @staticmethod
+    def increment_timestamps(timestamps: pd.Series, time_offset: int) -> pd.Series:
+        """Shifts the timestamps returned by Druid by ``time_offset``
+        milliseconds, and sets them in ``DRUID_TZ``
+
+        The wall-clock times Druid returns are kept, whatever their offset: the
+        queries with a period granularity ask for them in ``DRUID_TZ``.
+        """
+
+        def increment_timestamp(ts):
+            dt = utils.parse_human_datetime(ts).replace(tzinfo=DRUID_TZ)
+            return dt + timedelta(milliseconds=time_offset)
+
+        try:
+            wall_clock = timestamps.str.replace(r"(Z|[+-]\d\d:?\d\d)$", "", regex=True)
+            shifted = pd.to_datetime(wall_clock).dt.tz_localize(DRUID_TZ)
+        except Exception:
+            # human readable dates, or ambiguous and non existent local times,
+            # which the row by row path lets through
+            return timestamps.apply(increment_timestamp)
+        return shifted + pd.Timedelta(milliseconds=time_offset)
+
     @staticmethod
     def _create_extraction_fn(dim_spec):
         extraction_fn = None
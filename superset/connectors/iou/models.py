@@ -23,7 +23,6 @@ from typing import Any, Dict, List, NamedTuple, Optional, Union
 
 import pandas as pd
 import sqlalchemy as sa
-import sqlparse
 from flask import escape, Markup
 
 from flask_appbuilder import Model
@@ -50,7 +49,7 @@ from sqlalchemy.schema import UniqueConstraint
 from sqlalchemy.sql import column, ColumnElement, literal_column, table, text
 from sqlalchemy.sql.expression import Label, Select, TextAsFrom
 
-from superset import app, db, security_manager
+from superset import app, db, security_manager, sql_parse
 from superset.connectors.base.models import BaseColumn, BaseDatasource, BaseMetric
 from superset.connectors.sqla.models import SqlMetric
 from superset.db_engine_specs.base import TimestampExpression
@@ -497,7 +496,7 @@ class IouTable(Model, BaseDatasource):
         iouq = self.get_iou_query(**query_obj)
         sql = self.database.compile_sqla_query(iouq.iou_query)
         logging.info(sql)
-        sql = sqlparse.format(sql, reindent=True)
+        sql = sql_parse.format_sql(sql, reindent=True)
         sql = self.mutate_query_from_config(sql)
         return QueryStringExtended(
             labels_expected=iouq.labels_expected, sql=sql, prequeries=iouq.prequeries
@@ -520,7 +519,7 @@ class IouTable(Model, BaseDatasource):
             from_sql = self.sql
             if template_processor:
                 from_sql = template_processor.process_template(from_sql)
-            from_sql = sqlparse.format(from_sql, strip_comments=True)
+            from_sql = sql_parse.format_sql(from_sql, strip_comments=True)
             return TextAsFrom(sa.text(from_sql), []).alias("expr_qry")
         return self.get_iou_table()
 
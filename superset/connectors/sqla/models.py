@@ -47,9 +47,8 @@ from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.schema import UniqueConstraint
 from sqlalchemy.sql import column, ColumnElement, literal_column, table, text
 from sqlalchemy.sql.expression import Label, Select, TextAsFrom
-import sqlparse
 
-from superset import app, db, security_manager
+from superset import app, db, security_manager, sql_parse
 from superset.connectors.base.models import BaseColumn, BaseDatasource, BaseMetric
 from superset.db_engine_specs.base import TimestampExpression
 from superset.exceptions import DatabaseNotFound
@@ -57,7 +56,7 @@ from superset.jinja_context import get_template_processor
 from superset.models.annotations import Annotation
 from superset.models.core import Database
 from superset.models.helpers import QueryResult
-from superset.utils import core as utils, import_datasource
+from superset.utils import core as utils, import_datasource, partition_cache
 
 config = app.config
 metadata = Model.metadata  # pylint: disable=no-member
@@ -555,7 +554,7 @@ class SqlaTable(Model, BaseDatasource):
         sqlaq = self.get_sqla_query(**query_obj)
         sql = self.database.compile_sqla_query(sqlaq.sqla_query)
         logging.info(sql)
-        sql = sqlparse.format(sql, reindent=True)
+        sql = sql_parse.format_sql(sql, reindent=True)
         sql = self.mutate_query_from_config(sql)
         return QueryStringExtended(
             labels_expected=sqlaq.labels_expected, sql=sql, prequeries=sqlaq.prequeries
@@ -578,7 +577,7 @@ class SqlaTable(Model, BaseDatasource):
             from_sql = self.sql
             if template_processor:
                 from_sql = template_processor.process_template(from_sql)
-            from_sql = sqlparse.format(from_sql, strip_comments=True)
+            from_sql = sql_parse.format_sql(from_sql, strip_comments=True)
             return TextAsFrom(sa.text(from_sql), []).alias("expr_qry")
         return self.get_sqla_table()
 
@@ -963,6 +962,7 @@ class SqlaTable(Model, BaseDatasource):
 
     def fetch_metadata(self) -> None:
         """Fetches the metadata for the table and merges it in"""
+        partition_cache.invalidate(self.database, self.schema, self.table_name)
         try:
             table = self.get_sqla_table_object()
         except Exception as e:
@@ -22,12 +22,14 @@ TODO(bkyryliuk): add support for the conventions like: *_dim or dim_*
 TODO(bkyryliuk): recognize integer encoded enums.
 
 """
+from collections.abc import Iterator
 from datetime import date, datetime
 import logging
 
 import numpy as np
 import pandas as pd
-from pandas.core.common import maybe_box_datetimelike
+from pandas._libs import lib
+from pandas.api.types import is_integer_dtype, is_object_dtype
 from pandas.core.dtypes.dtypes import ExtensionDtype
 
 from superset.utils.core import JS_MAX_INTEGER
@@ -62,6 +64,15 @@ def dedup(l, suffix="__", case_sensitive=True):
     return new_l
 
 
+class ResultFormat(object):
+    """Enum-type class for the layouts of serialized result sets"""
+
+    # a list of {column: value} dicts, what clients expect by default
+    RECORDS = "records"
+    # {"columns": [column, ...], "data": [[value, ...], ...]}
+    COLUMNAR = "columnar"
+
+
 def is_numeric(dtype):
     if hasattr(dtype, "_is_numeric"):
         return dtype._is_numeric
@@ -86,7 +97,12 @@ class SupersetDataFrame(object):
     }
 
     def __init__(self, data, cursor_description, db_engine_spec):
-        data = data or []
+        """``data`` is either a list of rows or an iterator over lists of rows,
+        as returned by ``BaseEngineSpec.fetch_data_chunks``. In the latter case
+        each chunk is turned into column arrays as soon as it's fetched, so the
+        rows themselves never need to be held all at once.
+        """
+        chunks = data if isinstance(data, Iterator) else [data or []]
 
         column_names = []
         dtype = None
@@ -105,21 +121,44 @@ class SupersetDataFrame(object):
 
         self.column_names = column_names
 
-        if dtype:
-            # put data in a 2D array so we can efficiently access each column;
-            # the reshape ensures the shape is 2D in case data is empty
-            array = np.array(data, dtype="object").reshape(-1, len(column_names))
-            # convert each column in data into a Series of the proper dtype; we
-            # need to do this because we can not specify a mixed dtype when
-            # instantiating the DataFrame, and this allows us to have different
-            # dtypes for each column.
-            data = {
-                column: pd.Series(array[:, i], dtype=dtype[column])
-                for i, column in enumerate(column_names)
-            }
-            self.df = pd.DataFrame(data, columns=column_names)
-        else:
-            self.df = pd.DataFrame(list(data), columns=column_names).infer_objects()
+        columns = {column: [] for column in column_names}
+        for chunk in chunks:
+            if not chunk:
+                continue
+            # put data in a 2D array so we can efficiently access each column
+            if not isinstance(chunk[0], tuple):
+                chunk = [tuple(row) for row in chunk]
+            array = lib.to_object_array_tuples(chunk)
+            del chunk
+            for i, column in enumerate(column_names):
+                if dtype:
+                    # convert each column into a Series of the proper dtype; we
+                    # need to do this because we can not specify a mixed dtype
+                    # when instantiating the DataFrame
+                    columns[column].append(pd.Series(array[:, i], dtype=dtype[column]))
+                else:
+                    columns[column].append(array[:, i].copy())
+            del array
+
+        # release the chunks column by column as they get concatenated
+        data = {}
+        for column in column_names:
+            chunk_columns = columns.pop(column)
+            if dtype:
+                data[column] = (
+                    pd.concat(chunk_columns, ignore_index=True)
+                    if chunk_columns
+                    else pd.Series([], dtype=dtype[column])
+                )
+            elif chunk_columns:
+                # same type inference as building a DataFrame from a list of rows
+                data[column] = lib.maybe_convert_objects(np.concatenate(chunk_columns))
+            else:
+                data[column] = np.array([], dtype="object")
+            del chunk_columns
+        self.df = pd.DataFrame(data, columns=column_names)
+        if not dtype:
+            self.df = self.df.infer_objects()
 
         self._type_dict = {}
         try:
@@ -144,24 +183,49 @@ class SupersetDataFrame(object):
     def data(self):
         return self.format_data(self.df)
 
+    @classmethod
+    def format_columns(cls, df):
+        """Returns the values of each column as a list of python objects
+
+        Conversions are done a whole column at a time: datetimes get boxed
+        into Timestamps and the integers too big for JavaScript to handle get
+        converted to strings, using masks rather than inspecting every cell.
+        Only object columns, which may hold python ints of any size, need a
+        look at each value.
+        """
+        columns = []
+        for _, series in df.iteritems():
+            values = series.astype(object).values
+            mask = None
+            if is_integer_dtype(series.dtype):
+                mask = np.asarray(
+                    (series > JS_MAX_INTEGER) | (series < -JS_MAX_INTEGER), dtype=bool
+                )
+            elif is_object_dtype(series.dtype):
+                mask = np.fromiter(
+                    (isinstance(v, int) and abs(v) > JS_MAX_INTEGER for v in values),
+                    dtype=bool,
+                    count=len(values),
+                )
+            if mask is not None and mask.any():
+                values[mask] = [str(v) for v in values[mask]]
+            columns.append(values.tolist())
+        return columns
+
     @classmethod
     def format_data(cls, df):
-        # work around for https://github.com/pandas-dev/pandas/issues/18372
-        data = [
-            dict(
-                (k, maybe_box_datetimelike(v))
-                for k, v in zip(df.columns, np.atleast_1d(row))
-            )
-            for row in df.values
-        ]
-        for d in data:
-            for k, v in list(d.items()):
-                # if an int is too big for Java Script to handle
-                # convert it to a string
-                if isinstance(v, int):
-                    if abs(v) > JS_MAX_INTEGER:
-                        d[k] = str(v)
-        return data
+        """Returns the rows of the dataframe as records"""
+        columns = list(df.columns)
+        return [dict(zip(columns, row)) for row in zip(*cls.format_columns(df))]
+
+    @classmethod
+    def format_columnar(cls, df):
+        """Returns the dataframe in the ``ResultFormat.COLUMNAR`` layout, which
+        doesn't repeat the column names on every row"""
+        return {
+            "columns": list(df.columns),
+            "data": [list(row) for row in zip(*cls.format_columns(df))],
+        }
 
     @classmethod
     def db_type(cls, dtype):
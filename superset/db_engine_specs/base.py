@@ -20,7 +20,17 @@ from datetime import datetime
 import hashlib
 import os
 import re
-from typing import Any, Dict, List, NamedTuple, Optional, Tuple, TYPE_CHECKING, Union
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    TYPE_CHECKING,
+    Union,
+)
 
 from flask import g
 from flask_babel import lazy_gettext as _
@@ -34,7 +44,6 @@ from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.sql import quoted_name, text
 from sqlalchemy.sql.expression import ColumnClause, ColumnElement, Select, TextAsFrom
 from sqlalchemy.types import TypeEngine
-import sqlparse
 from werkzeug.utils import secure_filename
 
 from superset import app, db, sql_parse
@@ -235,6 +244,32 @@ class BaseEngineSpec:  # pylint: disable=too-many-public-methods
             return cursor.fetchmany(limit)
         return cursor.fetchall()
 
+    @classmethod
+    def fetch_data_chunks(
+        cls, cursor, limit: int, chunk_size: int
+    ) -> Iterator[List[Tuple]]:
+        """
+        Same as ``fetch_data``, but fetches the rows with ``fetchmany`` so that
+        they can be processed while more rows are coming in
+
+        :param cursor: Cursor instance
+        :param limit: Maximum number of rows to be returned by the cursor
+        :param chunk_size: Maximum number of rows in each chunk
+        :return: Iterator over lists of rows
+        """
+        if cls.arraysize:
+            cursor.arraysize = cls.arraysize
+        remaining = limit if cls.limit_method == LimitMethod.FETCH_MANY else None
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            data = cursor.fetchmany(size)
+            if data:
+                yield data
+            if len(data) < size:
+                break
+            if remaining is not None:
+                remaining -= len(data)
+
     @classmethod
     def expand_data(
         cls, columns: List[dict], data: List[dict]
@@ -250,6 +285,11 @@ class BaseEngineSpec:  # pylint: disable=too-many-public-methods
         """
         return columns, data, []
 
+    @classmethod
+    def has_nested_data(cls, columns: List[dict]) -> bool:
+        """Whether ``expand_data`` changes the rows of these columns"""
+        return False
+
     @classmethod
     def alter_new_orm_column(cls, orm_col):
         """Allow altering default column attributes when first detected/added
@@ -504,6 +544,12 @@ class BaseEngineSpec:  # pylint: disable=too-many-public-methods
         """Extract error message for queries"""
         return utils.error_msg_from_exception(e)
 
+    @classmethod
+    def get_default_schema(cls, uri) -> Optional[str]:
+        """The schema of the tables named without one, when the URI tells it,
+        the reverse of ``adjust_database_uri``"""
+        return None
+
     @classmethod
     def adjust_database_uri(cls, uri, selected_schema: str):
         """Based on a URI and selected schema, return a new URI
@@ -668,7 +714,7 @@ class BaseEngineSpec:  # pylint: disable=too-many-public-methods
                 qry = partition_query
         sql = database.compile_sqla_query(qry)
         if indent:
-            sql = sqlparse.format(sql, reindent=True)
+            sql = sql_parse.format_sql(sql, reindent=True)
         return sql
 
     @classmethod
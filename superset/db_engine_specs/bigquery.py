@@ -17,7 +17,7 @@
 from datetime import datetime
 import hashlib
 import re
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterator, List, Tuple
 
 import pandas as pd
 from sqlalchemy import literal_column
@@ -67,6 +67,17 @@ class BigQueryEngineSpec(BaseEngineSpec):
     @classmethod
     def fetch_data(cls, cursor, limit: int) -> List[Tuple]:
         data = super(BigQueryEngineSpec, cls).fetch_data(cursor, limit)
+        return cls._unpack_rows(data)
+
+    @classmethod
+    def fetch_data_chunks(
+        cls, cursor, limit: int, chunk_size: int
+    ) -> Iterator[List[Tuple]]:
+        for data in super().fetch_data_chunks(cursor, limit, chunk_size):
+            yield cls._unpack_rows(data)
+
+    @staticmethod
+    def _unpack_rows(data: List) -> List:
         if data and type(data[0]).__name__ == "Row":
             data = [r.values() for r in data]
         return data
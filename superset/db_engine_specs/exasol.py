@@ -15,7 +15,7 @@
 # specific language governing permissions and limitations
 # under the License.
 # pylint: disable=C,R,W
-from typing import List, Tuple
+from typing import Iterator, List, Tuple
 
 from superset.db_engine_specs.base import BaseEngineSpec
 
@@ -41,7 +41,17 @@ class ExasolEngineSpec(BaseEngineSpec):
 
     @classmethod
     def fetch_data(cls, cursor, limit: int) -> List[Tuple]:
-        data = super().fetch_data(cursor, limit)
+        return cls._unpack_rows(super().fetch_data(cursor, limit))
+
+    @classmethod
+    def fetch_data_chunks(
+        cls, cursor, limit: int, chunk_size: int
+    ) -> Iterator[List[Tuple]]:
+        for data in super().fetch_data_chunks(cursor, limit, chunk_size):
+            yield cls._unpack_rows(data)
+
+    @staticmethod
+    def _unpack_rows(data: List) -> List:
         # Lists of `pyodbc.Row` need to be unpacked further
         if data and type(data[0]).__name__ == "Row":
             data = [[value for value in row] for row in data]
@@ -19,7 +19,7 @@ import logging
 import os
 import re
 import time
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from urllib import parse
 
 from sqlalchemy import Column
@@ -97,6 +97,21 @@ class HiveEngineSpec(PrestoEngineSpec):
         except pyhive.exc.ProgrammingError:
             return []
 
+    @classmethod
+    def fetch_data_chunks(
+        cls, cursor, limit: int, chunk_size: int
+    ) -> Iterator[List[Tuple]]:
+        import pyhive
+        from TCLIService import ttypes
+
+        state = cursor.poll()
+        if state.operationState == ttypes.TOperationState.ERROR_STATE:
+            raise Exception("Query error", state.errorMessage)
+        try:
+            yield from super().fetch_data_chunks(cursor, limit, chunk_size)
+        except pyhive.exc.ProgrammingError:
+            return
+
     @classmethod
     def create_table_from_csv(cls, form, table):  # pylint: disable=too-many-locals
         """Uploads a csv file and creates a superset datasource in Hive."""
@@ -187,6 +202,10 @@ class HiveEngineSpec(PrestoEngineSpec):
             return "CAST('{}' AS TIMESTAMP)".format(dttm.strftime("%Y-%m-%d %H:%M:%S"))
         return "'{}'".format(dttm.strftime("%Y-%m-%d %H:%M:%S"))
 
+    @classmethod
+    def get_default_schema(cls, uri) -> Optional[str]:
+        return parse.unquote(uri.database) if uri.database else "default"
+
     @classmethod
     def adjust_database_uri(cls, uri, selected_schema=None):
         if selected_schema:
@@ -245,6 +264,9 @@ class HiveEngineSpec(PrestoEngineSpec):
         """Updates progress information"""
         from pyhive import hive  # pylint: disable=no-name-in-module
 
+        # imported here to prevent circular imports
+        from superset.utils.query_status import ProgressReporter
+
         unfinished_states = (
             hive.ttypes.TOperationState.INITIALIZED_STATE,
             hive.ttypes.TOperationState.RUNNING_STATE,
@@ -254,46 +276,46 @@ class HiveEngineSpec(PrestoEngineSpec):
         tracking_url = None
         job_id = None
         query_id = query.id
-        while polled.operationState in unfinished_states:
-            query = session.query(type(query)).filter_by(id=query_id).one()
-            if query.status == QueryStatus.STOPPED:
-                cursor.cancel()
-                break
-
-            log = cursor.fetch_logs() or ""
-            if log:
-                log_lines = log.splitlines()
-                progress = cls.progress(log_lines)
-                logging.info(f"Query {query_id}: Progress total: {progress}")
-                needs_commit = False
-                if progress > query.progress:
-                    query.progress = progress
-                    needs_commit = True
-                if not tracking_url:
-                    tracking_url = cls.get_tracking_url(log_lines)
-                    if tracking_url:
-                        job_id = tracking_url.split("/")[-2]
-                        logging.info(
-                            f"Query {query_id}: Found the tracking url: {tracking_url}"
-                        )
-                        tracking_url = tracking_url_trans(tracking_url)
-                        logging.info(
-                            f"Query {query_id}: Transformation applied: {tracking_url}"
-                        )
-                        query.tracking_url = tracking_url
-                        logging.info(f"Query {query_id}: Job id: {job_id}")
-                        needs_commit = True
-                if job_id and len(log_lines) > last_log_line:
-                    # Wait for job id before logging things out
-                    # this allows for prefixing all log lines and becoming
-                    # searchable in something like Kibana
-                    for l in log_lines[last_log_line:]:
-                        logging.info(f"Query {query_id}: [{job_id}] {l}")
-                    last_log_line = len(log_lines)
-                if needs_commit:
-                    session.commit()
-            time.sleep(hive_poll_interval)
-            polled = cursor.poll()
+        reporter = ProgressReporter(query, session)
+        try:
+            while polled.operationState in unfinished_states:
+                if reporter.should_stop():
+                    cursor.cancel()
+                    break
+
+                log = cursor.fetch_logs() or ""
+                if log:
+                    log_lines = log.splitlines()
+                    progress = cls.progress(log_lines)
+                    logging.info(f"Query {query_id}: Progress total: {progress}")
+                    reporter.update(progress)
+                    if not tracking_url:
+                        tracking_url = cls.get_tracking_url(log_lines)
+                        if tracking_url:
+                            job_id = tracking_url.split("/")[-2]
+                            logging.info(
+                                f"Query {query_id}: "
+                                f"Found the tracking url: {tracking_url}"
+                            )
+                            tracking_url = tracking_url_trans(tracking_url)
+                            logging.info(
+                                f"Query {query_id}: "
+                                f"Transformation applied: {tracking_url}"
+                            )
+                            query.tracking_url = tracking_url
+                            logging.info(f"Query {query_id}: Job id: {job_id}")
+                            session.commit()
+                    if job_id and len(log_lines) > last_log_line:
+                        # Wait for job id before logging things out
+                        # this allows for prefixing all log lines and becoming
+                        # searchable in something like Kibana
+                        for line in log_lines[last_log_line:]:
+                            logging.info(f"Query {query_id}: [{job_id}] {line}")
+                        last_log_line = len(log_lines)
+                time.sleep(hive_poll_interval)
+                polled = cursor.poll()
+        finally:
+            reporter.flush()
 
     @classmethod
     def get_columns(
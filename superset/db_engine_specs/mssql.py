@@ -16,7 +16,7 @@
 # under the License.
 from datetime import datetime
 import re
-from typing import List, Optional, Tuple
+from typing import Iterator, List, Optional, Tuple
 
 from sqlalchemy.engine.interfaces import Dialect
 from sqlalchemy.types import String, TypeEngine, UnicodeText
@@ -52,7 +52,17 @@ class MssqlEngineSpec(BaseEngineSpec):
 
     @classmethod
     def fetch_data(cls, cursor, limit: int) -> List[Tuple]:
-        data = super().fetch_data(cursor, limit)
+        return cls._unpack_rows(super().fetch_data(cursor, limit))
+
+    @classmethod
+    def fetch_data_chunks(
+        cls, cursor, limit: int, chunk_size: int
+    ) -> Iterator[List[Tuple]]:
+        for data in super().fetch_data_chunks(cursor, limit, chunk_size):
+            yield cls._unpack_rows(data)
+
+    @staticmethod
+    def _unpack_rows(data: List) -> List:
         if data and type(data[0]).__name__ == "Row":
             data = [[elem for elem in r] for r in data]
         return data
@@ -15,7 +15,7 @@
 # specific language governing permissions and limitations
 # under the License.
 from datetime import datetime
-from typing import List, Optional, Tuple, TYPE_CHECKING
+from typing import Iterator, List, Optional, Tuple, TYPE_CHECKING
 
 from sqlalchemy.dialects.postgresql.base import PGInspector
 
@@ -51,6 +51,14 @@ class PostgresBaseEngineSpec(BaseEngineSpec):
             return cursor.fetchmany(limit)
         return cursor.fetchall()
 
+    @classmethod
+    def fetch_data_chunks(
+        cls, cursor, limit: int, chunk_size: int
+    ) -> Iterator[List[Tuple]]:
+        if not cursor.description:
+            return
+        yield from super().fetch_data_chunks(cursor, limit, chunk_size)
+
     @classmethod
     def epoch_to_dttm(cls) -> str:
         return "(timestamp 'epoch' + {col} * interval '1 second')"
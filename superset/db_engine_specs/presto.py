@@ -14,7 +14,7 @@
 # KIND, either express or implied.  See the License for the
 # specific language governing permissions and limitations
 # under the License.
-from collections import defaultdict, deque
+from collections import deque
 from contextlib import closing
 from datetime import datetime
 from distutils.version import StrictVersion
@@ -22,7 +22,7 @@ import logging
 import re
 import textwrap
 import time
-from typing import Any, cast, Dict, List, Optional, Tuple, TYPE_CHECKING
+from typing import Any, cast, Dict, List, Optional, Set, Tuple, TYPE_CHECKING
 from urllib import parse
 
 import simplejson as json
@@ -37,7 +37,7 @@ from superset.db_engine_specs.base import BaseEngineSpec
 from superset.exceptions import SupersetTemplateException
 from superset.models.sql_types.presto_sql_types import type_map as presto_type_map
 from superset.sql_parse import ParsedQuery
-from superset.utils import core as utils
+from superset.utils import core as utils, partition_cache
 
 if TYPE_CHECKING:
     # prevent circular imports
@@ -507,6 +507,13 @@ class PrestoEngineSpec(BaseEngineSpec):
 
         return cost
 
+    @classmethod
+    def get_default_schema(cls, uri) -> Optional[str]:
+        database = uri.database
+        if database and "/" in database:
+            return parse.unquote(database.split("/", 1)[1])
+        return None
+
     @classmethod
     def adjust_database_uri(cls, uri, selected_schema=None):
         database = uri.database
@@ -552,6 +559,14 @@ class PrestoEngineSpec(BaseEngineSpec):
             )
         return datasource_names
 
+    @classmethod
+    def has_nested_data(cls, columns: List[dict]) -> bool:
+        # arrays get unnested into rows of their own, rows into columns
+        return is_feature_enabled("PRESTO_EXPAND_DATA") and any(
+            (column.get("type") or "").upper().startswith(("ARRAY(", "ROW("))
+            for column in columns
+        )
+
     @classmethod
     def expand_data(  # pylint: disable=too-many-locals
         cls, columns: List[dict], data: List[dict]
@@ -584,55 +599,43 @@ class PrestoEngineSpec(BaseEngineSpec):
         # expanding ROW types into new columns
         to_process = deque((column, 0) for column in columns)
         all_columns: List[dict] = []
+        all_column_names: Set[str] = set()
         expanded_columns = []
         current_array_level = None
+
+        # When unnesting arrays the rows added for each row are kept in a group,
+        # along with the row itself. This is necessary when we expand multiple
+        # arrays, so that the arrays after the first reuse the rows added by the
+        # first. Every time we change a level in the nested arrays, each row
+        # starts a group of its own. Rows are only ever appended to their
+        # group, which keeps the expansion linear in the size of the result.
+        groups = [[row] for row in data]
         while to_process:
             column, level = to_process.popleft()
-            if column["name"] not in [column["name"] for column in all_columns]:
+            name = column["name"]
+            if name not in all_column_names:
                 all_columns.append(column)
+                all_column_names.add(name)
 
-            # When unnesting arrays we need to keep track of how many extra rows
-            # were added, for each original row. This is necessary when we expand
-            # multiple arrays, so that the arrays after the first reuse the rows
-            # added by the first. every time we change a level in the nested arrays
-            # we reinitialize this.
             if level != current_array_level:
-                unnested_rows: Dict[int, int] = defaultdict(int)
+                groups = [[row] for group in groups for row in group]
                 current_array_level = level
 
-            name = column["name"]
-
             if column["type"].startswith("ARRAY("):
                 # keep processing array children; we append to the right so that
                 # multiple nested arrays are processed breadth-first
                 to_process.append((get_children(column)[0], level + 1))
 
                 # unnest array objects data into new rows
-                i = 0
-                while i < len(data):
-                    row = data[i]
-                    values = row.get(name)
+                for group in groups:
+                    values = group[0].get(name)
                     if values:
-                        # how many extra rows we need to unnest the data?
-                        extra_rows = len(values) - 1
-
-                        # how many rows were already added for this row?
-                        current_unnested_rows = unnested_rows[i]
-
                         # add any necessary rows
-                        missing = extra_rows - current_unnested_rows
-                        for _ in range(missing):
-                            data.insert(i + current_unnested_rows + 1, {})
-                            unnested_rows[i] += 1
+                        group.extend({} for _ in range(len(values) - len(group)))
 
                         # unnest array into rows
-                        for j, value in enumerate(values):
-                            data[i + j][name] = value
-
-                        # skip newly unnested rows
-                        i += unnested_rows[i]
-
-                    i += 1
+                        for row, value in zip(group, values):
+                            row[name] = value
 
             if column["type"].startswith("ROW("):
                 # expand columns; we append them to the left so they are added
@@ -642,12 +645,18 @@ class PrestoEngineSpec(BaseEngineSpec):
                 expanded_columns.extend(expanded)
 
                 # expand row objects into new columns
-                for row in data:
-                    for value, col in zip(row.get(name) or [], expanded):
-                        row[col["name"]] = value
-
+                expanded_names = [col["name"] for col in expanded]
+                for group in groups:
+                    for row in group:
+                        values = row.get(name)
+                        if values:
+                            row.update(zip(expanded_names, values))
+
+        names = [column["name"] for column in all_columns]
         data = [
-            {k["name"]: row.get(k["name"], "") for k in all_columns} for row in data
+            {name: row.get(name, "") for name in names}
+            for group in groups
+            for row in group
         ]
 
         return all_columns, data, expanded_columns
@@ -712,43 +721,47 @@ class PrestoEngineSpec(BaseEngineSpec):
     @classmethod
     def handle_cursor(cls, cursor, query, session):
         """Updates progress information"""
+        # imported here to prevent circular imports
+        from superset.utils.query_status import ProgressReporter
+
         query_id = query.id
+        reporter = ProgressReporter(query, session)
         logging.info(f"Query {query_id}: Polling the cursor for progress")
         polled = cursor.poll()
         # poll returns dict -- JSON status information or ``None``
         # if the query is done
         # https://github.com/dropbox/PyHive/blob/
         # b34bdbf51378b3979eaf5eca9e956f06ddc36ca0/pyhive/presto.py#L178
-        while polled:
-            # Update the object and wait for the kill signal.
-            stats = polled.get("stats", {})
-
-            query = session.query(type(query)).filter_by(id=query_id).one()
-            if query.status in [QueryStatus.STOPPED, QueryStatus.TIMED_OUT]:
-                cursor.cancel()
-                break
-
-            if stats:
-                state = stats.get("state")
+        try:
+            while polled:
+                # Update the object and wait for the kill signal.
+                stats = polled.get("stats", {})
 
-                # if already finished, then stop polling
-                if state == "FINISHED":
+                if reporter.should_stop():
+                    cursor.cancel()
                     break
 
-                completed_splits = float(stats.get("completedSplits"))
-                total_splits = float(stats.get("totalSplits"))
-                if total_splits and completed_splits:
-                    progress = 100 * (completed_splits / total_splits)
-                    logging.info(
-                        "Query {} progress: {} / {} "  # pylint: disable=logging-format-interpolation
-                        "splits".format(query_id, completed_splits, total_splits)
-                    )
-                    if progress > query.progress:
-                        query.progress = progress
-                    session.commit()
-            time.sleep(1)
-            logging.info(f"Query {query_id}: Polling the cursor for progress")
-            polled = cursor.poll()
+                if stats:
+                    state = stats.get("state")
+
+                    # if already finished, then stop polling
+                    if state == "FINISHED":
+                        break
+
+                    completed_splits = float(stats.get("completedSplits"))
+                    total_splits = float(stats.get("totalSplits"))
+                    if total_splits and completed_splits:
+                        progress = 100 * (completed_splits / total_splits)
+                        logging.info(
+                            "Query {} progress: {} / {} "  # pylint: disable=logging-format-interpolation
+                            "splits".format(query_id, completed_splits, total_splits)
+                        )
+                        reporter.update(progress)
+                time.sleep(1)
+                logging.info(f"Query {query_id}: Polling the cursor for progress")
+                polled = cursor.poll()
+        finally:
+            reporter.flush()
 
     @classmethod
     def _extract_error_message(cls, e):
@@ -871,6 +884,19 @@ class PrestoEngineSpec(BaseEngineSpec):
         >>> latest_partition('foo_table')
         (['ds'], ('2018-01-01',))
         """
+        return partition_cache.get(
+            database,
+            schema,
+            table_name,
+            f"{cls.engine}.latest_partition",
+            lambda: cls._latest_partition(table_name, schema, database, show_first),
+            {"show_first": show_first},
+        )
+
+    @classmethod
+    def _latest_partition(
+        cls, table_name: str, schema: str, database, show_first: bool = False
+    ):
         indexes = database.get_indexes(table_name, schema)
         if len(indexes[0]["column_names"]) < 1:
             raise SupersetTemplateException(
@@ -915,6 +941,17 @@ class PrestoEngineSpec(BaseEngineSpec):
         >>> latest_sub_partition('sub_partition_table', event_type='click')
         '2018-01-01'
         """
+        return partition_cache.get(
+            database,
+            schema,
+            table_name,
+            f"{cls.engine}.latest_sub_partition",
+            lambda: cls._latest_sub_partition(table_name, schema, database, **kwargs),
+            kwargs,
+        )
+
+    @classmethod
+    def _latest_sub_partition(cls, table_name, schema, database, **kwargs):
         indexes = database.get_indexes(table_name, schema)
         part_fields = indexes[0]["column_names"]
         for k in kwargs.keys():  # pylint: disable=consider-iterating-dictionary
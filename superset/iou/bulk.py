@@ -0,0 +1,204 @@
+import csv
+import datetime
+import io
+
+import pytz
+from sqlalchemy import bindparam
+from sqlalchemy.dialects import postgresql
+
+from superset import db
+from .models import DropdownBoolean, IOUBlacklist, Subscriber
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'f', 'no', 'n'}
+
+
+class BulkRowError(ValueError):
+    pass
+
+
+def read_rows(file=None, data=None):
+    """
+    Returns the rows of an uploaded CSV file (with a header line), or of a JSON list of objects.
+    """
+    if file is not None:
+        text = io.TextIOWrapper(file, encoding='utf-8-sig')
+        return list(csv.DictReader(text))
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        raise BulkRowError('Expected a CSV file or a JSON list of objects')
+    return data
+
+
+def to_int(row, key):
+    try:
+        return int(str(row[key]).strip())
+    except KeyError:
+        raise BulkRowError('Missing {}'.format(key))
+    except ValueError:
+        raise BulkRowError('Invalid {}: {}'.format(key, row[key]))
+
+
+def to_bool(row, key):
+    value = str(row.get(key, '')).strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise BulkRowError('Invalid {}: {}'.format(key, row.get(key)))
+
+
+def now():
+    # same time as model_before_save in models.py, as a datetime the bulk statements can bind on any database
+    timezone = pytz.timezone("Asia/Jakarta")
+    return datetime.datetime.now(timezone).replace(tzinfo=None, microsecond=0)
+
+
+def validate(rows, validate_row):
+    """
+    Validates all the rows, returns the valid ones keyed on subscriber_id (the last one wins when a subscriber
+    appears several times) and the errors of the others along with their row number.
+    """
+    valid = {}
+    errors = []
+    for index, row in enumerate(rows, start=1):
+        try:
+            values = validate_row(row)
+        except BulkRowError as e:
+            errors.append({'row': index, 'error': str(e)})
+        else:
+            valid[values['subscriber_id']] = values
+    return valid, errors
+
+
+def batches(values, batch_size):
+    values = list(values)
+    for start in range(0, len(values), batch_size):
+        yield values[start:start + batch_size]
+
+
+def existing_ids(model, ids):
+    return {
+        subscriber_id for subscriber_id, in
+        db.session.query(model.subscriber_id).filter(model.subscriber_id.in_(ids))
+    }
+
+
+def upsert_blacklist(rows, batch_size, on_batch=None):
+    """
+    Inserts or updates IOUBlacklist rows (subscriber_id, blacklisted, note) in batches, within a single transaction.
+    `blacklisted` is either the id or the value of a DropdownBoolean.
+    Statements are issued in bulk, bypassing the per row ORM events, `on_batch(batch, summary)` gets called
+    after each batch instead, before the transaction is committed.
+    """
+    choices = {}
+    for choice in db.session.query(DropdownBoolean):
+        choices[str(choice.id)] = choice.id
+        choices[str(choice.value).strip().lower()] = choice.id
+
+    def validate_row(row):
+        blacklisted = str(row.get('blacklisted', '')).strip().lower()
+        if blacklisted not in choices:
+            raise BulkRowError('Invalid blacklisted: {}'.format(row.get('blacklisted')))
+        note = str(row.get('note') or '').strip()
+        if not note or len(note) > 255:
+            raise BulkRowError('The note is required and at most 255 characters long')
+        return {
+            'subscriber_id': to_int(row, 'subscriber_id'),
+            'opted_out': choices[blacklisted],
+            'note': note,
+        }
+
+    valid, errors = validate(rows, validate_row)
+    table = IOUBlacklist.__table__
+    is_postgres = db.session.get_bind(IOUBlacklist.__mapper__).dialect.name == 'postgresql'
+    result = {'inserted': 0, 'updated': 0, 'errors': errors}
+    try:
+        for batch in batches(valid.values(), batch_size):
+            last_updated_dt = now()
+            for values in batch:
+                values['last_updated_dt'] = last_updated_dt
+            existing = existing_ids(IOUBlacklist, [values['subscriber_id'] for values in batch])
+            if is_postgres:
+                stmt = postgresql.insert(table)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[table.c.subscriber_id],
+                    set_={
+                        'opted_out': stmt.excluded.opted_out,
+                        'note': stmt.excluded.note,
+                        'last_updated_dt': stmt.excluded.last_updated_dt,
+                    })
+                db.session.execute(stmt, batch, mapper=IOUBlacklist.__mapper__)
+            else:
+                inserts = [values for values in batch if values['subscriber_id'] not in existing]
+                # bound parameters can't be named after the updated columns
+                updates = [
+                    {'b_{}'.format(key): value for key, value in values.items()}
+                    for values in batch if values['subscriber_id'] in existing
+                ]
+                if inserts:
+                    db.session.execute(table.insert(), inserts, mapper=IOUBlacklist.__mapper__)
+                if updates:
+                    stmt = table.update().where(table.c.subscriber_id == bindparam('b_subscriber_id')).values(
+                        opted_out=bindparam('b_opted_out'),
+                        note=bindparam('b_note'),
+                        last_updated_dt=bindparam('b_last_updated_dt'))
+                    db.session.execute(stmt, updates, mapper=IOUBlacklist.__mapper__)
+            summary = {'inserted': len(batch) - len(existing), 'updated': len(existing)}
+            result['inserted'] += summary['inserted']
+            result['updated'] += summary['updated']
+            if on_batch:
+                on_batch(batch, summary)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
+
+
+def update_loans_disabled(rows, batch_size, on_batch=None):
+    """
+    Sets Subscriber.loans_disabled from (subscriber_id, loans_disabled) rows, in batches within a single transaction.
+    Unknown subscribers are reported as row errors.
+    """
+    def validate_row(row):
+        return {
+            'subscriber_id': to_int(row, 'subscriber_id'),
+            'loans_disabled': to_bool(row, 'loans_disabled'),
+        }
+
+    valid, errors = validate(rows, validate_row)
+    row_numbers = {}
+    for index, row in enumerate(rows, start=1):
+        try:
+            row_numbers[to_int(row, 'subscriber_id')] = index
+        except BulkRowError:
+            pass
+
+    table = Subscriber.__table__
+    stmt = table.update().where(table.c.subscriber_id == bindparam('b_subscriber_id')).values(
+        loans_disabled=bindparam('b_loans_disabled'))
+    result = {'updated': 0, 'errors': errors}
+    try:
+        for batch in batches(valid.values(), batch_size):
+            existing = existing_ids(Subscriber, [values['subscriber_id'] for values in batch])
+            for values in batch:
+                if values['subscriber_id'] not in existing:
+                    errors.append({
+                        'row': row_numbers[values['subscriber_id']],
+                        'error': 'Unknown subscriber_id: {}'.format(values['subscriber_id']),
+                    })
+            updates = [
+                {'b_subscriber_id': values['subscriber_id'], 'b_loans_disabled': values['loans_disabled']}
+                for values in batch if values['subscriber_id'] in existing
+            ]
+            if updates:
+                db.session.execute(stmt, updates, mapper=Subscriber.__mapper__)
+            result['updated'] += len(updates)
+            if on_batch:
+                on_batch(batch, {'updated': len(updates)})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    errors.sort(key=lambda error: error['row'])
+    return result
@@ -0,0 +1,120 @@
+import datetime
+
+from dateutil import parser
+from flask_appbuilder.models.sqla.interface import SQLAInterface
+from itsdangerous import BadData, URLSafeSerializer
+from sqlalchemy import and_, func, literal, or_
+from sqlalchemy.orm import joinedload
+
+from superset import app
+
+
+class IouSQLAInterface(SQLAInterface):
+    """
+    SQLAInterface for the large IOU tables.
+
+    eager_load: relations loaded along with the listed rows, in the same query, instead of one query per row
+    count_limit: when set, list counts stop at this number of rows instead of running an exact COUNT(*)
+    on the whole table, deeper rows are reached with query_keyset
+    """
+
+    def __init__(self, obj, session=None, eager_load=None, count_limit=None):
+        super(IouSQLAInterface, self).__init__(obj, session=session)
+        self.eager_load = eager_load or []
+        self.count_limit = count_limit
+
+    def _query_select_options(self, query, select_columns=None):
+        query = super(IouSQLAInterface, self)._query_select_options(query, select_columns)
+        return query.options(*[joinedload(getattr(self.obj, relation)) for relation in self.eager_load])
+
+    def query(self, filters=None, order_column="", order_direction="", page=None, page_size=None,
+              select_columns=None):
+        # ordering on columns of related models needs joins, leave it to FAB
+        if not self.count_limit or '.' in order_column:
+            return super(IouSQLAInterface, self).query(
+                filters, order_column, order_direction, page, page_size, select_columns)
+
+        query = self._query_select_options(self.session.query(self.obj), select_columns)
+        query = self._get_base_query(
+            query=query, filters=filters, order_column=order_column, order_direction=order_direction)
+        if page:
+            query = query.offset(page * page_size)
+        if page_size:
+            query = query.limit(page_size)
+        return self.approximate_count(filters), query.all()
+
+    def approximate_count(self, filters=None):
+        """
+        Counts the rows matching the filters, up to count_limit.
+        """
+        query = self._get_base_query(query=self.session.query(self.obj), filters=filters)
+        limited = query.limit(self.count_limit).subquery()
+        return self.session.query(func.count('*')).select_from(limited).scalar()
+
+    def _keyset_columns(self, order_column):
+        return getattr(self.obj, order_column), getattr(self.obj, self.get_pk_name())
+
+    def query_keyset(self, filters=None, order_column="", order_direction="asc", after=None, page_size=100):
+        """
+        Seek pagination: returns the page_size rows following the `after` cursor, in (order_column, pk) order,
+        and the cursor of the next page, None on the last page.
+        Unlike OFFSET paging, the cost of fetching a page doesn't grow with its depth, as long as
+        (order_column, pk) is indexed.
+        NULLs come last in ascending order and first in descending order, whatever the database defaults to.
+        """
+        column, pk = self._keyset_columns(order_column)
+        query = self._query_select_options(self.session.query(self.obj))
+        query = self._get_base_query(query=query, filters=filters)
+        if after:
+            value, pk_value = self.decode_cursor(order_column, after)
+            if value is not None:
+                # booleans too are compared as bound values
+                value = literal(value, column.type)
+            if order_direction == 'desc':
+                if value is None:
+                    query = query.filter(or_(column.isnot(None), and_(column.is_(None), pk < pk_value)))
+                else:
+                    query = query.filter(or_(column < value, and_(column == value, pk < pk_value)))
+            else:
+                if value is None:
+                    query = query.filter(and_(column.is_(None), pk > pk_value))
+                else:
+                    query = query.filter(
+                        or_(column > value, and_(column == value, pk > pk_value), column.is_(None)))
+        if order_direction == 'desc':
+            query = query.order_by(column.desc().nullsfirst(), pk.desc())
+        else:
+            query = query.order_by(column.asc().nullslast(), pk.asc())
+
+        # one more row than asked tells whether there's a next page
+        items = query.limit(page_size + 1).all()
+        next_cursor = None
+        if len(items) > page_size:
+            items = items[:page_size]
+            last = items[-1]
+            next_cursor = self.encode_cursor(getattr(last, order_column), getattr(last, self.get_pk_name()))
+        return items, next_cursor
+
+    def cursor_serializer(self):
+        return URLSafeSerializer(
+            app.config['SECRET_KEY'], salt='iou-keyset-cursor', serializer_kwargs={'default': str})
+
+    def encode_cursor(self, value, pk_value):
+        """
+        Cursors are signed, the values they hold end up in the query of the next page.
+        """
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            value = value.isoformat()
+        return self.cursor_serializer().dumps([value, pk_value])
+
+    def decode_cursor(self, order_column, cursor):
+        """
+        Raises ValueError when the cursor wasn't returned by encode_cursor.
+        """
+        try:
+            value, pk_value = self.cursor_serializer().loads(cursor)
+        except BadData:
+            raise ValueError('Invalid cursor')
+        if value is not None and (self.is_datetime(order_column) or self.is_date(order_column)):
+            value = parser.parse(value)
+        return value, pk_value
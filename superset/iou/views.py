@@ -1,26 +1,36 @@
-from flask import request, g, json
+import datetime
+import logging
+import re
+from uuid import uuid4
+
+from flask import g, json, request
+from flask_appbuilder import expose
 from flask_appbuilder.fieldwidgets import BS3TextFieldWidget, Select2Widget
 from flask_appbuilder.forms import GeneralModelConverter
+from flask_appbuilder.models.sqla.filters import (
+    FilterEqualFunction,
+    FilterGreater,
+    FilterNotEqual,
+    FilterStartsWith,
+)
 from flask_appbuilder.models.sqla.interface import SQLAInterface
-from flask_appbuilder.models.sqla.filters import FilterGreater,FilterNotEqual
-from superset.views.base import SupersetModelView
-from superset.config import AUDIT_LOGGING_PATH
-from superset import db
-
-from wtforms.fields import StringField, SelectField
-from uuid import uuid4
-
-from .widgets import BS3TextFieldROWidget
-import datetime
-import re
-import logging
+from flask_appbuilder.security.decorators import has_access_api, permission_name
+from flask_appbuilder.urltools import get_filter_args
+from wtforms.fields import SelectField, StringField
 
+from superset import db
+from superset.config import AUDIT_LOGGING_PATH, IOU_BULK_BATCH_SIZE, IOU_LIST_COUNT_LIMIT
+from superset.utils.core import pessimistic_json_iso_dttm_ser
+from superset.views.base import json_error_response, json_success, SupersetModelView
+from .bulk import BulkRowError, read_rows, update_loans_disabled, upsert_blacklist
+from .interface import IouSQLAInterface
 from .models import (
     CompanyBrand,
     FulfillmentAction,
     FulfillmentActionType,
     FulfillmentActionTypeAttribute,
     FulfillmentActionValue,
+    IOUBlacklist,
     Loan,
     LoanChannel,
     LoanTransaction,
@@ -28,14 +38,12 @@ from .models import (
     LoanType,
     LoanTypeLimit,
     NotifyPerson,
-    NotifyType,
     NotifySubscription,
+    NotifyType,
     Segment,
     Subscriber,
-    IOUBlacklist,
 )
-
-from flask_appbuilder.models.sqla.filters import FilterEqualFunction, FilterStartsWith
+from .widgets import BS3TextFieldROWidget
 
 
 audit_logger = logging.getLogger('AuditLogs')
@@ -88,6 +96,96 @@ class IouModelView(SupersetModelView):
     """
     text_filter_col_mapping = {}
 
+    """
+    Maximum number of rows returned per page by the keyset api.
+    """
+    keyset_max_page_size = 1000
+
+    @expose('/api/keyset/')
+    @has_access_api
+    @permission_name('list')
+    def keyset(self):
+        """
+        Lists the rows in base_order, a page at a time, with seek pagination.
+        Takes the usual list filters (_flt_*), page_size and the `after` cursor returned along with the
+        previous page.
+        Only available for views whose datamodel is an IouSQLAInterface.
+        """
+        if not isinstance(self.datamodel, IouSQLAInterface) or not self.base_order:
+            return json_error_response('Keyset pagination is not supported by this view', status=404)
+        try:
+            page_size = min(int(request.args.get('page_size', 100)), self.keyset_max_page_size)
+        except ValueError:
+            return json_error_response('Invalid page_size', status=400)
+
+        filters = self.datamodel.get_filters(self.search_columns)
+        get_filter_args(filters)
+        order_column, order_direction = self.base_order
+        try:
+            items, next_cursor = self.datamodel.query_keyset(
+                filters.get_joined_filters(self._base_filters), order_column, order_direction,
+                after=request.args.get('after'), page_size=page_size)
+        except (TypeError, ValueError):
+            return json_error_response('Invalid cursor', status=400)
+
+        result = [
+            {col: str(value) if isinstance(value, db.Model) else value for col, value in row.items()}
+            for row in self.datamodel.get_values(items, self.list_columns)
+        ]
+        return json_success(json.dumps({
+            'pks': self.datamodel.get_keys(items),
+            'result': result,
+            'next': next_cursor,
+        }, default=pessimistic_json_iso_dttm_ser))
+
+    """
+    Function from superset.iou.bulk applying the rows uploaded to the bulk api, None when the view doesn't
+    support bulk changes.
+    """
+    bulk_operation = None
+
+    @expose('/api/bulk/', methods=['POST'])
+    @has_access_api
+    @permission_name('edit')
+    def bulk(self):
+        """
+        Applies the rows of an uploaded CSV file (`file`), or of a JSON list of objects, in batches of
+        IOU_BULK_BATCH_SIZE statements within a single transaction. Rows failing validation are skipped and
+        reported with their row number. One audit record is written per batch.
+        """
+        if not self.bulk_operation:
+            return json_error_response('Bulk changes are not supported by this view', status=404)
+        try:
+            rows = read_rows(file=request.files.get('file'), data=request.get_json(silent=True))
+        except (BulkRowError, UnicodeDecodeError) as e:
+            return json_error_response(str(e), status=400)
+
+        request_id = self.request_id()
+        operation = 'BULK_{}'.format(self.bulk_operation.__name__.upper())
+
+        # the batches run in a single transaction, they're audited once it's committed or rolled back
+        audited_batches = []
+
+        def audit_batch(batch, summary):
+            request_data = json.dumps({
+                'rows': len(batch),
+                'subscriber_ids': [batch[0]['subscriber_id'], batch[-1]['subscriber_id']],
+            })
+            audited_batches.append((request_data, json.dumps(summary)))
+
+        self.request_begin()
+        try:
+            result = self.bulk_operation(rows, IOU_BULK_BATCH_SIZE, on_batch=audit_batch)
+        except Exception as e:
+            logging.exception(e)
+            for request_data, response_data in audited_batches:
+                self.audit_log(request_id, g.request_begin, operation, False, request_data, response_data)
+            self.audit_log(request_id, g.request_begin, operation, False, json.dumps({'rows': len(rows)}), str(e))
+            return json_error_response(str(e), status=500)
+        for request_data, response_data in audited_batches:
+            self.audit_log(request_id, g.request_begin, operation, True, request_data, response_data)
+        return json_success(json.dumps(result))
+
     def to_json(self, inst):
         """
         Jsonify the sql alchemy query result.
@@ -410,7 +508,8 @@ class FulfillmentActionView(IouModelView):
 
 
 class LoanTransactionView(IouModelView):
-    datamodel = SQLAInterface(LoanTransaction)
+    datamodel = IouSQLAInterface(
+        LoanTransaction, eager_load=['loan_transaction_type', 'subscriber'], count_limit=IOU_LIST_COUNT_LIMIT)
 
     list_columns = [
         'loan_transaction_type', 'subscriber', 'amount','cdmainid', 'transaction_dt', 'transaction_data',
@@ -429,7 +528,9 @@ class LoanTransactionView(IouModelView):
 
 
 class OutstandingLoanView(IouModelView):
-    datamodel = SQLAInterface(Loan)
+    datamodel = IouSQLAInterface(
+        Loan, eager_load=['subscriber', 'loan_type', 'offer_channel', 'trigger_channel'],
+        count_limit=IOU_LIST_COUNT_LIMIT)
 
     base_filters = [['outstanding_amount', FilterGreater, 0],['status',FilterNotEqual,'Loan Failed']]
 
@@ -447,7 +548,9 @@ class OutstandingLoanView(IouModelView):
 
 
 class LoanView(IouModelView):
-    datamodel = SQLAInterface(Loan)
+    datamodel = IouSQLAInterface(
+        Loan, eager_load=['subscriber', 'loan_type', 'offer_channel', 'trigger_channel'],
+        count_limit=IOU_LIST_COUNT_LIMIT)
 
     list_columns = show_columns = [
         'subscriber', 'loan_type', 'offer_channel', 'trigger_channel', 'principal_amount', 'origination_fee','cdmainid',
@@ -619,6 +722,8 @@ class SubscriberView(IouModelView):
 
     related_views = [LoanTypeLimitView, OutstandingLoanView, LoanView, LoanTransactionView]
 
+    bulk_operation = staticmethod(update_loans_disabled)
+
 class IOUBlacklistView(IouModelView):
     datamodel = SQLAInterface(IOUBlacklist)
 
@@ -636,3 +741,5 @@ class IOUBlacklistView(IouModelView):
     order_columns = ['subscriber_id','last_updated_dt']
 
     base_order = ("last_updated_dt", "desc")
+
+    bulk_operation = staticmethod(upsert_blacklist)
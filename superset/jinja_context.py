@@ -17,6 +17,7 @@
 # pylint: disable=C,R,W
 """Defines the templating context for SQL Lab"""
 from datetime import datetime, timedelta
+import hashlib
 import inspect
 import json
 import random
@@ -26,9 +27,11 @@ import uuid
 
 from dateutil.relativedelta import relativedelta
 from flask import g, request
+from jinja2 import Template
 from jinja2.sandbox import SandboxedEnvironment
 
 from superset import app
+from superset.utils.lru_cache import LRUCache
 
 config = app.config
 BASE_CONTEXT = {
@@ -41,6 +44,18 @@ BASE_CONTEXT = {
 }
 BASE_CONTEXT.update(config.get("JINJA_CONTEXT_ADDONS", {}))
 
+# Compiling a template takes much longer than rendering it, and the same SQL is
+# rendered by every query of a virtual dataset. The environment and the compiled
+# templates are shared by the processors, each render gets its own context
+template_env = SandboxedEnvironment()
+template_cache = LRUCache(config.get("JINJA_TEMPLATE_CACHE_SIZE"))
+
+
+def get_template(sql: str) -> Template:
+    """Returns the template compiled from the sql, cached by its hash"""
+    key = hashlib.sha1(sql.encode("utf-8")).hexdigest()
+    return template_cache.get(key, lambda: template_env.from_string(sql))
+
 
 def url_param(param: str, default: Optional[str] = None) -> Optional[Any]:
     """Read a url or post parameter and use it in your SQL Lab query
@@ -209,7 +224,7 @@ class BaseTemplateProcessor:
         self.context.update(BASE_CONTEXT)
         if self.engine:
             self.context[self.engine] = self
-        self.env = SandboxedEnvironment()
+        self.env = template_env
 
     def process_template(self, sql: str, **kwargs) -> str:
         """Processes a sql template
@@ -218,7 +233,7 @@ class BaseTemplateProcessor:
         >>> process_template(sql)
         "SELECT '2017-01-01T00:00:00'"
         """
-        template = self.env.from_string(sql)
+        template = get_template(sql)
         kwargs.update(self.context)
         return template.render(kwargs)
 
@@ -16,18 +16,21 @@
 # under the License.
 # pylint: disable=C,R,W
 """A collection of ORM sqlalchemy models for Superset"""
+from collections import defaultdict
 from contextlib import closing
 from copy import copy, deepcopy
 from datetime import datetime
+import itertools
 import json
 import logging
 import textwrap
-from typing import List
+from typing import Dict, Iterable, List, Tuple, TYPE_CHECKING
 
 from flask import escape, g, Markup, request
 from flask_appbuilder import Model
 from flask_appbuilder.models.decorators import renders
 from flask_appbuilder.security.sqla.models import User
+import humanize
 import numpy
 import pandas as pd
 import sqlalchemy as sqla
@@ -45,23 +48,33 @@ from sqlalchemy import (
 )
 from sqlalchemy.engine import url
 from sqlalchemy.engine.url import make_url
-from sqlalchemy.orm import relationship, sessionmaker, subqueryload
+from sqlalchemy.orm import relationship, Session, sessionmaker, subqueryload
 from sqlalchemy.orm.session import make_transient
 from sqlalchemy.pool import NullPool
 from sqlalchemy.schema import UniqueConstraint
 from sqlalchemy_utils import EncryptedType
-import sqlparse
 
-from superset import app, db, db_engine_specs, is_feature_enabled, security_manager
+from superset import (
+    app,
+    bootstrap_cache,
+    db,
+    db_engine_specs,
+    is_feature_enabled,
+    security_manager,
+    sql_parse,
+)
 from superset.connectors.connector_registry import ConnectorRegistry
 from superset.legacy import update_time_range
 from superset.models.helpers import AuditMixinNullable, ImportMixin
 from superset.models.tags import ChartUpdater, DashboardUpdater, FavStarUpdater
 from superset.models.user_attributes import UserAttribute
-from superset.utils import cache as cache_util, core as utils
+from superset.utils import cache as cache_util, core as utils, engine_registry
 from superset.viz import viz_types
 from urllib import parse  # noqa
 
+if TYPE_CHECKING:
+    from superset.connectors.base.models import BaseDatasource
+
 config = app.config
 custom_password_store = config.get("SQLALCHEMY_CUSTOM_PASSWORD_STORE")
 stats_logger = config.get("STATS_LOGGER")
@@ -202,7 +215,11 @@ class Slice(Model, AuditMixinNullable, ImportMixin):
     @datasource.getter  # type: ignore
     @utils.memoized
     def get_datasource(self):
-        return db.session.query(self.cls_model).filter_by(id=self.datasource_id).first()
+        if self.datasource_id is None:
+            return None
+        # unlike a query, get doesn't hit the database for datasources already
+        # loaded in the session
+        return db.session.query(self.cls_model).get(self.datasource_id)
 
     @renders("datasource_name")
     def datasource_link(self):
@@ -493,6 +510,90 @@ class Dashboard(Model, AuditMixinNullable, ImportMixin):
             "position_json": positions,
         }
 
+    def get_slice_refs(self) -> List[Tuple[int, str, int, datetime]]:
+        """Returns the id, datasource type, datasource id and modification
+        time of the slices, without loading them"""
+        return (
+            db.session.query(
+                Slice.id, Slice.datasource_type, Slice.datasource_id, Slice.changed_on
+            )
+            .join(dashboard_slices, dashboard_slices.c.slice_id == Slice.id)
+            .filter(dashboard_slices.c.dashboard_id == self.id)
+            .all()
+        )
+
+    @staticmethod
+    def get_datasources_by_uids(
+        datasource_refs: Iterable[Tuple[str, int]], eager: bool = False
+    ) -> Dict[str, "BaseDatasource"]:
+        """Loads datasources with a query per type, keyed on their uid"""
+        ids_by_type = defaultdict(set)
+        for datasource_type, datasource_id in datasource_refs:
+            if datasource_type in ConnectorRegistry.sources:
+                ids_by_type[datasource_type].add(datasource_id)
+        return {
+            datasource.uid: datasource
+            for datasource_type, datasource_ids in ids_by_type.items()
+            for datasource in ConnectorRegistry.get_datasources_by_ids(
+                db.session, datasource_type, datasource_ids, eager=eager
+            )
+        }
+
+    def get_bootstrap_data(self) -> Tuple[Dict, Dict[str, Dict]]:
+        """Returns ``data`` and the data of the datasources of the slices,
+        keyed on their uid
+
+        Both are cached until the dashboard, one of its slices or of their
+        datasources changes.
+        """
+        refs = self.get_slice_refs()
+        datasource_refs = {
+            f"{datasource_id}__{datasource_type}": (datasource_type, datasource_id)
+            for _, datasource_type, datasource_id, _ in refs
+        }
+
+        def compute_data():
+            # slices find their datasource in the session rather than
+            # querying it one by one
+            self.get_datasources_by_uids(datasource_refs.values(), eager=True)
+            return self.data
+
+        def compute_datasources(uids):
+            datasources = self.get_datasources_by_uids(
+                [datasource_refs[uid] for uid in uids], eager=True
+            )
+            return {
+                uid: datasources[uid].data if uid in datasources else None
+                for uid in uids
+            }
+
+        data = bootstrap_cache.get(
+            f"dashboard_{self.id}",
+            [f"dashboard_{self.id}"]
+            + [f"slice_{slice_id}" for slice_id, _, _, _ in refs]
+            + [f"datasource_{uid}" for uid in datasource_refs],
+            compute_data,
+        )
+        datasources = bootstrap_cache.get_many(
+            {uid: [f"datasource_{uid}", "databases"] for uid in datasource_refs},
+            compute_datasources,
+        )
+
+        # the relative times go stale, unlike the rest
+        changed_on = {slice_id: dttm for slice_id, _, _, dttm in refs}
+        for slice_data in data["slices"]:
+            dttm = changed_on.get(slice_data["slice_id"])
+            if dttm:
+                humanized = humanize.naturaltime(datetime.now() - dttm)
+                slice_data["changed_on_humanized"] = humanized
+                slice_data["modified"] = Markup(
+                    f'<span class="no-wrap">{humanized}</span>'
+                )
+        return (
+            data,
+            {uid: ds_data for uid, ds_data in datasources.items() if ds_data},
+        )
+
     @property
     def params(self):
         return self.json_metadata
@@ -873,10 +974,31 @@ class Database(Model, AuditMixinNullable, ImportMixin):
 
     @utils.memoized(watch=("impersonate_user", "sqlalchemy_uri_decrypted", "extra"))
     def get_sqla_engine(self, schema=None, nullpool=True, user_name=None, source=None):
-        extra = self.get_extra()
         url = make_url(self.sqlalchemy_uri_decrypted)
         url = self.db_engine_spec.adjust_database_uri(url, schema)
         effective_username = self.get_effective_user(url, user_name)
+
+        if config.get("SQLALCHEMY_ENGINE_REGISTRY") and self.id is not None:
+            # pooled engines are shared by every caller, whatever nullpool says
+            fingerprint = engine_registry.get_fingerprint(
+                self.sqlalchemy_uri_decrypted, self.extra, self.impersonate_user
+            )
+            return engine_registry.engine_registry.get_engine(
+                self.id,
+                fingerprint,
+                schema,
+                effective_username,
+                source,
+                lambda: self._create_sqla_engine(
+                    url, effective_username, source, pooled=True
+                ),
+            )
+        return self._create_sqla_engine(
+            url, effective_username, source, pooled=not nullpool
+        )
+
+    def _create_sqla_engine(self, url, effective_username, source, pooled):
+        extra = self.get_extra()
         # If using MySQL or Presto for example, will set url.username
         # If using Hive, will not do anything yet since that relies on a
         # configuration parameter instead.
@@ -888,8 +1010,10 @@ class Database(Model, AuditMixinNullable, ImportMixin):
         logging.info("Database.get_sqla_engine(). Masked URL: {0}".format(masked_url))
 
         params = extra.get("engine_params", {})
-        if nullpool:
+        if not pooled:
             params["poolclass"] = NullPool
+        elif config.get("SQLALCHEMY_ENGINE_REGISTRY"):
+            params = engine_registry.get_pool_params(url, params)
 
         # If using Hive, this will set hive.server2.proxy.user=$effective_username
         configuration = {}
@@ -916,19 +1040,41 @@ class Database(Model, AuditMixinNullable, ImportMixin):
     def get_quoter(self):
         return self.get_dialect().identifier_preparer.quote
 
-    def get_df(self, sql, schema, mutator=None):
-        sqls = [str(s).strip().strip(";") for s in sqlparse.parse(sql)]
+    def _get_df_engine(self, schema):
         source_key = None
         if request and request.referrer:
             if "/superset/dashboard/" in request.referrer:
                 source_key = "dashboard"
             elif "/superset/explore/" in request.referrer:
                 source_key = "chart"
-        engine = self.get_sqla_engine(
+        return self.get_sqla_engine(
             schema=schema, source=utils.sources.get(source_key, None)
         )
+
+    def _execute_sql(self, engine, cursor, sql, schema):
+        """Runs all the statements in ``sql`` and returns the column names of the
+        last one, whose rows are left in ``cursor`` to be fetched"""
+        sqls = [str(s).strip().strip(";") for s in sql_parse.parse(sql)]
         username = utils.get_username()
 
+        def _log_query(sql):
+            if log_query:
+                log_query(engine.url, sql, schema, username, __name__, security_manager)
+
+        for sql in sqls[:-1]:
+            _log_query(sql)
+            self.db_engine_spec.execute(cursor, sql)
+            cursor.fetchall()
+
+        _log_query(sqls[-1])
+        self.db_engine_spec.execute(cursor, sqls[-1])
+
+        if cursor.description is not None:
+            return [col_desc[0] for col_desc in cursor.description]
+        return []
+
+    @staticmethod
+    def _convert_nested_columns(df):
         def needs_conversion(df_series):
             if df_series.empty:
                 return False
@@ -936,25 +1082,16 @@ class Database(Model, AuditMixinNullable, ImportMixin):
                 return True
             return False
 
-        def _log_query(sql):
-            if log_query:
-                log_query(engine.url, sql, schema, username, __name__, security_manager)
+        for k, v in df.dtypes.items():
+            if v.type == numpy.object_ and needs_conversion(df[k]):
+                df[k] = df[k].apply(utils.json_dumps_w_dates)
+        return df
 
+    def get_df(self, sql, schema, mutator=None):
+        engine = self._get_df_engine(schema)
         with closing(engine.raw_connection()) as conn:
             with closing(conn.cursor()) as cursor:
-                for sql in sqls[:-1]:
-                    _log_query(sql)
-                    self.db_engine_spec.execute(cursor, sql)
-                    cursor.fetchall()
-
-                _log_query(sqls[-1])
-                self.db_engine_spec.execute(cursor, sqls[-1])
-
-                if cursor.description is not None:
-                    columns = [col_desc[0] for col_desc in cursor.description]
-                else:
-                    columns = []
-
+                columns = self._execute_sql(engine, cursor, sql, schema)
                 df = pd.DataFrame.from_records(
                     data=list(cursor.fetchall()), columns=columns, coerce_float=True
                 )
@@ -962,10 +1099,26 @@ class Database(Model, AuditMixinNullable, ImportMixin):
                 if mutator:
                     df = mutator(df)
 
-                for k, v in df.dtypes.items():
-                    if v.type == numpy.object_ and needs_conversion(df[k]):
-                        df[k] = df[k].apply(utils.json_dumps_w_dates)
-                return df
+                return self._convert_nested_columns(df)
+
+    def iter_df(self, sql, schema, chunk_size):
+        """Same as ``get_df`` but yields the results as dataframes of at most
+        ``chunk_size`` rows, fetched with ``fetchmany`` as they are consumed.
+
+        At least one (possibly empty) dataframe is always yielded.
+        """
+        engine = self._get_df_engine(schema)
+        with closing(engine.raw_connection()) as conn:
+            with closing(conn.cursor()) as cursor:
+                columns = self._execute_sql(engine, cursor, sql, schema)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    df = pd.DataFrame.from_records(
+                        data=list(rows), columns=columns, coerce_float=True
+                    )
+                    yield self._convert_nested_columns(df)
+                    if len(rows) < chunk_size:
+                        break
 
     def compile_sqla_query(self, qry, schema=None):
         engine = self.get_sqla_engine(schema=schema)
@@ -1210,6 +1363,57 @@ sqla.event.listen(Database, "after_insert", security_manager.set_perm)
 sqla.event.listen(Database, "after_update", security_manager.set_perm)
 
 
+def invalidate_engines(mapper, connection, target):
+    engine_registry.engine_registry.invalidate(target.id)
+
+
+sqla.event.listen(Database, "after_update", invalidate_engines)
+sqla.event.listen(Database, "after_delete", invalidate_engines)
+
+
+def get_bootstrap_dependencies(obj) -> List[str]:
+    """Returns the names of the cached dashboard data depending on the object"""
+    if isinstance(obj, Dashboard):
+        return [f"dashboard_{obj.id}"]
+    if isinstance(obj, Slice):
+        return [f"slice_{obj.id}"]
+    if isinstance(obj, Database):
+        return ["databases"]
+    for source in ConnectorRegistry.sources.values():
+        if isinstance(obj, source):
+            return [f"datasource_{obj.uid}"]
+        children = tuple(c for c in (source.column_class, source.metric_class) if c)
+        if children and isinstance(obj, children):
+            datasource_id = getattr(obj, "table_id", None) or getattr(
+                obj, "datasource_id", None
+            )
+            return [f"datasource_{datasource_id}__{source.type}"]
+    return []
+
+
+def collect_bootstrap_dependencies(session, flush_context):
+    dependencies = session.info.setdefault("bootstrap_dependencies", set())
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        dependencies.update(get_bootstrap_dependencies(obj))
+
+
+def invalidate_bootstrap_cache(session):
+    # only once committed, so that readers don't cache the data from before
+    # the changes under the new versions
+    dependencies = session.info.pop("bootstrap_dependencies", None)
+    if dependencies:
+        bootstrap_cache.invalidate(dependencies)
+
+
+def discard_bootstrap_dependencies(session):
+    session.info.pop("bootstrap_dependencies", None)
+
+
+sqla.event.listen(Session, "after_flush", collect_bootstrap_dependencies)
+sqla.event.listen(Session, "after_commit", invalidate_bootstrap_cache)
+sqla.event.listen(Session, "after_rollback", discard_bootstrap_dependencies)
+
+
 class Log(Model):
 
     """ORM object used to log Superset actions to the database"""
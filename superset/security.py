@@ -113,6 +113,7 @@ class SupersetSecurityManager(SecurityManager):
         "can_override_role_permissions",
         "can_approve",
         "can_update_role",
+        "can_engine_pools",
     }
 
     READ_ONLY_PERMISSION = {"can_show", "can_list"}
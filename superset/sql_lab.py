@@ -15,10 +15,12 @@
 # specific language governing permissions and limitations
 # under the License.
 # pylint: disable=C,R,W
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 from contextlib import closing
 from datetime import datetime
 import logging
 from sys import getsizeof
+import threading
 from typing import Optional, Tuple, Union
 import uuid
 
@@ -45,6 +47,7 @@ from superset.db_engine_specs import BaseEngineSpec
 from superset.models.sql_lab import Query
 from superset.sql_parse import ParsedQuery
 from superset.tasks.celery_app import app as celery_app
+from superset.utils import query_status
 from superset.utils.core import json_iso_dttm_ser, QueryStatus, sources, zlib_compress
 from superset.utils.dates import now_as_float
 from superset.utils.decorators import stats_timing
@@ -53,8 +56,15 @@ config = app.config
 stats_logger = config.get("STATS_LOGGER")
 SQLLAB_TIMEOUT = config.get("SQLLAB_ASYNC_TIME_LIMIT_SEC", 600)
 SQLLAB_HARD_TIMEOUT = SQLLAB_TIMEOUT + 60
+SQLLAB_FETCH_CHUNK_SIZE = config.get("SQLLAB_FETCH_CHUNK_SIZE", 10000)
+# seconds between two checks of whether statements running in parallel got
+# stopped
+SQLLAB_STOP_POLL_INTERVAL = 1
 log_query = config.get("QUERY_LOGGER")
 
+_database_semaphores = {}
+_database_semaphores_lock = threading.Lock()
+
 
 class SqlLabException(Exception):
     pass
@@ -68,6 +78,10 @@ class SqlLabTimeoutException(SqlLabException):
     pass
 
 
+class SqlLabQueryStoppedException(SqlLabException):
+    pass
+
+
 def handle_query_error(msg, query, session, payload=None):
     """Local method handling error while processing the SQL"""
     payload = payload or {}
@@ -168,13 +182,23 @@ def get_sql_results(
             stats_logger.incr("error_sqllab_unhandled")
             query = get_query(query_id, session)
             return handle_query_error(str(e), query, session)
+        finally:
+            query_status.clear(query_id)
 
 
-def execute_sql_statement(sql_statement, query, user_name, session, cursor):
-    """Executes a single SQL statement"""
-    query_id = query.id
+def track_fetch_progress(chunks, query, session):
+    """Reports the number of rows fetched so far as the chunks go through"""
+    rows = 0
+    for chunk in chunks:
+        rows += len(chunk)
+        query.set_extra_json_key("progress", f"Fetched {rows} rows")
+        session.commit()
+        yield chunk
+
+
+def prepare_sql_statement(sql_statement, query, user_name):
+    """Checks a single SQL statement and returns the SQL to actually run"""
     database = query.database
-    db_engine_spec = database.db_engine_spec
     parsed_query = ParsedQuery(sql_statement)
     sql = parsed_query.stripped()
     SQL_MAX_ROWS = app.config.get("SQL_MAX_ROW")
@@ -208,6 +232,15 @@ def execute_sql_statement(sql_statement, query, user_name, session, cursor):
     SQL_QUERY_MUTATOR = config.get("SQL_QUERY_MUTATOR")
     if SQL_QUERY_MUTATOR:
         sql = SQL_QUERY_MUTATOR(sql, user_name, security_manager, database)
+    return sql
+
+
+def execute_sql_statement(sql_statement, query, user_name, session, cursor):
+    """Executes a single SQL statement"""
+    query_id = query.id
+    database = query.database
+    db_engine_spec = database.db_engine_spec
+    sql = prepare_sql_statement(sql_statement, query, user_name)
 
     try:
         if log_query:
@@ -233,7 +266,16 @@ def execute_sql_statement(sql_statement, query, user_name, session, cursor):
                     query_id, query.to_dict()
                 )
             )
-            data = db_engine_spec.fetch_data(cursor, query.limit)
+            logging.debug(f"Query {query_id}: Fetching cursor description")
+            cursor_description = cursor.description
+            chunks = db_engine_spec.fetch_data_chunks(
+                cursor, query.limit, SQLLAB_FETCH_CHUNK_SIZE
+            )
+            cdf = SupersetDataFrame(
+                track_fetch_progress(chunks, query, session),
+                cursor_description,
+                db_engine_spec,
+            )
 
     except SoftTimeLimitExceeded as e:
         logging.exception(f"Query {query_id}: {e}")
@@ -245,9 +287,139 @@ def execute_sql_statement(sql_statement, query, user_name, session, cursor):
         logging.exception(f"Query {query_id}: {e}")
         raise SqlLabException(db_engine_spec.extract_error_message(e))
 
-    logging.debug(f"Query {query_id}: Fetching cursor description")
-    cursor_description = cursor.description
-    return SupersetDataFrame(data, cursor_description, db_engine_spec)
+    return cdf
+
+
+def can_run_in_parallel(statements, query):
+    """Whether the statements are independent and read-only, so that they can
+    run concurrently"""
+    if not config.get("SQLLAB_PARALLEL_STATEMENTS") or len(statements) < 2:
+        return False
+    if query.select_as_cta:
+        return False
+    return all(ParsedQuery(statement).is_select() for statement in statements)
+
+
+def _get_database_semaphore(database_id):
+    with _database_semaphores_lock:
+        if database_id not in _database_semaphores:
+            _database_semaphores[database_id] = threading.BoundedSemaphore(
+                config.get("SQLLAB_PARALLEL_MAX_CONNECTIONS_PER_DATABASE")
+            )
+        return _database_semaphores[database_id]
+
+
+def _stop_between_chunks(chunks, stopped):
+    for chunk in chunks:
+        if stopped():
+            raise SqlLabQueryStoppedException()
+        yield chunk
+
+
+def execute_sql_statements_in_parallel(statements, query, user_name, session, engine):
+    """Executes read-only SQL statements concurrently and returns their results
+
+    Each statement runs on its own connection. The number of connections
+    opened at once against a database is bounded across all the queries
+    running in the process.
+
+    The session isn't shared with the threads running the statements: this
+    thread checks whether the query got stopped while it waits for them, and
+    tells them through an event. What the threads need is read before the
+    commit, which expires the objects of the session.
+    """
+    query_id = query.id
+    database = query.database
+    database_id = database.id
+    sqlalchemy_uri = database.sqlalchemy_uri
+    schema = query.schema
+    db_engine_spec = database.db_engine_spec
+    sqls = [
+        prepare_sql_statement(statement, query, user_name) for statement in statements
+    ]
+    limit = query.limit
+    query.executed_sql = ";\n".join(sqls)
+    session.commit()
+
+    stop_event = threading.Event()
+
+    def stopped():
+        return stop_event.is_set() or query_status.is_stop_requested(query_id)
+
+    def run(sql):
+        with _get_database_semaphore(database_id):
+            if stopped():
+                raise SqlLabQueryStoppedException()
+            with closing(engine.raw_connection()) as conn:
+                with closing(conn.cursor()) as cursor:
+                    db_engine_spec.execute(cursor, sql)
+                    cursor_description = cursor.description
+                    chunks = db_engine_spec.fetch_data_chunks(
+                        cursor, limit, SQLLAB_FETCH_CHUNK_SIZE
+                    )
+                    return SupersetDataFrame(
+                        _stop_between_chunks(chunks, stopped),
+                        cursor_description,
+                        db_engine_spec,
+                    )
+
+    statement_count = len(sqls)
+    executor = ThreadPoolExecutor(
+        max_workers=min(
+            statement_count,
+            config.get("SQLLAB_PARALLEL_MAX_CONNECTIONS_PER_DATABASE"),
+        )
+    )
+    try:
+        futures = []
+        for sql in sqls:
+            if log_query:
+                log_query(
+                    sqlalchemy_uri,
+                    sql,
+                    schema,
+                    user_name,
+                    __name__,
+                    security_manager,
+                )
+            futures.append(executor.submit(run, sql))
+
+        cdfs = []
+        with stats_timing("sqllab.query.time_executing_query", stats_logger):
+            not_done = futures
+            while not_done:
+                done, not_done = wait(
+                    not_done,
+                    timeout=SQLLAB_STOP_POLL_INTERVAL,
+                    return_when=FIRST_EXCEPTION,
+                )
+                if any(future.exception() for future in done):
+                    break
+                if not_done and query_status.is_stop_requested(query_id, session):
+                    stop_event.set()
+                    raise SqlLabQueryStoppedException()
+            for i, future in enumerate(futures):
+                try:
+                    cdfs.append(future.result())
+                except SqlLabQueryStoppedException:
+                    raise
+                except SoftTimeLimitExceeded as e:
+                    logging.exception(f"Query {query_id}: {e}")
+                    raise SqlLabTimeoutException(
+                        "SQL Lab timeout. This environment's policy is to kill "
+                        "queries after {} seconds.".format(SQLLAB_TIMEOUT)
+                    )
+                except Exception as e:
+                    logging.exception(f"Query {query_id}: {e}")
+                    msg = db_engine_spec.extract_error_message(e)
+                    raise SqlLabException(
+                        f"[Statement {i+1} out of {statement_count}] {msg}"
+                    )
+        return cdfs
+    finally:
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
 
 
 def _serialize_payload(
@@ -329,32 +501,47 @@ def execute_sql_statements(
         user_name=user_name,
         source=sources.get("sql_lab", None),
     )
-    # Sharing a single connection and cursor across the
-    # execution of all statements (if many)
-    with closing(engine.raw_connection()) as conn:
-        with closing(conn.cursor()) as cursor:
-            statement_count = len(statements)
-            for i, statement in enumerate(statements):
-                # Check if stopped
-                query = get_query(query_id, session)
-                if query.status == QueryStatus.STOPPED:
-                    return
-
-                # Run statement
-                msg = f"Running statement {i+1} out of {statement_count}"
-                logging.info(f"Query {query_id}: {msg}")
-                query.set_extra_json_key("progress", msg)
-                session.commit()
-                try:
-                    cdf = execute_sql_statement(
-                        statement, query, user_name, session, cursor
-                    )
-                except Exception as e:
-                    msg = str(e)
-                    if statement_count > 1:
-                        msg = f"[Statement {i+1} out of {statement_count}] " + msg
-                    payload = handle_query_error(msg, query, session, payload)
-                    return payload
+    statement_count = len(statements)
+    cdfs = []
+    if can_run_in_parallel(statements, query):
+        msg = f"Running {statement_count} statements in parallel"
+        logging.info(f"Query {query_id}: {msg}")
+        query.set_extra_json_key("progress", msg)
+        session.commit()
+        try:
+            cdfs = execute_sql_statements_in_parallel(
+                statements, query, user_name, session, engine
+            )
+        except SqlLabQueryStoppedException:
+            return
+        except Exception as e:
+            return handle_query_error(str(e), query, session, payload)
+        cdf = cdfs[-1]
+    else:
+        # Sharing a single connection and cursor across the
+        # execution of all statements (if many)
+        with closing(engine.raw_connection()) as conn:
+            with closing(conn.cursor()) as cursor:
+                for i, statement in enumerate(statements):
+                    # Check if stopped
+                    if query_status.is_stop_requested(query_id, session):
+                        return
+
+                    # Run statement
+                    msg = f"Running statement {i+1} out of {statement_count}"
+                    logging.info(f"Query {query_id}: {msg}")
+                    query.set_extra_json_key("progress", msg)
+                    session.commit()
+                    try:
+                        cdf = execute_sql_statement(
+                            statement, query, user_name, session, cursor
+                        )
+                    except Exception as e:
+                        msg = str(e)
+                        if statement_count > 1:
+                            msg = f"[Statement {i+1} out of {statement_count}] " + msg
+                        payload = handle_query_error(msg, query, session, payload)
+                        return payload
 
     # Success, updating the query entry in database
     query.rows = cdf.size
@@ -386,6 +573,42 @@ def execute_sql_statements(
     )
     payload["query"]["state"] = QueryStatus.SUCCESS
 
+    if cdfs:
+        # statements that ran in parallel all get their results returned, the
+        # last one reuses the data serialized above
+        payload["results"] = []
+        for statement, statement_cdf in zip(statements, cdfs[:-1]):
+            (
+                statement_data,
+                statement_selected_columns,
+                statement_columns,
+                statement_expanded_columns,
+            ) = _serialize_and_expand_data(
+                statement_cdf,
+                db_engine_spec,
+                store_results and results_backend_use_msgpack,
+            )
+            payload["results"].append(
+                {
+                    "sql": statement,
+                    "rows": statement_cdf.size,
+                    "data": statement_data,
+                    "columns": statement_columns,
+                    "selected_columns": statement_selected_columns,
+                    "expanded_columns": statement_expanded_columns,
+                }
+            )
+        payload["results"].append(
+            {
+                "sql": statements[-1],
+                "rows": cdf.size,
+                "data": data,
+                "columns": all_columns,
+                "selected_columns": selected_columns,
+                "expanded_columns": expanded_columns,
+            }
+        )
+
     if store_results:
         key = str(uuid.uuid4())
         logging.info(
@@ -16,19 +16,49 @@
 # under the License.
 # pylint: disable=C,R,W
 import logging
-from typing import List, Optional, Set
+from typing import Any, List, Optional, Set, Tuple
 
 import sqlparse
-from sqlparse.sql import Identifier, IdentifierList, remove_quotes, Token, TokenList
+from sqlparse.sql import (
+    Identifier,
+    IdentifierList,
+    remove_quotes,
+    Statement,
+    Token,
+    TokenList,
+)
 from sqlparse.tokens import Keyword, Name, Punctuation, String, Whitespace
 from sqlparse.utils import imt
 
+from superset import app
+from superset.utils.lru_cache import LRUCache
+
+config = app.config
+
 RESULT_OPERATIONS = {"UNION", "INTERSECT", "EXCEPT", "SELECT"}
 ON_KEYWORD = "ON"
 PRECEDES_TABLE_NAME = {"FROM", "JOIN", "DESCRIBE", "WITH", "LEFT JOIN", "RIGHT JOIN"}
 CTE_PREFIX = "CTE__"
 
 
+# The results of sqlparse for the SQL parsed recently: the same SQL goes through
+# SQL Lab, the security checks and the connectors several times per request.
+# The parsed statements are shared, they must not be modified
+parse_cache = LRUCache(config.get("SQL_PARSE_CACHE_SIZE"))
+format_cache = LRUCache(config.get("SQL_PARSE_CACHE_SIZE"))
+
+
+def parse(sql: str) -> Tuple[Statement, ...]:
+    """Same as ``sqlparse.parse``, cached"""
+    return parse_cache.get(("parse", sql), lambda: tuple(sqlparse.parse(sql)))
+
+
+def format_sql(sql: str, **options: Any) -> str:
+    """Same as ``sqlparse.format``, cached"""
+    key = (sql, tuple(sorted(options.items())))
+    return format_cache.get(key, lambda: sqlparse.format(sql, **options))
+
+
 class ParsedQuery(object):
     def __init__(self, sql_statement):
         self.sql: str = sql_statement
@@ -36,12 +66,20 @@ class ParsedQuery(object):
         self._alias_names: Set[str] = set()
         self._limit: Optional[int] = None
 
+        parsed, table_names, limit = parse_cache.get(
+            ("query", self.stripped()), self._parse
+        )
+        self._parsed: Tuple[Statement, ...] = parsed
+        self._table_names = set(table_names)
+        self._limit = limit
+
+    def _parse(self):
         logging.info("Parsing with sqlparse statement {}".format(self.sql))
-        self._parsed = sqlparse.parse(self.stripped())
-        for statement in self._parsed:
+        parsed = tuple(sqlparse.parse(self.stripped()))
+        for statement in parsed:
             self.__extract_from_token(statement)
             self._limit = self._extract_limit_from_query(statement)
-        self._table_names = self._table_names - self._alias_names
+        return parsed, frozenset(self._table_names - self._alias_names), self._limit
 
     @property
     def tables(self) -> Set[str]:
@@ -221,13 +259,15 @@ class ParsedQuery(object):
             if item.ttype in Keyword and item.value.lower() == "limit":
                 limit_pos = pos
                 break
-        _, limit = statement.token_next(idx=limit_pos)
+        limit_idx, limit = statement.token_next(idx=limit_pos)
+        limit_value = limit.value
         if limit.ttype == sqlparse.tokens.Literal.Number.Integer:
-            limit.value = new_limit
+            limit_value = new_limit
         elif limit.is_group:
-            limit.value = f"{next(limit.get_identifiers())}, {new_limit}"
+            limit_value = f"{next(limit.get_identifiers())}, {new_limit}"
 
+        # the parsed statement may be shared, it's left untouched
         str_res = ""
-        for i in statement.tokens:
-            str_res += str(i.value)
+        for idx, token in enumerate(statement.tokens):
+            str_res += str(limit_value if idx == limit_idx else token.value)
         return str_res
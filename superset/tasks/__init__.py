@@ -17,3 +17,5 @@
 # under the License.
 from . import schedules  # noqa
 from . import cache  # noqa
+from . import dashboard_pdf  # noqa
+from . import membership  # noqa
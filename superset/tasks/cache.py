@@ -16,24 +16,29 @@
 # under the License.
 # pylint: disable=too-few-public-methods
 
+from datetime import datetime
 import json
 import logging
-from urllib import request
-from urllib.error import URLError
+import time
 
 from celery.utils.log import get_task_logger
 from sqlalchemy import and_, func
 
-from superset import app, db
+from superset import app, cache, chart_data_cache, db, viz
+from superset.connectors.connector_registry import ConnectorRegistry
 from superset.models.core import Dashboard, Log, Slice
 from superset.models.tags import Tag, TaggedObject
 from superset.tasks.celery_app import app as celery_app
-from superset.utils.core import parse_human_datetime
+from superset.utils.core import parse_human_datetime, QueryStatus, run_concurrently
 
 
 logger = get_task_logger(__name__)
 logger.setLevel(logging.INFO)
 
+config = app.config
+stats_logger = config.get("STATS_LOGGER")
+chart_cache_serializer = config.get("CHART_CACHE_SERIALIZER")
+
 
 def get_form_data(chart_id, dashboard=None):
     """
@@ -86,8 +91,9 @@ class Strategy:
     """
     A cache warm up strategy.
 
-    Each strategy defines a `get_urls` method that returns a list of URLs to
-    be fetched from the `/superset/warm_up_cache/` endpoint.
+    Each strategy defines a `get_charts` method that returns the charts to warm
+    up, along with the dashboard they're displayed in, if any, whose default
+    filters apply to them.
 
     Strategies can be configured in `superset/config.py`:
 
@@ -105,11 +111,21 @@ class Strategy:
 
     """
 
+    # seconds after which no more charts get warmed up, when set
+    time_budget = None
+
     def __init__(self):
         pass
 
+    def get_charts(self):
+        raise NotImplementedError("Subclasses must implement get_charts!")
+
+    def get_items(self):
+        """Returns what `warm_up_charts` needs to warm up the charts"""
+        return get_warmup_items(self.get_charts())
+
     def get_urls(self):
-        raise NotImplementedError("Subclasses must implement get_urls!")
+        return [get_url(chart) for chart, _ in self.get_charts()]
 
 
 class DummyStrategy(Strategy):
@@ -130,11 +146,11 @@ class DummyStrategy(Strategy):
 
     name = "dummy"
 
-    def get_urls(self):
+    def get_charts(self):
         session = db.create_scoped_session()
         charts = session.query(Slice).all()
 
-        return [get_url(chart) for chart in charts]
+        return [(chart, None) for chart in charts]
 
 
 class TopNDashboardsStrategy(Strategy):
@@ -162,8 +178,8 @@ class TopNDashboardsStrategy(Strategy):
         self.top_n = top_n
         self.since = parse_human_datetime(since)
 
-    def get_urls(self):
-        urls = []
+    def get_charts(self):
+        charts = []
         session = db.create_scoped_session()
 
         records = (
@@ -178,9 +194,9 @@ class TopNDashboardsStrategy(Strategy):
         dashboards = session.query(Dashboard).filter(Dashboard.id.in_(dash_ids)).all()
         for dashboard in dashboards:
             for chart in dashboard.slices:
-                urls.append(get_url(chart))
+                charts.append((chart, dashboard))
 
-        return urls
+        return charts
 
 
 class DashboardTagsStrategy(Strategy):
@@ -205,8 +221,8 @@ class DashboardTagsStrategy(Strategy):
         super(DashboardTagsStrategy, self).__init__()
         self.tags = tags or []
 
-    def get_urls(self):
-        urls = []
+    def get_charts(self):
+        charts = []
         session = db.create_scoped_session()
 
         tags = session.query(Tag).filter(Tag.name.in_(self.tags)).all()
@@ -227,7 +243,7 @@ class DashboardTagsStrategy(Strategy):
         tagged_dashboards = session.query(Dashboard).filter(Dashboard.id.in_(dash_ids))
         for dashboard in tagged_dashboards:
             for chart in dashboard.slices:
-                urls.append(get_url(chart))
+                charts.append((chart, dashboard))
 
         # add charts that are tagged
         tagged_objects = (
@@ -243,12 +259,307 @@ class DashboardTagsStrategy(Strategy):
         chart_ids = [tagged_object.object_id for tagged_object in tagged_objects]
         tagged_charts = session.query(Slice).filter(Slice.id.in_(chart_ids))
         for chart in tagged_charts:
-            urls.append(get_url(chart))
+            charts.append((chart, None))
+
+        return charts
+
+
+class CostAwareStrategy(Strategy):
+    """
+    Refresh the most requested and slowest chart queries before they expire.
+
+    Every (chart, form data) pair requested since `since` is scored by how
+    often it was requested times how long its slowest request took, the
+    closest to the cost of a cache miss. Entries that expire within
+    `refresh_window` seconds, or aren't cached, are refreshed from the highest
+    score down, as long as the estimated query time fits in
+    `warehouse_budget` seconds. No chart gets warmed up once `time_budget`
+    seconds have passed.
+
+    The task should run at least every `refresh_window` seconds:
+
+        CELERYBEAT_SCHEDULE = {
+            'cache-warmup-cost-aware': {
+                'task': 'cache-warmup',
+                'schedule': crontab(minute='*/5'),
+                'kwargs': {
+                    'strategy_name': 'cost_aware',
+                    'since': '1 day ago',
+                    'refresh_window': 600,
+                    'warehouse_budget': 1800,
+                    'time_budget': 280,
+                },
+            },
+        }
+
+    """
+
+    name = "cost_aware"
+
+    def __init__(
+        self,
+        since="1 day ago",
+        refresh_window=600,
+        warehouse_budget=1800,
+        time_budget=None,
+        top_n=1000,
+    ):
+        super(CostAwareStrategy, self).__init__()
+        self.since = parse_human_datetime(since)
+        self.refresh_window = refresh_window
+        self.warehouse_budget = warehouse_budget
+        self.time_budget = time_budget
+        self.top_n = top_n
+
+    def get_requests(self, session):
+        """Returns the requested (chart, form data) pairs, most requested first"""
+        requests = {}
+        logs = (
+            session.query(Log.slice_id, Log.json, Log.duration_ms)
+            .filter(
+                and_(
+                    Log.action == "explore_json",
+                    Log.slice_id > 0,
+                    Log.dttm >= self.since,
+                )
+            )
+            .yield_per(1000)
+        )
+        for slice_id, log_json, duration_ms in logs:
+            try:
+                form_data = json.loads(json.loads(log_json)["form_data"])
+            except (KeyError, TypeError, ValueError):
+                form_data = {}
+            key = (slice_id, json.dumps(form_data, sort_keys=True))
+            request = requests.setdefault(
+                key,
+                {"chart_id": slice_id, "form_data": form_data, "hits": 0, "cost": 0},
+            )
+            request["hits"] += 1
+            request["cost"] = max(request["cost"], (duration_ms or 0) / 1000)
+        requests = sorted(requests.values(), key=lambda r: r["hits"], reverse=True)
+        return requests[: self.top_n]
+
+    def get_items(self):
+        session = db.create_scoped_session()
+        requests = self.get_requests(session)
+        chart_ids = {request["chart_id"] for request in requests}
+        charts = {
+            chart.id: chart
+            for chart in session.query(Slice).filter(Slice.id.in_(chart_ids))
+        }
+
+        candidates = []
+        for request in requests:
+            chart = charts.get(request["chart_id"])
+            if chart is None or chart.datasource is None:
+                continue
+            item = get_warmup_items([(chart, None)])[0]
+            item["form_data"].update(request["form_data"])
+            try:
+                form_data = json.loads(json.dumps(item["form_data"]))
+                viz_type = form_data.get("viz_type") or "table"
+                viz_obj = viz.viz_types[viz_type](chart.datasource, form_data=form_data)
+                cache_key = viz_obj.cache_key(viz_obj.query_obj())
+                time_to_live = get_time_to_live(cache_key, viz_obj.cache_timeout)
+            except Exception:
+                logger.exception(f"Error estimating the cache of chart {chart.id}")
+                continue
+            if time_to_live > self.refresh_window:
+                continue
+            # the entry is about to expire, refresh it even though it's cached
+            item["force"] = True
+            item["cost"] = request["cost"]
+            item["score"] = request["hits"] * request["cost"]
+            candidates.append(item)
+
+        items = []
+        spent = 0
+        for item in sorted(candidates, key=lambda item: item["score"], reverse=True):
+            if spent + item["cost"] > self.warehouse_budget:
+                continue
+            spent += item["cost"]
+            items.append(item)
+        logger.info(
+            f"Refreshing {len(items)} of {len(candidates)} expiring entries, "
+            f"an estimated {spent:.0f}s of queries"
+        )
+        return items
+
+    def get_charts(self):
+        session = db.create_scoped_session()
+        chart_ids = {r["chart_id"] for r in self.get_requests(session)}
+        charts = session.query(Slice).filter(Slice.id.in_(chart_ids)).all()
+        return [(chart, None) for chart in charts]
+
+
+strategies = [
+    DummyStrategy,
+    TopNDashboardsStrategy,
+    DashboardTagsStrategy,
+    CostAwareStrategy,
+]
+
 
-        return urls
+def get_warmup_items(charts):
+    """
+    Turns (chart, dashboard) pairs into the plain data needed to warm them up
+    in other threads, which can't share the strategy's session objects.
+
+    A chart showing in several dashboards with the same filters is only
+    warmed up once.
+    """
+    items = {}
+    for chart, dashboard in charts:
+        datasource = chart.datasource
+        if datasource is None:
+            logger.warning(f"Chart {chart.id} has no datasource, skipping")
+            continue
+        form_data = chart.form_data
+        form_data.update(get_form_data(chart.id, dashboard))
+        # the concurrency limits apply to the database, or Druid cluster
+        database = getattr(datasource, "database", None) or getattr(
+            datasource, "cluster", None
+        )
+        key = (chart.id, json.dumps(form_data, sort_keys=True))
+        items[key] = {
+            "chart_id": chart.id,
+            "datasource_type": chart.datasource_type,
+            "datasource_id": chart.datasource_id,
+            "form_data": form_data,
+            "database": f"{type(database).__name__}_{database.id}"
+            if database
+            else datasource.uid,
+        }
+    return list(items.values())
+
+
+def _exists(cache_key):
+    try:
+        return cache.cache.has(cache_key)
+    except NotImplementedError:
+        return cache.get(cache_key) is not None
 
 
-strategies = [DummyStrategy, TopNDashboardsStrategy, DashboardTagsStrategy]
+def _get_backend_ttl(cache_key):
+    """Seconds until the cache backend evicts the entry, when it tells without
+    loading it, as Redis does"""
+    backend = cache.cache
+    client = getattr(backend, "_client", None)
+    if client is not None and hasattr(client, "ttl"):
+        ttl = client.ttl(getattr(backend, "key_prefix", "") + cache_key)
+        if ttl is not None and ttl >= 0:
+            return ttl
+    return None
+
+
+def _load(cache_key):
+    blob = cache.get(cache_key)
+    if blob is None:
+        return None
+    return chart_cache_serializer.loads(blob)
+
+
+def is_fresh(cache_key):
+    """Whether a chart cache entry exists and hasn't expired
+
+    With a ``CHART_CACHE_STALE_TIMEOUT``, expired entries stay in the cache to
+    be served while they're refreshed. Only the expiry time stored along with
+    the data tells them apart, which takes loading the entry when the backend
+    can't tell its time to live.
+    """
+    if not cache:
+        return False
+    stale_timeout = chart_data_cache.stale_timeout
+    if not stale_timeout:
+        return _exists(cache_key)
+    ttl = _get_backend_ttl(cache_key)
+    if ttl is not None:
+        return ttl > stale_timeout
+    cache_value = _load(cache_key)
+    return cache_value is not None and not chart_data_cache.is_expired(cache_value)
+
+
+def get_time_to_live(cache_key, cache_timeout):
+    """Seconds until a chart cache entry expires, 0 when it's missing"""
+    if not cache or not _exists(cache_key):
+        return 0
+    ttl = _get_backend_ttl(cache_key)
+    if ttl is not None:
+        # the entry outlives its expiry by the stale timeout
+        return max(ttl - (chart_data_cache.stale_timeout or 0), 0)
+    cache_value = _load(cache_key)
+    if cache_value is None:
+        return 0
+    if "expires" in cache_value:
+        return max(cache_value["expires"] - time.time(), 0)
+    cached_dttm = cache_value["dttm"]
+    age = datetime.utcnow() - datetime.strptime(cached_dttm, "%Y-%m-%dT%H:%M:%S")
+    return max(cache_timeout - age.total_seconds(), 0)
+
+
+def warm_up_chart(item, deadline=None):
+    """
+    Runs the queries of a chart unless its data is cached already, the same way
+    `explore_json` does but without going through the web server. Items with
+    `force` set are refreshed even when cached.
+    """
+    result = {"chart_id": item["chart_id"]}
+    start = time.time()
+    if deadline and start > deadline:
+        result.update({"status": "skipped", "duration": 0})
+        return result
+    try:
+        with app.test_request_context():
+            datasource = ConnectorRegistry.get_datasource(
+                item["datasource_type"], item["datasource_id"], db.session
+            )
+            form_data = json.loads(json.dumps(item["form_data"]))
+            viz_type = form_data.get("viz_type") or "table"
+            viz_obj = viz.viz_types[viz_type](
+                datasource, form_data=form_data, force=item.get("force", False)
+            )
+            if not viz_obj.force and is_fresh(viz_obj.cache_key(viz_obj.query_obj())):
+                result["status"] = "hit"
+            else:
+                payload = viz_obj.get_payload()
+                if payload.get("status") == QueryStatus.FAILED:
+                    result["status"] = "error"
+                    result["error"] = payload.get("error")
+                else:
+                    result["status"] = "hit" if payload.get("is_cached") else "miss"
+    except Exception as e:
+        logger.exception(f"Error warming up chart {item['chart_id']}")
+        result.update({"status": "error", "error": str(e)})
+    result["duration"] = time.time() - start
+    stats_logger.incr(f"cache_warmup.{result['status']}")
+    stats_logger.timing("cache_warmup.chart", result["duration"])
+    return result
+
+
+def warm_up_charts(
+    items, max_workers=None, max_workers_per_database=None, time_budget=None
+):
+    """
+    Warms up charts concurrently, with at most `max_workers` queries running at
+    once, and `max_workers_per_database` against a single database. Charts not
+    started within `time_budget` seconds are skipped.
+    """
+    deadline = time.time() + time_budget if time_budget else None
+    max_workers = max_workers or config.get("CACHE_WARMUP_MAX_WORKERS")
+    max_workers_per_database = max_workers_per_database or config.get(
+        "CACHE_WARMUP_MAX_WORKERS_PER_DATABASE"
+    )
+    results = [None] * len(items)
+    for index, result in run_concurrently(
+        lambda item: warm_up_chart(item, deadline),
+        items,
+        lambda item: item["database"],
+        max_workers,
+        max_workers_per_database,
+    ):
+        results[index] = result
+    return results
 
 
 @celery_app.task(name="cache-warmup")
@@ -256,7 +567,9 @@ def cache_warmup(strategy_name, *args, **kwargs):
     """
     Warm up cache.
 
-    This task periodically hits charts to warm up the cache.
+    This task periodically runs the queries of charts whose data isn't cached.
+    It returns the outcome of each chart, `hit` when it was still cached,
+    `miss` when its queries ran, or `error`, and how long it took.
 
     """
     logger.info("Loading strategy")
@@ -278,14 +591,28 @@ def cache_warmup(strategy_name, *args, **kwargs):
         logger.exception(message)
         return message
 
-    results = {"success": [], "errors": []}
-    for url in strategy.get_urls():
-        try:
-            logger.info(f"Fetching {url}")
-            request.urlopen(url)
-            results["success"].append(url)
-        except URLError:
-            logger.exception("Error warming up cache!")
-            results["errors"].append(url)
-
+    start = time.time()
+    items = strategy.get_items()
+    logger.info(f"Warming up {len(items)} charts")
+    charts = warm_up_charts(items, time_budget=strategy.time_budget)
+
+    results = {
+        "success": [chart for chart in charts if chart["status"] in ("hit", "miss")],
+        "errors": [chart for chart in charts if chart["status"] == "error"],
+        "hits": len([chart for chart in charts if chart["status"] == "hit"]),
+        "misses": len([chart for chart in charts if chart["status"] == "miss"]),
+        "skipped": len([chart for chart in charts if chart["status"] == "skipped"]),
+        "duration": time.time() - start,
+    }
+    logger.info(
+        "Warmed up {} charts in {:.1f}s, {} hits, {} misses, {} skipped, "
+        "{} errors".format(
+            len(charts),
+            results["duration"],
+            results["hits"],
+            results["misses"],
+            results["skipped"],
+            len(results["errors"]),
+        )
+    )
     return results
@@ -0,0 +1,279 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Asynchronous rendering of dashboards to PDF
+
+Requests for a PDF are keyed on the dashboard url (which carries the filter
+state) and the selected tab. Concurrent requests for the same key share a
+single rendering job, and the generated file is served again to whoever asks
+for it until ``PDF_EXPORT_CACHE_TIMEOUT`` expires, after which it gets pruned.
+
+Rendering happens in Celery workers, each keeping a small pool of headless
+browsers alive between jobs so that they don't pay the browser start up cost
+on every export.
+"""
+from contextlib import contextmanager
+import hashlib
+import logging
+import os
+import queue
+import subprocess
+import threading
+import time
+from typing import Dict, Optional
+import uuid
+
+from celery.exceptions import SoftTimeLimitExceeded
+from celery.signals import worker_process_shutdown
+
+from superset import app, cache
+from superset.tasks.celery_app import app as celery_app
+
+config = app.config
+stats_logger = config.get("STATS_LOGGER")
+
+PRINT_PDF_SCRIPT = "printPdf_singleTab.js"
+LAUNCH_BROWSER_SCRIPT = "launchBrowser.js"
+REPORTS_DIR = os.path.normpath(
+    os.path.join(config.get("PRINT_PDF_SERVICE"), "..", "..", "reports")
+)
+
+
+class DashboardPdfException(Exception):
+    pass
+
+
+class PdfStatus:
+    """Enum-type class for PDF export statuses"""
+
+    FAILED = "failed"
+    PENDING = "pending"
+    SUCCESS = "success"
+
+
+class BrowserPool(object):
+    """A pool of long lived headless browsers
+
+    Each browser is started by a node process that prints the browser's
+    DevTools websocket endpoint, which the rendering script connects to.
+    Browsers are recycled after ``max_jobs`` renderings, or as soon as one of
+    them dies or a rendering using it fails.
+    """
+
+    def __init__(self, size: int, max_jobs: int) -> None:
+        self.size = size
+        self.max_jobs = max_jobs
+        self._idle: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._launched = 0
+
+    def _launch(self) -> Dict:
+        process = subprocess.Popen(
+            ["node", LAUNCH_BROWSER_SCRIPT],
+            cwd=config.get("PRINT_PDF_SERVICE"),
+            stdout=subprocess.PIPE,
+        )
+        endpoint = process.stdout.readline().decode("utf-8").strip()
+        if not endpoint:
+            process.kill()
+            raise DashboardPdfException("Failed to start a headless browser")
+        logging.info(f"Started headless browser {endpoint}")
+        return {"process": process, "endpoint": endpoint, "jobs": 0}
+
+    def _discard(self, browser: Dict) -> None:
+        browser["process"].terminate()
+        with self._lock:
+            self._launched -= 1
+
+    @contextmanager
+    def browser(self):
+        """Yields the websocket endpoint of an idle browser"""
+        with self._lock:
+            launch = self._idle.empty() and self._launched < self.size
+            if launch:
+                self._launched += 1
+        if not launch:
+            # waits for a browser to be released when they're all busy
+            browser = self._idle.get()
+            # replaces browsers that died while idle
+            launch = browser["process"].poll() is not None
+        if launch:
+            try:
+                browser = self._launch()
+            except Exception:
+                with self._lock:
+                    self._launched -= 1
+                raise
+
+        try:
+            yield browser["endpoint"]
+        except Exception:
+            self._discard(browser)
+            raise
+        browser["jobs"] += 1
+        if browser["jobs"] >= self.max_jobs:
+            self._discard(browser)
+        else:
+            self._idle.put(browser)
+
+    def close(self) -> None:
+        while not self._idle.empty():
+            self._discard(self._idle.get())
+
+
+browser_pool = BrowserPool(
+    config.get("PDF_EXPORT_BROWSER_POOL_SIZE"),
+    config.get("PDF_EXPORT_BROWSER_MAX_JOBS"),
+)
+
+
+@worker_process_shutdown.connect
+def close_browser_pool(**kwargs):
+    browser_pool.close()
+
+
+def get_cache_key(url: str, tab_selected_id: str) -> str:
+    key = hashlib.md5(f"{url}|{tab_selected_id}".encode("utf-8")).hexdigest()
+    return f"dashboard_pdf_{key}"
+
+
+def get_file_path(file_name: str) -> str:
+    return os.path.join(REPORTS_DIR, file_name + ".pdf")
+
+
+def render_dashboard_pdf(
+    url: str, file_name: str, tab_selected_id: str, origin: str
+) -> Dict:
+    """Renders the dashboard to ``REPORTS_DIR`` and returns the file name"""
+    start = time.time()
+    with browser_pool.browser() as endpoint:
+        # passing the arguments as a list, rather than through a shell, keeps
+        # the user provided url and title from being interpreted
+        subprocess.run(
+            ["node", PRINT_PDF_SCRIPT, url, file_name, tab_selected_id, origin]
+            + [endpoint],
+            cwd=config.get("PRINT_PDF_SERVICE"),
+            check=True,
+            timeout=config.get("PDF_EXPORT_TIMEOUT"),
+        )
+    if not os.path.exists(get_file_path(file_name)):
+        raise DashboardPdfException(f"No PDF was generated for {url}")
+    stats_logger.timing("dashboard_pdf.render", time.time() - start)
+    return {"file_name": file_name}
+
+
+@celery_app.task(
+    name="dashboard_pdf.render", soft_time_limit=config.get("PDF_EXPORT_TIMEOUT")
+)
+def render_dashboard_pdf_task(url, file_name, tab_selected_id, origin):
+    try:
+        return render_dashboard_pdf(url, file_name, tab_selected_id, origin)
+    except SoftTimeLimitExceeded:
+        logging.exception(f"Timed out rendering {url} to PDF")
+        raise
+
+
+def _get_result(task_id: str) -> Dict:
+    task = render_dashboard_pdf_task.AsyncResult(task_id)
+    if task.successful():
+        return dict(status=PdfStatus.SUCCESS, task_id=task_id, **task.result)
+    if task.failed():
+        return {"status": PdfStatus.FAILED, "task_id": task_id}
+    return {"status": PdfStatus.PENDING, "task_id": task_id}
+
+
+def request_dashboard_pdf(
+    url: str, file_name: str, tab_selected_id: str, origin: str
+) -> Dict:
+    """Returns the PDF of a dashboard, if it's cached, or its rendering job
+
+    The returned dict has a ``status`` and either the ``file_name`` of the PDF
+    or the ``task_id`` of the job to poll with ``get_dashboard_pdf_status``.
+    """
+    key = get_cache_key(url, tab_selected_id)
+    timeout = config.get("PDF_EXPORT_CACHE_TIMEOUT")
+    task_id = str(uuid.uuid4())
+    # ``add`` only succeeds for the first of concurrent requests, the others
+    # wait on the job it started
+    if not cache or cache.add(key, {"task_id": task_id}, timeout=timeout):
+        stats_logger.incr("dashboard_pdf.cache_miss")
+        if not config.get("PDF_EXPORT_ASYNC"):
+            try:
+                result = render_dashboard_pdf(url, file_name, tab_selected_id, origin)
+            except Exception:
+                if cache:
+                    cache.delete(key)
+                raise
+            if cache:
+                cache.set(key, result, timeout=timeout)
+            return dict(status=PdfStatus.SUCCESS, **result)
+        try:
+            render_dashboard_pdf_task.apply_async(
+                args=[url, file_name, tab_selected_id, origin], task_id=task_id
+            )
+        except Exception:
+            # no job will ever run under this task_id, don't let other
+            # requests wait on it
+            if cache:
+                cache.delete(key)
+            raise
+        return {"status": PdfStatus.PENDING, "task_id": task_id}
+
+    cached = cache.get(key) or {}
+    if "file_name" in cached:
+        result = dict(status=PdfStatus.SUCCESS, **cached)
+    elif "task_id" in cached:
+        result = _get_result(cached["task_id"])
+    else:
+        # the entry expired in between, start over
+        return request_dashboard_pdf(url, file_name, tab_selected_id, origin)
+
+    if result["status"] == PdfStatus.SUCCESS:
+        if os.path.exists(get_file_path(result["file_name"])):
+            stats_logger.incr("dashboard_pdf.cache_hit")
+            cache.set(key, {"file_name": result["file_name"]}, timeout=timeout)
+            return result
+    elif result["status"] == PdfStatus.PENDING:
+        stats_logger.incr("dashboard_pdf.dedup")
+        return result
+    # the job failed, or its file was pruned
+    cache.delete(key)
+    return request_dashboard_pdf(url, file_name, tab_selected_id, origin)
+
+
+def get_dashboard_pdf_status(task_id: str) -> Dict:
+    return _get_result(task_id)
+
+
+@celery_app.task(name="dashboard_pdf.prune")
+def prune_dashboard_pdfs(max_age: Optional[int] = None) -> int:
+    """Deletes the PDFs that outlived their cache entry"""
+    if max_age is None:
+        max_age = config.get("PDF_EXPORT_CACHE_TIMEOUT")
+    if not os.path.isdir(REPORTS_DIR):
+        return 0
+    oldest = time.time() - max_age
+    pruned = 0
+    for entry in os.scandir(REPORTS_DIR):
+        if entry.name.endswith(".pdf") and entry.stat().st_mtime < oldest:
+            try:
+                os.remove(entry.path)
+                pruned += 1
+            except OSError as e:
+                logging.warning(f"Failed to prune {entry.path}: {e}")
+    logging.info(f"Pruned {pruned} dashboard PDFs")
+    return pruned
@@ -0,0 +1,30 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=too-few-public-methods
+"""Background sync of the slice and dashboard memberships of users"""
+import logging
+
+from superset.abinitio_security_manager import SliceUserView
+from superset.tasks.celery_app import app as celery_app
+
+
+@celery_app.task(name="slice_user.sync")
+def sync_slice_n_dashboard_user_task(username, member):
+    """Makes the user a member of every slice and dashboard, or of none"""
+    changed = SliceUserView(username).sync_slice_n_dashboard(member)
+    logging.info(f"Synced {changed} slice and dashboard memberships of {username}")
+    return changed
@@ -0,0 +1,340 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Serializers for the chart data cache
+
+Both ``BaseViz.get_df_payload`` and ``QueryContext.get_df_payload`` store a
+dict holding the dataframe (``df``), the ``query`` that produced it and the
+``dttm`` at which it was cached. The serializer to use is set with the
+``CHART_CACHE_SERIALIZER`` config key.
+
+Columnar entries are prefixed with a small header so that any serializer can
+read entries written by any other one, including the legacy pickled ones. This
+makes it safe to switch serializers without flushing the cache.
+
+``ChartDataCache`` wraps the reads and writes of both, and coalesces the
+concurrent computations of a missing or expired value.
+"""
+import json
+import logging
+import pickle as pkl
+import struct
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import uuid
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+MAGIC = b"SCC1"
+FORMAT_ARROW = b"a"
+FORMAT_PARQUET = b"p"
+# magic, format id, compression codec id, uncompressed body size
+HEADER = struct.Struct("<4sccQ")
+METADATA_KEY = b"superset"
+
+CODECS = {None: b"n", "lz4": b"l", "zstd": b"z"}
+CODEC_NAMES = {v: k for k, v in CODECS.items()}
+
+
+class BaseChartCacheSerializer(object):
+    """Base class for (de)serializing chart data cache values"""
+
+    def dumps(self, cache_value: Dict[str, Any]) -> bytes:
+        raise NotImplementedError()
+
+    def loads(self, blob: bytes) -> Dict[str, Any]:
+        return loads(blob)
+
+
+class PickleChartCacheSerializer(BaseChartCacheSerializer):
+    """Pickles the whole cache value, this is the legacy format"""
+
+    def dumps(self, cache_value: Dict[str, Any]) -> bytes:
+        return pkl.dumps(cache_value, protocol=pkl.HIGHEST_PROTOCOL)
+
+
+class ColumnarChartCacheSerializer(BaseChartCacheSerializer):
+    """Stores the dataframe as an Arrow table
+
+    ``query`` and ``dttm`` travel in the schema metadata. Values that Arrow
+    can't represent (mixed-type object columns for instance) are pickled
+    instead.
+    """
+
+    format_id: bytes
+    # whether the serialized table gets compressed as a whole, as opposed to
+    # formats that handle compression themselves
+    compress_body = False
+
+    def __init__(self, compression: Optional[str] = None) -> None:
+        if compression not in CODECS:
+            raise ValueError(f"Unsupported chart cache compression: {compression}")
+        self.compression = compression
+
+    def write_table(self, table: pa.Table) -> pa.Buffer:
+        raise NotImplementedError()
+
+    def dumps(self, cache_value: Dict[str, Any]) -> bytes:
+        df = cache_value.get("df")
+        if df is None:
+            return pkl.dumps(cache_value, protocol=pkl.HIGHEST_PROTOCOL)
+        try:
+            table = pa.Table.from_pandas(df)
+        except (pa.ArrowException, TypeError, ValueError) as e:
+            logging.warning(f"Falling back to pickle for chart cache value: {e}")
+            return pkl.dumps(cache_value, protocol=pkl.HIGHEST_PROTOCOL)
+
+        metadata = dict(table.schema.metadata or {})
+        metadata[METADATA_KEY] = json.dumps(
+            {k: v for k, v in cache_value.items() if k != "df"}
+        ).encode("utf-8")
+        table = table.replace_schema_metadata(metadata)
+
+        body = self.write_table(table)
+        size, codec = body.size, None
+        if self.compress_body and self.compression:
+            body = pa.compress(body, codec=self.compression, asbytes=False)
+            codec = self.compression
+        header = HEADER.pack(MAGIC, self.format_id, CODECS[codec], size)
+        return header + body.to_pybytes()
+
+
+class ArrowChartCacheSerializer(ColumnarChartCacheSerializer):
+    """Arrow IPC stream, optionally compressed as a whole with lz4 or zstd"""
+
+    format_id = FORMAT_ARROW
+    compress_body = True
+
+    def write_table(self, table: pa.Table) -> pa.Buffer:
+        sink = pa.BufferOutputStream()
+        writer = pa.RecordBatchStreamWriter(sink, table.schema)
+        writer.write_table(table)
+        writer.close()
+        return sink.getvalue()
+
+
+class ParquetChartCacheSerializer(ColumnarChartCacheSerializer):
+    """Parquet file, compressed per column chunk with lz4 or zstd"""
+
+    format_id = FORMAT_PARQUET
+
+    def write_table(self, table: pa.Table) -> pa.Buffer:
+        sink = pa.BufferOutputStream()
+        pq.write_table(table, sink, compression=self.compression or "NONE")
+        return sink.getvalue()
+
+
+def loads(blob: bytes) -> Dict[str, Any]:
+    """Deserializes a chart cache value written by any of the serializers"""
+    if not blob.startswith(MAGIC):
+        return pkl.loads(blob)
+
+    _, format_id, codec_id, size = HEADER.unpack_from(blob)
+    # slicing a pyarrow buffer doesn't copy, the Arrow reader works straight
+    # off the cached bytes
+    body = pa.py_buffer(blob)[HEADER.size :]
+    codec = CODEC_NAMES[codec_id]
+    if codec:
+        body = pa.decompress(body, decompressed_size=size, codec=codec)
+
+    if format_id == FORMAT_ARROW:
+        table = pa.ipc.open_stream(body).read_all()
+    elif format_id == FORMAT_PARQUET:
+        table = pq.read_table(pa.BufferReader(body))
+    else:
+        raise ValueError(f"Unknown chart cache format: {format_id}")
+
+    cache_value = json.loads(table.schema.metadata[METADATA_KEY].decode("utf-8"))
+    cache_value["df"] = table.to_pandas()
+    return cache_value
+
+
+class ChartDataCache(object):
+    """Chart data cache that computes each missing value only once at a time
+
+    The first request missing a key takes a lock on it, in the cache itself so
+    that it holds across processes, while concurrent requests for the same key
+    wait for its value instead of running the same query.
+
+    With a ``stale_timeout``, values are kept in the cache that many seconds
+    past their expiry. The first request for an expired value refreshes it,
+    while the concurrent ones are served the stale value right away.
+
+    Without a ``lock_timeout`` every request computes the values it misses.
+    """
+
+    def __init__(
+        self,
+        cache,
+        serializer: BaseChartCacheSerializer,
+        stats_logger,
+        stale_timeout: Optional[int] = None,
+        lock_timeout: int = 300,
+        lock_wait: int = 60,
+    ) -> None:
+        self.cache = cache
+        self.serializer = serializer
+        self.stats_logger = stats_logger
+        self.stale_timeout = stale_timeout
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+
+    def load(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        blob = self.cache.get(cache_key)
+        if not blob:
+            return None
+        self.stats_logger.incr("loaded_from_cache")
+        try:
+            return self.serializer.loads(blob)
+        except Exception as e:
+            logging.exception(e)
+            logging.error(f"Error reading cache: {e}")
+            return None
+
+    def load_many(self, cache_keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Loads the values of many keys in a single round trip, the missing
+        and unreadable ones are left out"""
+        cache_keys = list(set(cache_keys))
+        if not self.cache or not cache_keys:
+            return {}
+        try:
+            blobs = self.cache.get_many(*cache_keys)
+        except Exception as e:
+            logging.warning(f"Error reading cache: {e}")
+            return {}
+        cache_values = {}
+        for cache_key, blob in zip(cache_keys, blobs):
+            if not blob:
+                continue
+            self.stats_logger.incr("loaded_from_cache")
+            try:
+                cache_values[cache_key] = self.serializer.loads(blob)
+            except Exception as e:
+                logging.exception(e)
+                logging.error(f"Error reading cache: {e}")
+        return cache_values
+
+    @staticmethod
+    def is_expired(cache_value: Dict[str, Any]) -> bool:
+        return cache_value.get("expires", float("inf")) <= time.time()
+
+    def store(self, cache_key: str, cache_value: Dict[str, Any], timeout: int) -> None:
+        try:
+            if self.stale_timeout:
+                cache_value = dict(cache_value, expires=time.time() + timeout)
+                timeout += self.stale_timeout
+            blob = self.serializer.dumps(cache_value)
+            logging.info("Caching {} chars at key {}".format(len(blob), cache_key))
+            self.stats_logger.incr("set_cache_key")
+            self.cache.set(cache_key, blob, timeout=timeout)
+        except Exception as e:
+            # cache.set call can fail if the backend is down or if
+            # the key is too large or whatever other reasons
+            logging.warning("Could not cache key {}".format(cache_key))
+            logging.exception(e)
+            self.cache.delete(cache_key)
+
+    def _lock_key(self, cache_key: str) -> str:
+        return f"{cache_key}__lock"
+
+    def _acquire(self, cache_key: str) -> Optional[str]:
+        token = uuid.uuid4().hex
+        if self.cache.add(self._lock_key(cache_key), token, timeout=self.lock_timeout):
+            return token
+        return None
+
+    def _release(self, cache_key: str, token: str) -> None:
+        if self.cache.get(self._lock_key(cache_key)) == token:
+            self.cache.delete(self._lock_key(cache_key))
+
+    def _wait(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Waits for another request to compute the value, up to ``lock_wait``
+        seconds, returns None if it gave up"""
+        deadline = time.time() + self.lock_wait
+        interval = 0.05
+        while time.time() < deadline:
+            time.sleep(interval)
+            interval = min(interval * 2, 1)
+            cache_value = self.load(cache_key)
+            if cache_value is not None:
+                return cache_value
+            if self.cache.get(self._lock_key(cache_key)) is None:
+                # the other request failed to compute the value
+                return None
+        return None
+
+    def _compute(
+        self,
+        cache_key: str,
+        compute: Callable[[], Tuple[Dict[str, Any], bool]],
+        timeout: int,
+        token: Optional[str],
+    ) -> Dict[str, Any]:
+        try:
+            cache_value, cacheable = compute()
+            if cacheable:
+                self.store(cache_key, cache_value, timeout)
+            return cache_value
+        finally:
+            if token:
+                self._release(cache_key, token)
+
+    def fetch(
+        self,
+        cache_key: Optional[str],
+        compute: Callable[[], Tuple[Dict[str, Any], bool]],
+        timeout: int,
+        force: bool = False,
+        preloaded: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Returns the value cached under the key, and whether it came from the
+        cache
+
+        ``compute`` returns a value to cache, a dict holding the ``df``, and
+        whether it's fit to be cached, which failed queries aren't.
+        ``preloaded`` is the value already read from the cache by ``load_many``.
+        """
+        if not cache_key or not self.cache:
+            return compute()[0], False
+        if force:
+            return self._compute(cache_key, compute, timeout, None), False
+
+        cache_value = preloaded if preloaded is not None else self.load(cache_key)
+        if cache_value is not None:
+            if not self.is_expired(cache_value):
+                return cache_value, True
+        if not self.lock_timeout:
+            return self._compute(cache_key, compute, timeout, None), False
+
+        if cache_value is not None:
+            token = self._acquire(cache_key)
+            if not token:
+                # another request is refreshing it
+                self.stats_logger.incr("chart_cache.stale")
+                return cache_value, True
+            self.stats_logger.incr("chart_cache.refresh")
+            return self._compute(cache_key, compute, timeout, token), False
+
+        token = self._acquire(cache_key)
+        if not token:
+            self.stats_logger.incr("chart_cache.coalesced")
+            cache_value = self._wait(cache_key)
+            if cache_value is not None:
+                return cache_value, True
+            token = self._acquire(cache_key)
+        return self._compute(cache_key, compute, timeout, token), False
@@ -16,6 +16,8 @@
 # under the License.
 # pylint: disable=C,R,W
 """Utility functions used across Superset"""
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import date, datetime, time, timedelta
 import decimal
 from email.mime.application import MIMEApplication
@@ -32,7 +34,18 @@ import signal
 import smtplib
 from time import struct_time
 import traceback
-from typing import Iterator, List, NamedTuple, Optional, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
 from urllib.parse import unquote_plus
 import uuid
 import zlib
@@ -805,6 +818,66 @@ def setup_cache(app: Flask, cache_config) -> Optional[Cache]:
     return None
 
 
+def is_shared_cache(cache_config) -> bool:
+    """Whether the cache set up from the config is seen by all the processes
+
+    The "simple" cache lives in the memory of each process, which values
+    invalidated by other processes, web server workers or Celery workers,
+    never reach.
+    """
+    if not cache_config:
+        return False
+    if isinstance(cache_config, dict):
+        return cache_config.get("CACHE_TYPE") not in ("null", "simple")
+    return True
+
+
+def run_concurrently(
+    func: Callable[[Any], Any],
+    items: List[Any],
+    get_key: Callable[[Any], Hashable],
+    max_workers: int,
+    max_workers_per_key: int,
+) -> Iterator[Tuple[int, Any]]:
+    """Runs ``func`` on the items in threads, yielding the index of each item
+    along with its result as soon as it's done
+
+    At most ``max_workers`` items run at once, and ``max_workers_per_key`` of
+    those sharing a key, the database they query for instance. Items are only
+    handed to a thread once they can run, so that the items of a busy key
+    don't hold all the threads while the others wait.
+    """
+    queues: Dict[Hashable, deque] = defaultdict(deque)
+    for index, item in enumerate(items):
+        queues[get_key(item)].append(index)
+    # the key and index of the item each future runs
+    running: Dict[Any, Tuple[Hashable, int]] = {}
+    running_per_key: Dict[Hashable, int] = defaultdict(int)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+
+        def submit():
+            for key, queue in queues.items():
+                while (
+                    queue
+                    and running_per_key[key] < max_workers_per_key
+                    and len(running) < max_workers
+                ):
+                    index = queue.popleft()
+                    running[executor.submit(func, items[index])] = (key, index)
+                    running_per_key[key] += 1
+
+        submit()
+        while running:
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            finished = [(future, running.pop(future)) for future in done]
+            for future, (key, index) in finished:
+                running_per_key[key] -= 1
+            submit()
+            for future, (key, index) in finished:
+                yield index, future.result()
+
+
 def zlib_compress(data):
     """
     Compress things in a py2/3 safe fashion
@@ -832,6 +905,21 @@ def zlib_decompress(blob: bytes, decode: Optional[bool] = True) -> Union[bytes,
     return decompressed.decode("utf-8") if decode else decompressed
 
 
+def gzip_stream(chunks: Iterator[str], encoding: str = "utf-8") -> Iterator[bytes]:
+    """
+    Gzip compresses an iterator of strings on the fly
+    >>> blob = b"".join(gzip_stream(iter(["a,b\\n", "1,2\\n"])))
+    >>> zlib.decompress(blob, 16 + zlib.MAX_WBITS)
+    b'a,b\\n1,2\\n'
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode(encoding))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
 _celery_app = None
 
 
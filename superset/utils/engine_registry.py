@@ -0,0 +1,187 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Process wide registry of pooled SQLAlchemy engines
+
+By default ``Database.get_sqla_engine`` creates a new engine without a
+connection pool on every call, so every query pays for opening a connection.
+When ``SQLALCHEMY_ENGINE_REGISTRY`` is enabled engines are kept here instead,
+keyed on the database, schema, effective user and source, each with its own
+connection pool.
+
+Engines are keyed on a fingerprint of the connection settings of their
+database as well, so editing the URI or the extra parameters of a database
+in any process makes the other processes drop its engines on their next use.
+The least recently used idle engines are disposed of when there are more
+than ``SQLALCHEMY_ENGINE_REGISTRY_SIZE`` of them.
+"""
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from superset import app
+
+config = app.config
+stats_logger = config.get("STATS_LOGGER")
+
+# pool arguments only understood by QueuePool
+QUEUE_POOL_PARAMS = ("pool_size", "max_overflow", "pool_timeout")
+
+
+def get_fingerprint(*settings: Any) -> str:
+    """Hashes the connection settings engines are built from"""
+    return hashlib.md5("|".join(str(s) for s in settings).encode("utf-8")).hexdigest()
+
+
+def get_pool_params(url, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Adds the ``SQLALCHEMY_ENGINE_POOL_PARAMS`` defaults to the engine params
+
+    Parameters set in the database's ``engine_params`` take precedence, and the
+    sizing parameters are skipped for dialects that don't use a QueuePool, like
+    SQLite.
+    """
+    pool_params = dict(config.get("SQLALCHEMY_ENGINE_POOL_PARAMS") or {})
+    poolclass = params.get("poolclass") or url.get_dialect().get_pool_class(url)
+    if not issubclass(poolclass, QueuePool):
+        for param in QUEUE_POOL_PARAMS:
+            pool_params.pop(param, None)
+    pool_params.update(params)
+    return pool_params
+
+
+def _is_idle(engine: Engine) -> bool:
+    checkedout = getattr(engine.pool, "checkedout", None)
+    return checkedout is None or checkedout() == 0
+
+
+def _pool_stats(engine: Engine) -> Dict[str, Optional[int]]:
+    pool = engine.pool
+    return {
+        stat: getattr(pool, stat)() if hasattr(pool, stat) else None
+        for stat in ("size", "checkedin", "checkedout", "overflow")
+    }
+
+
+class EngineRegistry(object):
+    def __init__(self, max_engines: int) -> None:
+        self.max_engines = max_engines
+        self._engines: "OrderedDict[Tuple, Engine]" = OrderedDict()
+        self._fingerprints: Dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def get_engine(
+        self,
+        database_id: int,
+        fingerprint: str,
+        schema: Optional[str],
+        user_name: Optional[str],
+        source: Optional[str],
+        create_engine: Callable[[], Engine],
+    ) -> Engine:
+        """Returns the engine registered for these database, schema, user and
+        source, the engine is created with ``create_engine`` when there's none
+        yet"""
+        key = (database_id, fingerprint, schema, user_name, source)
+        with self._lock:
+            if self._fingerprints.get(database_id, fingerprint) != fingerprint:
+                self._invalidate(database_id)
+            self._fingerprints[database_id] = fingerprint
+            engine = self._engines.get(key)
+            if engine is not None:
+                self._engines.move_to_end(key)
+                stats_logger.incr("engine_registry.hit")
+                return engine
+
+        stats_logger.incr("engine_registry.miss")
+        # creating an engine doesn't connect, but the DB_CONNECTION_MUTATOR
+        # may be slow, so it's called without holding the lock
+        engine = create_engine()
+        with self._lock:
+            existing = self._engines.get(key)
+            if existing is not None:
+                # another thread registered one in the meantime
+                engine.dispose()
+                return existing
+            self._engines[key] = engine
+            self._evict()
+            stats_logger.gauge("engine_registry.engines", len(self._engines))
+        return engine
+
+    def _evict(self) -> None:
+        # engines with connections in use are kept, the registry may then
+        # temporarily hold more than max_engines
+        for key in list(self._engines):
+            if len(self._engines) <= self.max_engines:
+                break
+            if _is_idle(self._engines[key]):
+                self._engines.pop(key).dispose()
+                stats_logger.incr("engine_registry.evicted")
+
+    def _invalidate(self, database_id: int) -> None:
+        for key in [key for key in self._engines if key[0] == database_id]:
+            self._engines.pop(key).dispose()
+        self._fingerprints.pop(database_id, None)
+
+    def invalidate(self, database_id: int) -> None:
+        """Disposes of the engines of a database whose settings changed"""
+        with self._lock:
+            self._invalidate(database_id)
+        logging.info(f"Disposed of the pooled engines of database {database_id}")
+
+    def forget(self) -> None:
+        """Drops the engines without closing their connections, which a forked
+        process shares with its parent"""
+        self._engines = OrderedDict()
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        with self._lock:
+            for engine in self._engines.values():
+                engine.dispose()
+            self._engines.clear()
+            self._fingerprints.clear()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Returns the pool statistics of every registered engine, from the
+        most to the least recently used"""
+        with self._lock:
+            engines = list(self._engines.items())
+        stats = []
+        for (database_id, _, schema, user_name, source), engine in reversed(engines):
+            stats.append(
+                dict(
+                    database_id=database_id,
+                    schema=schema,
+                    user_name=user_name,
+                    source=source,
+                    **_pool_stats(engine),
+                )
+            )
+        return stats
+
+
+engine_registry = EngineRegistry(config.get("SQLALCHEMY_ENGINE_REGISTRY_SIZE"))
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=engine_registry.forget)
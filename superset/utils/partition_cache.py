@@ -0,0 +1,75 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Cache of the latest partitions of Presto and Hive tables
+
+Looking up the latest partition of a table takes a trip to the metastore for
+its indexes and a partition query, on each render of a template calling
+``presto.latest_partition`` and each ``select_star`` of a partitioned table.
+Their results are cached for ``LATEST_PARTITION_CACHE_TIMEOUT`` seconds, and
+until the partitions of the table, or of the whole database, are invalidated.
+The ``partition_cache.hit`` and ``partition_cache.miss`` metrics tell how many
+lookups were spared.
+
+Tables are told apart by their schema, the default one of the database when
+they're named without any, so that ``presto.latest_partition("schema.table")``
+and refreshing the ``table`` dataset of that schema hit the same entries.
+"""
+from typing import Any, Callable, Dict, List, Optional
+
+import simplejson as json
+
+from superset import partition_cache
+
+
+def _dependencies(
+    database, schema: Optional[str], table_name: Optional[str]
+) -> List[str]:
+    dependencies = [f"database_{database.id}"]
+    if table_name:
+        if "." in table_name:
+            schema, table_name = table_name.split(".", 1)
+        if not schema:
+            schema = database.db_engine_spec.get_default_schema(database.url_object)
+        dependencies.append(f"table_{database.id}_{schema}.{table_name}")
+    return dependencies
+
+
+def get(
+    database,
+    schema: Optional[str],
+    table_name: str,
+    lookup: str,
+    compute: Callable[[], Any],
+    params: Optional[Dict[str, Any]] = None,
+) -> Any:
+    """Returns the result of the ``lookup`` of the table, ``compute`` runs it
+    when it isn't cached. ``params`` are the arguments the result depends
+    on, the filters of the lookup for instance."""
+    key = [database.id, schema, table_name, lookup, params or {}]
+    name = json.dumps(key, sort_keys=True, default=str)
+    dependencies = _dependencies(database, schema, table_name)
+    return partition_cache.get(name, dependencies, compute)
+
+
+def invalidate(
+    database, schema: Optional[str] = None, table_name: Optional[str] = None
+) -> None:
+    """Drops the cached partitions of the table, or of all the tables of the
+    database without a ``table_name``"""
+    dependencies = _dependencies(database, schema, table_name)
+    partition_cache.invalidate(dependencies[-1:])
@@ -0,0 +1,173 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Lightweight signalling between the web server and SQL Lab workers
+
+Workers used to re-read the ``Query`` row from the metadata database before
+each statement to find out whether the user stopped the query. Instead,
+``stop_query`` raises a flag in the cache, which is cheap to check as often as
+needed. When the cache isn't shared between processes (no cache, or the
+"simple" in-memory one) the flag only lives in the current process, and checks
+fall back to reading the query status from the database.
+
+The progress of running queries travels the other way: ``ProgressReporter``
+publishes it in the cache, where ``get_progress`` reads it for the web server,
+and only writes it to the ``Query`` row every now and then.
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm.session import Session
+
+from superset import app, shared_cache
+from superset.models.sql_lab import Query
+from superset.utils.core import QueryStatus
+
+config = app.config
+
+# the time until which queries stopped from this process are flagged, queries
+# running in another process are never cleared from here
+_local_stop_requests: Dict[int, float] = {}
+_local_stop_requests_lock = threading.Lock()
+
+
+def _stop_key(query_id: int) -> str:
+    return f"sqllab_query_stopped_{query_id}"
+
+
+def _progress_key(query_id: int) -> str:
+    return f"sqllab_query_progress_{query_id}"
+
+
+def request_stop(query_id: int) -> None:
+    """Signals the worker running the query that it should stop"""
+    now = time.time()
+    with _local_stop_requests_lock:
+        for id_, expires in list(_local_stop_requests.items()):
+            if expires <= now:
+                del _local_stop_requests[id_]
+        _local_stop_requests[query_id] = now + config.get(
+            "SQLLAB_ASYNC_TIME_LIMIT_SEC"
+        )
+    if shared_cache:
+        try:
+            shared_cache.set(
+                _stop_key(query_id),
+                True,
+                timeout=config.get("SQLLAB_ASYNC_TIME_LIMIT_SEC"),
+            )
+        except Exception as e:
+            logging.exception(e)
+
+
+def is_stop_requested(query_id: int, session: Optional[Session] = None) -> bool:
+    """Whether the query was stopped by the user
+
+    Without a shared cache to carry the flag, the status is read from the
+    metadata database through ``session`` when one is given.
+    """
+    if _local_stop_requests.get(query_id, 0) > time.time():
+        return True
+    if shared_cache:
+        return bool(shared_cache.get(_stop_key(query_id)))
+    if session is not None:
+        status = session.query(Query.status).filter_by(id=query_id).scalar()
+        return status in (QueryStatus.STOPPED, QueryStatus.TIMED_OUT)
+    return False
+
+
+def publish_progress(query_id: int, progress: float) -> None:
+    """Shares the progress of the query with the web servers"""
+    if shared_cache:
+        try:
+            shared_cache.set(
+                _progress_key(query_id),
+                progress,
+                timeout=config.get("SQLLAB_ASYNC_TIME_LIMIT_SEC"),
+            )
+        except Exception as e:
+            logging.exception(e)
+
+
+def get_progress(query_ids: List[int]) -> Dict[int, float]:
+    """The progress published for the queries, the ones without any are left
+    out"""
+    if not shared_cache or not query_ids:
+        return {}
+    try:
+        values = shared_cache.get_many(*[_progress_key(id_) for id_ in query_ids])
+    except Exception as e:
+        logging.exception(e)
+        return {}
+    return {
+        query_id: progress
+        for query_id, progress in zip(query_ids, values)
+        if progress is not None
+    }
+
+
+class ProgressReporter(object):
+    """Reports the progress of a running query, and whether it got stopped
+
+    Each update is published right away through the cache, while the
+    ``Query`` row is only written every ``commit_interval`` seconds, and on
+    ``flush``. Without a shared cache the row is written on every update, as
+    it's the only way for the web servers to see it.
+    """
+
+    def __init__(
+        self, query: Query, session: Session, commit_interval: Optional[int] = None
+    ) -> None:
+        self.query = query
+        self.query_id = query.id
+        self.session = session
+        if commit_interval is None:
+            commit_interval = config.get("SQLLAB_PROGRESS_COMMIT_INTERVAL")
+        self.commit_interval = commit_interval
+        self.progress = query.progress or 0
+        self.last_commit = time.time()
+        self.pending = False
+
+    def update(self, progress: float) -> None:
+        if progress <= self.progress:
+            return
+        self.progress = progress
+        publish_progress(self.query_id, progress)
+        self.pending = True
+        if not shared_cache or time.time() - self.last_commit >= self.commit_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the latest progress to the ``Query`` row"""
+        if self.pending:
+            self.query.progress = self.progress
+            self.session.commit()
+            self.pending = False
+        self.last_commit = time.time()
+
+    def should_stop(self) -> bool:
+        return is_stop_requested(self.query_id, self.session)
+
+
+def clear(query_id: int) -> None:
+    """Forgets about the query once it's done running"""
+    with _local_stop_requests_lock:
+        _local_stop_requests.pop(query_id, None)
+    if shared_cache:
+        shared_cache.delete_many(_stop_key(query_id), _progress_key(query_id))
@@ -0,0 +1,126 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# pylint: disable=C,R,W
+"""Cache of values derived from database objects
+
+Each object a cached value depends on, a dashboard or a datasource for
+instance, has a version: a random token kept in the cache. Values are cached
+under a key made of the versions of all their dependencies, so that dropping
+the version of any of them, when it changes, makes the next read compute the
+value again. The outdated entries are never read again and expire on their own.
+
+A version missing from the cache, because it was dropped or evicted, gets a
+new token, which can't match any of the keys computed before.
+"""
+import hashlib
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import uuid
+
+
+class VersionedCache(object):
+    def __init__(
+        self, cache, stats_logger, timeout: Optional[int] = None, prefix: str = "v"
+    ) -> None:
+        self.cache = cache
+        self.stats_logger = stats_logger
+        self.timeout = timeout
+        self.prefix = prefix
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.cache) and self.timeout is not None
+
+    def _version_key(self, dependency: str) -> str:
+        return f"{self.prefix}_version_{dependency}"
+
+    def get_versions(self, dependencies: Iterable[str]) -> Dict[str, str]:
+        dependencies = list(set(dependencies))
+        keys = [self._version_key(dependency) for dependency in dependencies]
+        versions = dict(zip(dependencies, self.cache.get_many(*keys)))
+        for dependency, key in zip(dependencies, keys):
+            if versions[dependency] is None:
+                token = uuid.uuid4().hex
+                # concurrent readers agree on the first token set
+                if not self.cache.add(key, token, timeout=self.timeout):
+                    token = self.cache.get(key) or token
+                versions[dependency] = token
+        return versions
+
+    def make_key(
+        self, name: str, dependencies: List[str], versions: Dict[str, str]
+    ) -> str:
+        digest = hashlib.md5(name.encode("utf-8"))
+        for dependency in dependencies:
+            digest.update(f"|{dependency}:{versions[dependency]}".encode("utf-8"))
+        return f"{self.prefix}_{digest.hexdigest()}"
+
+    def get_many(
+        self,
+        entries: Dict[str, List[str]],
+        compute: Callable[[List[str]], Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """Returns the values of the entries, computing the missing ones
+
+        ``entries`` maps the name of each value to the names of the objects it
+        depends on, ``compute`` gets the names of the missing values and
+        returns them all at once.
+        """
+        if not self.enabled or not entries:
+            return compute(list(entries))
+
+        names = list(entries)
+        try:
+            versions = self.get_versions(
+                dependency for name in names for dependency in entries[name]
+            )
+            keys = {
+                name: self.make_key(name, entries[name], versions) for name in names
+            }
+            values = dict(zip(names, self.cache.get_many(*keys.values())))
+        except Exception as e:
+            logging.warning(f"Failed to read the versioned cache: {e}")
+            return compute(names)
+
+        missing = [name for name in names if values[name] is None]
+        for name in names:
+            hit = "miss" if values[name] is None else "hit"
+            self.stats_logger.incr(f"{self.prefix}_cache.{hit}")
+        if missing:
+            computed = compute(missing)
+            values.update(computed)
+            try:
+                self.cache.set_many(
+                    {keys[name]: computed[name] for name in missing},
+                    timeout=self.timeout,
+                )
+            except Exception as e:
+                logging.warning(f"Failed to write the versioned cache: {e}")
+        return values
+
+    def get(
+        self, name: str, dependencies: List[str], compute: Callable[[], Any]
+    ) -> Any:
+        values = self.get_many({name: dependencies}, lambda names: {name: compute()})
+        return values[name]
+
+    def invalidate(self, dependencies: Iterable[str]) -> None:
+        """Drops the versions of the objects, once their changes are visible
+        to the readers, i.e. committed"""
+        keys = [self._version_key(dependency) for dependency in set(dependencies)]
+        if self.cache and keys:
+            self.cache.delete_many(*keys)
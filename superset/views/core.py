@@ -20,8 +20,7 @@ from datetime import datetime, timedelta
 import logging
 import os
 import re
-import subprocess
-from typing import Dict, List, Optional, Union  # noqa: F401
+from typing import Dict, Iterator, List, Optional, Union  # noqa: F401
 from urllib import parse
 
 import backoff
@@ -34,6 +33,7 @@ from flask import (
     render_template,
     request,
     Response,
+    stream_with_context,
     url_for,
 )
 from flask_appbuilder import expose
@@ -84,8 +84,9 @@ from superset.models.sql_lab import Query
 from superset.models.user_attributes import UserAttribute
 from superset.sql_parse import ParsedQuery
 from superset.sql_validators import get_validator_by_name
+from superset.tasks import dashboard_pdf
 from superset.utils import core as utils
-from superset.utils import dashboard_import_export
+from superset.utils import dashboard_import_export, engine_registry, query_status
 from superset.utils.dates import now_as_float
 from superset.utils.decorators import etag_cache, stats_timing
 from .base import (
@@ -107,9 +108,11 @@ from .base import (
 from .utils import (
     apply_display_max_row_limit,
     bootstrap_user_data,
+    get_chart_batch_items,
     get_datasource_info,
     get_form_data,
     get_viz,
+    stream_chart_batch,
 )
 
 # from superset.iou import scheduler
@@ -224,8 +227,30 @@ def check_slice_perms(self, slice_id):
     security_manager.assert_viz_permission(viz_obj)
 
 
+def _format_results(df, selected_columns, db_engine_spec, result_format):
+    """Formats a results dataframe, returns its data, columns and expanded columns
+
+    Nested fields get expanded on records, so the columnar layout is only used
+    when the engine has nothing to expand in these columns.
+    """
+    if (
+        result_format == dataframe.ResultFormat.COLUMNAR
+        and not db_engine_spec.has_nested_data(selected_columns)
+    ):
+        data = dataframe.SupersetDataFrame.format_columnar(df)["data"]
+        return data, selected_columns, [], result_format
+
+    all_columns, data, expanded_columns = db_engine_spec.expand_data(
+        selected_columns, dataframe.SupersetDataFrame.format_data(df) or []
+    )
+    return data, all_columns, expanded_columns, dataframe.ResultFormat.RECORDS
+
+
 def _deserialize_results_payload(
-        payload: Union[bytes, str], query, use_msgpack: Optional[bool] = False
+        payload: Union[bytes, str],
+        query,
+        use_msgpack: Optional[bool] = False,
+        result_format: str = dataframe.ResultFormat.RECORDS,
 ) -> dict:
     logging.debug(f"Deserializing from msgpack: {use_msgpack}")
     if use_msgpack:
@@ -234,28 +259,74 @@ def _deserialize_results_payload(
         ):
             ds_payload = msgpack.loads(payload, raw=False)
 
-        with stats_timing("sqllab.query.results_backend_pa_deserialize", stats_logger):
-            df = pa.deserialize(ds_payload["data"])
-
-        # TODO: optimize this, perhaps via df.to_dict, then traversing
-        ds_payload["data"] = dataframe.SupersetDataFrame.format_data(df) or []
-
         db_engine_spec = query.database.db_engine_spec
-        all_columns, data, expanded_columns = db_engine_spec.expand_data(
-            ds_payload["selected_columns"], ds_payload["data"]
-        )
-        ds_payload.update(
-            {"data": data, "columns": all_columns, "expanded_columns": expanded_columns}
-        )
+        # statements that ran in parallel come with their own results
+        for result in [ds_payload] + (ds_payload.get("results") or []):
+            with stats_timing(
+                    "sqllab.query.results_backend_pa_deserialize", stats_logger
+            ):
+                df = pa.deserialize(result["data"])
+            with stats_timing("sqllab.query.results_format", stats_logger):
+                data, all_columns, expanded_columns, data_format = _format_results(
+                    df, result["selected_columns"], db_engine_spec, result_format
+                )
+            result.update(
+                {
+                    "data": data,
+                    "columns": all_columns,
+                    "expanded_columns": expanded_columns,
+                    "result_format": data_format,
+                }
+            )
 
         return ds_payload
     else:
         with stats_timing(
                 "sqllab.query.results_backend_json_deserialize", stats_logger
         ):
+            # rows were formatted as records by the worker
             return json.loads(payload)  # noqa
 
 
+def _deserialize_results_payload_chunks(
+        payload: Union[bytes, str], query, use_msgpack: bool, chunk_size: int
+) -> Iterator[pd.DataFrame]:
+    """Yields a results payload as dataframes of at most ``chunk_size`` rows
+
+    Contrary to ``_deserialize_results_payload``, rows are formatted and expanded
+    one chunk at a time, so the formatted rows don't grow with the row count. At
+    least one (possibly empty) dataframe is always yielded.
+
+    The payload itself is decoded at once: the results backend holds it as a
+    single msgpack and Arrow, or JSON, blob which can't be read incrementally.
+    The memory used still grows with the row count of the raw results, the
+    blob is released as soon as it's decoded.
+    """
+    if use_msgpack:
+        ds_payload = msgpack.loads(payload, raw=False)
+        del payload
+        df = pa.deserialize(ds_payload.pop("data"))
+        db_engine_spec = query.database.db_engine_spec
+        for start in range(0, max(len(df.index), 1), chunk_size):
+            data = dataframe.SupersetDataFrame.format_data(
+                df.iloc[start : start + chunk_size]
+            )
+            all_columns, data, _ = db_engine_spec.expand_data(
+                ds_payload["selected_columns"], data
+            )
+            columns = [c["name"] for c in all_columns]
+            yield pd.DataFrame.from_records(data, columns=columns)
+    else:
+        ds_payload = json.loads(payload)
+        del payload
+        columns = [c["name"] for c in ds_payload["columns"]]
+        data = ds_payload["data"]
+        for start in range(0, max(len(data), 1), chunk_size):
+            yield pd.DataFrame.from_records(
+                data[start : start + chunk_size], columns=columns
+            )
+
+
 class SliceFilter(SupersetFilter):
     def apply(self, query, func):  # noqa
         if security_manager.all_datasource_access():
@@ -761,6 +832,12 @@ class Superset(BaseSupersetView):
         datasources = sorted(datasources, key=lambda o: o["name"])
         return self.json_response(datasources)
 
+    @has_access_api
+    @expose("/engine_pools/")
+    def engine_pools(self):
+        """Connection pool stats of the engines pooled by this process"""
+        return self.json_response(engine_registry.engine_registry.stats())
+
     @has_access_api
     @expose("/override_role_permissions/", methods=["POST"])
     def override_role_permissions(self):
@@ -1190,6 +1267,33 @@ class Superset(BaseSupersetView):
             viz_obj,chartname=slice_name, csv=csv, xlsx=xlsx, pdf=pdf, query=query, results=results, samples=samples
         )
 
+    @event_logger.log_this
+    @api
+    @has_access_api
+    @handle_api_exception
+    @expose("/explore_json_batch/", methods=["POST"])
+    def explore_json_batch(self):
+        """Serves the data of many charts of a dashboard in a single request
+
+        Takes a JSON body holding the `dashboard_id` and the `queries`, each
+        with a `key` identifying the chart and its `form_data`. Streams a line
+        of JSON per chart, in the order they complete, holding its `key`, the
+        `status` and the `payload` `explore_json` would have answered."""
+        body = request.get_json(force=True, silent=True) or {}
+        queries = body.get("queries")
+        if not isinstance(queries, list):
+            return json_error_response("A list of queries is expected", status=400)
+        force = request.args.get("force") == "true"
+        logging.info(
+            f"Serving {len(queries)} charts of dashboard {body.get('dashboard_id')}"
+        )
+        items = get_chart_batch_items(queries, force=force)
+        user_id = g.user.get_id() if g.user else None
+        return Response(
+            stream_with_context(stream_chart_batch(items, user_id)),
+            mimetype="application/x-ndjson",
+        )
+
 
     @event_logger.log_this
     @has_access
@@ -2194,14 +2298,15 @@ class Superset(BaseSupersetView):
         dash = qry.one_or_none()
         if not dash:
             abort(404)
-        datasources = set()
-        for slc in dash.slices:
-            datasource = slc.datasource
-            if datasource:
-                datasources.add(datasource)
 
         if config.get("ENABLE_ACCESS_REQUEST"):
-            for datasource in datasources:
+            datasources = dash.get_datasources_by_uids(
+                {
+                    (datasource_type, datasource_id)
+                    for _, datasource_type, datasource_id, _ in dash.get_slice_refs()
+                }
+            )
+            for datasource in datasources.values():
                 if datasource and not security_manager.datasource_access(datasource):
                     flash(
                         __(
@@ -2236,7 +2341,8 @@ class Superset(BaseSupersetView):
             edit_mode=edit_mode,
         )
 
-        dashboard_data = dash.data
+        # only the permissions of the user are worked out for each request
+        dashboard_data, datasources_data = dash.get_bootstrap_data()
         dashboard_data.update(
             {
                 "standalone_mode": standalone_mode,
@@ -2251,7 +2357,7 @@ class Superset(BaseSupersetView):
         bootstrap_data = {
             "user_id": g.user.get_id(),
             "dashboard_data": dashboard_data,
-            "datasources": {ds.uid: ds.data for ds in datasources},
+            "datasources": datasources_data,
             "common": self.common_bootstrap_payload(),
             "editMode": edit_mode,
         }
@@ -2539,7 +2645,12 @@ class Superset(BaseSupersetView):
             )
 
         payload = utils.zlib_decompress(blob, decode=not results_backend_use_msgpack)
-        obj = _deserialize_results_payload(payload, query, results_backend_use_msgpack)
+        obj = _deserialize_results_payload(
+            payload,
+            query,
+            results_backend_use_msgpack,
+            request.args.get("result_format", dataframe.ResultFormat.RECORDS),
+        )
 
         return json_success(
             json.dumps(
@@ -2575,6 +2686,7 @@ class Superset(BaseSupersetView):
             return self.json_response("OK")
         query.status = QueryStatus.STOPPED
         db.session.commit()
+        query_status.request_stop(query.id)
 
         return self.json_response("OK")
 
@@ -2847,8 +2959,10 @@ class Superset(BaseSupersetView):
 
         3. We append the current date and time to the PDF
 
-        TODO: Make a cleaner in the scheduler so that it can delete the generated reports every 24 hours
-        so that it does not loads up the storage.
+        4. The PDF is shared by identical requests and rendered by a Celery worker
+        with PDF_EXPORT_ASYNC, see superset.tasks.dashboard_pdf. The response
+        either links to the PDF, or carries the id of the job to poll with
+        /superset/downloadpdf/<task_id>/
 
         """
         invalid_char = {" ",'"',"'"}
@@ -2861,24 +2975,40 @@ class Superset(BaseSupersetView):
         dt_string = now.strftime("%d-%b-%Y--%H_%M")
         title += "_" + dt_string
         pdf_name = ''.join([x for x in title if x not in invalid_char])
-        #TODO: Make the nodejs script accept command line arguments in more standard way like: node script.js argument1=something argument2=something
-        final_command = "node printPdf_singleTab.js {0}  {1} {2} {3}".format(url,pdf_name, tab_selected_id, origin)
-        # logging.debug(final_command)
-        pdf_path = "/static/reports/" + pdf_name+".pdf"
-        pdf_link = origin + pdf_path
-        file_name = pdf_name +".pdf"
         try:
-            subprocess.run(final_command,shell=True,cwd= app.config['PRINT_PDF_SERVICE'])
-            # pdf_file_os_path = "static/reports/" + file_name
-            data = {'file_name': pdf_name, 'link': pdf_link}
-            return Response(response=json.dumps(data), mimetype='application/json',status=200)
-        except subprocess.CalledProcessError as e:
+            data = dashboard_pdf.request_dashboard_pdf(
+                url, pdf_name, tab_selected_id, origin
+            )
+        except Exception as e:
+            logging.exception(e)
             return json_error_response(
-                msg = "Internal server error",
+                msg="Internal server error",
                 status=500,
             )
+        return self._pdf_response(data, origin)
 
+    @api
+    @expose("/downloadpdf/<task_id>/", methods=['GET'])
+    def get_pdf_status(self, task_id):
+        """Polls the rendering job started by get_pdf"""
+        origin = request.args.get('origin', '').strip('"')
+        data = dashboard_pdf.get_dashboard_pdf_status(task_id)
+        if data['status'] == dashboard_pdf.PdfStatus.FAILED:
+            return json_error_response(
+                msg="Internal server error",
+                status=500,
+            )
+        return self._pdf_response(data, origin)
 
+    def _pdf_response(self, data, origin):
+        if data['status'] == dashboard_pdf.PdfStatus.SUCCESS:
+            data['link'] = origin + "/static/reports/" + data['file_name'] + ".pdf"
+            return Response(
+                response=json.dumps(data), mimetype="application/json", status=200
+            )
+        return Response(
+            response=json.dumps(data), mimetype="application/json", status=202
+        )
 
     @has_access
     @expose("/csv/<client_id>")
@@ -2900,40 +3030,59 @@ class Superset(BaseSupersetView):
                 "Fetching CSV from results backend " "[{}]".format(query.results_key)
             )
             blob = results_backend.get(query.results_key)
+        chunk_size = config.get("CSV_EXPORT_CHUNK_SIZE")
         if blob:
             logging.info("Decompressing")
-            payload = utils.zlib_decompress(
-                blob, decode=not results_backend_use_msgpack
-            )
-            obj = _deserialize_results_payload(
-                payload, query, results_backend_use_msgpack
-            )
-            columns = [c["name"] for c in obj["columns"]]
-            df = pd.DataFrame.from_records(obj["data"], columns=columns)
-            logging.info("Using pandas to convert to CSV")
-            csv = df.to_csv(index=False, **config.get("CSV_EXPORT"))
+            # the chunks generator holds the only reference to the payload
+            df_chunks = _deserialize_results_payload_chunks(
+                utils.zlib_decompress(blob, decode=not results_backend_use_msgpack),
+                query,
+                results_backend_use_msgpack,
+                chunk_size,
+            )
+            del blob
         else:
             logging.info("Running a query to turn into CSV")
             sql = query.select_sql or query.executed_sql
-            df = query.database.get_df(sql, query.schema)
-            # TODO(bkyryliuk): add compression=gzip for big files.
-            csv = df.to_csv(index=False, **config.get("CSV_EXPORT"))
-        response = Response(csv, mimetype="text/csv")
-        response.headers[
-            "Content-Disposition"
-        ] = f"attachment; filename={query.name}.csv"
+            df_chunks = query.database.iter_df(sql, query.schema, chunk_size)
+
+        csv_export = config.get("CSV_EXPORT")
         event_info = {
             "event_type": "data_export",
             "client_id": client_id,
-            "row_count": len(df.index),
+            "row_count": 0,
             "database": query.database.name,
             "schema": query.schema,
             "sql": query.sql,
             "exported_format": "csv",
         }
-        logging.info(
-            f"CSV exported: {repr(event_info)}", extra={"superset_event": event_info}
-        )
+
+        def generate_csv():
+            logging.info("Using pandas to convert to CSV")
+            for i, df in enumerate(df_chunks):
+                event_info["row_count"] += len(df.index)
+                yield df.to_csv(index=False, header=i == 0, **csv_export)
+            logging.info(
+                f"CSV exported: {repr(event_info)}",
+                extra={"superset_event": event_info},
+            )
+
+        filename = f"{query.name}.csv"
+        if config.get("CSV_EXPORT_GZIP"):
+            filename += ".gz"
+            response = Response(
+                stream_with_context(
+                    utils.gzip_stream(
+                        generate_csv(), csv_export.get("encoding", "utf-8")
+                    )
+                ),
+                mimetype="application/gzip",
+            )
+        else:
+            response = Response(
+                stream_with_context(generate_csv()), mimetype="text/csv"
+            )
+        response.headers["Content-Disposition"] = f"attachment; filename={filename}"
         return response
 
     @api
@@ -2970,14 +3119,31 @@ class Superset(BaseSupersetView):
         # UTC date time, same that is stored in the DB.
         last_updated_dt = utils.EPOCH + timedelta(seconds=last_updated_ms_int / 1000)
 
+        # running queries publish their progress in the cache, and only write
+        # it to the database every now and then
         sql_queries = (
             db.session.query(Query)
-                .filter(
-                Query.user_id == g.user.get_id(), Query.changed_on >= last_updated_dt
+            .filter(
+                Query.user_id == g.user.get_id(),
+                or_(
+                    Query.changed_on >= last_updated_dt,
+                    Query.status == QueryStatus.RUNNING,
+                ),
             )
-                .all()
+            .all()
+        )
+        live_progress = query_status.get_progress(
+            [q.id for q in sql_queries if q.status == QueryStatus.RUNNING]
         )
-        dict_queries = {q.client_id: q.to_dict() for q in sql_queries}
+        dict_queries = {}
+        for q in sql_queries:
+            progress = live_progress.get(q.id)
+            has_progressed = progress is not None and progress > (q.progress or 0)
+            if q.changed_on < last_updated_dt and not has_progressed:
+                continue
+            dict_queries[q.client_id] = q.to_dict()
+            if has_progressed:
+                dict_queries[q.client_id]["progress"] = progress
         return json_success(json.dumps(dict_queries, default=utils.json_int_dttm_ser))
 
     @has_access
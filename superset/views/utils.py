@@ -16,17 +16,19 @@
 # under the License.
 # pylint: disable=C,R,W
 from collections import defaultdict
-from typing import Any, Dict, List, Optional, Tuple
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from urllib import parse
 
-from flask import request
+from flask import g, request
 import simplejson as json
 
-from superset import app, db, viz
+from superset import app, chart_data_cache, db, security_manager, viz
 from superset.connectors.connector_registry import ConnectorRegistry
-from superset.exceptions import SupersetException
+from superset.exceptions import SupersetException, SupersetSecurityException
 from superset.legacy import update_time_range
 import superset.models.core as models
+from superset.utils import core as utils
 from superset.utils.core import QueryStatus
 
 
@@ -176,6 +178,225 @@ def get_datasource_info(
     return datasource_id, datasource_type
 
 
+def get_batch_form_data(form_datas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Same as `get_form_data` with `use_slice_data` for many form_data at once,
+    their slices are loaded with a single query
+    """
+    form_datas = [
+        {k: v for k, v in form_data.items() if k not in FORM_DATA_KEY_BLACKLIST}
+        for form_data in form_datas
+    ]
+    slice_ids = {
+        form_data["slice_id"] for form_data in form_datas if form_data.get("slice_id")
+    }
+    slices = {}
+    if slice_ids:
+        qry = db.session.query(models.Slice).filter(models.Slice.id.in_(slice_ids))
+        slices = {str(slc.id): slc for slc in qry}
+
+    result = []
+    for form_data in form_datas:
+        slc = slices.get(str(form_data.get("slice_id")))
+        if slc:
+            slice_form_data = slc.form_data.copy()
+            slice_form_data.update(form_data)
+            form_data = slice_form_data
+        update_time_range(form_data)
+        result.append(form_data)
+    return result
+
+
+def get_database_key(datasource) -> str:
+    """Identifies the database, or Druid cluster, the datasource queries"""
+    database = getattr(datasource, "database", None) or getattr(
+        datasource, "cluster", None
+    )
+    if database:
+        return f"{type(database).__name__}_{database.id}"
+    return datasource.uid
+
+
+def get_chart_batch_items(
+    queries: List[Dict[str, Any]], force: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Builds the viz of each query of a chart data batch, a dict holding the
+    `key` identifying the chart and its `form_data`.
+
+    The slices and the datasources are loaded with a query per type, and the
+    access to each datasource is checked once. The items that can't be served
+    hold the `error` message and status `explore_json` would have answered.
+    """
+    form_datas = get_batch_form_data(
+        [query.get("form_data") or {} for query in queries]
+    )
+    items = []
+    ids_by_type = defaultdict(set)
+    for query, form_data in zip(queries, form_datas):
+        item = {"key": query.get("key"), "form_data": form_data, "force": force}
+        items.append(item)
+        try:
+            datasource_id, datasource_type = get_datasource_info(None, None, form_data)
+        except SupersetException as e:
+            item["error"] = (utils.error_msg_from_exception(e), 500)
+            continue
+        item["datasource_type"] = datasource_type
+        item["datasource_id"] = datasource_id
+        if datasource_type in ConnectorRegistry.sources:
+            ids_by_type[datasource_type].add(datasource_id)
+
+    datasources = {}
+    for datasource_type, datasource_ids in ids_by_type.items():
+        for datasource in ConnectorRegistry.get_datasources_by_ids(
+            db.session, datasource_type, datasource_ids, eager=True
+        ):
+            datasources[(datasource_type, datasource.id)] = datasource
+
+    access_errors = {}
+    for uid, datasource in datasources.items():
+        try:
+            security_manager.assert_datasource_permission(datasource)
+        except SupersetSecurityException as e:
+            access_errors[uid] = e
+
+    for item in items:
+        if "error" in item:
+            continue
+        uid = (item["datasource_type"], item["datasource_id"])
+        datasource = datasources.get(uid)
+        if datasource is None:
+            item["error"] = (
+                "The datasource associated with this chart no longer exists",
+                404,
+            )
+        elif uid in access_errors:
+            item["error"] = (str(access_errors[uid]), access_errors[uid].status)
+        else:
+            item["database"] = get_database_key(datasource)
+            viz_type = item["form_data"].get("viz_type", "table")
+            try:
+                item["viz_obj"] = viz.viz_types[viz_type](
+                    datasource, form_data=item["form_data"], force=force
+                )
+            except Exception as e:
+                logging.exception(e)
+                item["error"] = (utils.error_msg_from_exception(e), 500)
+    return items
+
+
+def chart_batch_line(key: Any, status: int, payload_json: str) -> str:
+    # the payload is serialized already, by the viz
+    return '{{"key": {}, "status": {}, "payload": {}}}\n'.format(
+        json.dumps(key), status, payload_json
+    )
+
+
+def get_chart_batch_line(item: Dict[str, Any], viz_obj=None) -> str:
+    """Runs the queries of the chart, unless they're cached, and returns the
+    line of JSON holding its payload"""
+    if "error" in item:
+        msg, status = item["error"]
+        payload_json = json.dumps({"error": msg})
+        return chart_batch_line(item["key"], status, payload_json)
+    viz_obj = viz_obj or item["viz_obj"]
+    try:
+        payload = viz_obj.get_payload()
+        payload_json, has_error = viz_obj.payload_json_and_has_error(payload)
+    except Exception as e:
+        logging.exception(e)
+        payload_json = json.dumps(
+            {"error": utils.error_msg_from_exception(e)},
+            default=utils.json_iso_dttm_ser,
+        )
+        return chart_batch_line(item["key"], 500, payload_json)
+    return chart_batch_line(item["key"], 400 if has_error else 200, payload_json)
+
+
+def run_chart_batch_item(item: Dict[str, Any], user_id: Optional[int]) -> str:
+    """
+    Same as `get_chart_batch_line` in a thread of its own, which can't share
+    the request's session objects: the datasource and the viz are built again
+    """
+    with app.test_request_context():
+        g.user = security_manager.get_user_by_id(user_id) if user_id else None
+        viz_obj = None
+        try:
+            datasource = ConnectorRegistry.get_datasource(
+                item["datasource_type"], item["datasource_id"], db.session
+            )
+            viz_type = item["form_data"].get("viz_type", "table")
+            viz_obj = viz.viz_types[viz_type](
+                datasource, form_data=item["form_data"], force=item["force"]
+            )
+        except Exception as e:
+            logging.exception(e)
+            item = dict(item, error=(utils.error_msg_from_exception(e), 500))
+        return get_chart_batch_line(item, viz_obj)
+
+
+def stream_chart_batch(
+    items: List[Dict[str, Any]],
+    user_id: Optional[int],
+    max_workers: Optional[int] = None,
+    max_workers_per_database: Optional[int] = None,
+) -> Iterator[str]:
+    """
+    Yields a line of JSON per item of `get_chart_batch_items`, as soon as its
+    payload is ready.
+
+    The data of all the charts is read from the cache at once, the charts
+    that can be served right away come first. The queries of the others run
+    concurrently, with at most `max_workers` running at once and
+    `max_workers_per_database` against a single database.
+    """
+    max_workers = max_workers or app.config.get("CHART_DATA_BATCH_MAX_WORKERS")
+    max_workers_per_database = max_workers_per_database or app.config.get(
+        "CHART_DATA_BATCH_MAX_WORKERS_PER_DATABASE"
+    )
+
+    cache_keys = {}
+    for index, item in enumerate(items):
+        viz_obj = item.get("viz_obj")
+        if viz_obj is None or viz_obj.force:
+            continue
+        try:
+            query_obj = viz_obj.query_obj()
+            cache_key = viz_obj.cache_key(query_obj) if query_obj else None
+        except Exception as e:
+            # the query can't be built, which get_payload reports
+            logging.info(f"No cache key for chart {item['key']}: {e}")
+            continue
+        if cache_key:
+            cache_keys[index] = cache_key
+    cache_values = chart_data_cache.load_many(list(cache_keys.values()))
+
+    misses = []
+    for index, item in enumerate(items):
+        cache_value = cache_values.get(cache_keys.get(index))
+        if "error" in item:
+            yield get_chart_batch_line(item)
+        elif cache_value is not None and not chart_data_cache.is_expired(cache_value):
+            item["viz_obj"].preloaded_cache_values[cache_keys[index]] = cache_value
+            yield get_chart_batch_line(item)
+        else:
+            misses.append(item)
+    if not misses:
+        return
+
+    results = utils.run_concurrently(
+        lambda item: run_chart_batch_item(
+            {k: v for k, v in item.items() if k != "viz_obj"}, user_id
+        ),
+        misses,
+        lambda item: item["database"],
+        max_workers,
+        max_workers_per_database,
+    )
+    for _, line in results:
+        yield line
+
+
 def apply_display_max_row_limit(sql_results: Dict[str, Any]) -> Dict[str, Any]:
     """
     Given a `sql_results` nested structure, applies a limit to the number of rows
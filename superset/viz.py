@@ -26,12 +26,11 @@ from datetime import datetime, timedelta
 from functools import reduce
 import hashlib
 import inspect
-from io import BytesIO
 from itertools import product
 import logging
 import math
-import pickle as pkl
 import re
+import tempfile
 from typing import Any, Dict, List, Optional
 import uuid
 
@@ -43,20 +42,18 @@ from geopy.point import Point
 from markdown import markdown
 import numpy as np
 import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype
 from pandas.tseries.frequencies import to_offset
 import polyline
 import simplejson as json
 import weasyprint
+import xlsxwriter
 
-from superset import app, cache, get_css_manifest_files
+from superset import app, chart_data_cache, get_css_manifest_files
+from superset.dataframe import ResultFormat, SupersetDataFrame
 from superset.exceptions import NullValueException, SpatialException
 from superset.utils import core as utils
-from superset.utils.core import (
-    DTTM_ALIAS,
-    JS_MAX_INTEGER,
-    merge_extra_filters,
-    to_adhoc,
-)
+from superset.utils.core import DTTM_ALIAS, merge_extra_filters, to_adhoc
 from werkzeug import FileWrapper
 
 config = app.config
@@ -116,6 +113,8 @@ class BaseViz(object):
         self._any_cache_key = None
         self._any_cached_dttm = None
         self._extra_chart_data = []
+        # values read from the chart data cache beforehand, by cache key
+        self.preloaded_cache_values = {}
 
         self.process_metrics()
 
@@ -137,17 +136,6 @@ class BaseViz(object):
         self.all_metrics = list(self.metric_dict.values())
         self.metric_labels = list(self.metric_dict.keys())
 
-    @staticmethod
-    def handle_js_int_overflow(data):
-        for d in data.get("records", dict()):
-            for k, v in list(d.items()):
-                if isinstance(v, int):
-                    # if an int is too big for Java Script to handle
-                    # convert it to a string
-                    if abs(v) > JS_MAX_INTEGER:
-                        d[k] = str(v)
-        return data
-
     def run_extra_queries(self):
         """Lifecycle method to use when more than one query is needed
 
@@ -395,68 +383,41 @@ class BaseViz(object):
             query_obj = self.query_obj()
         cache_key = self.cache_key(query_obj, **kwargs) if query_obj else None
         logging.info("Cache key: {}".format(cache_key))
-        is_loaded = False
         stacktrace = None
         df = None
-        cached_dttm = datetime.utcnow().isoformat().split(".")[0]
-        if cache_key and cache and not self.force:
-            cache_value = cache.get(cache_key)
-            if cache_value:
-                stats_logger.incr("loaded_from_cache")
-                try:
-                    cache_value = pkl.loads(cache_value)
-                    df = cache_value["df"]
-                    self.query = cache_value["query"]
-                    self._any_cached_dttm = cache_value["dttm"]
-                    self._any_cache_key = cache_key
-                    self.status = utils.QueryStatus.SUCCESS
-                    is_loaded = True
-                except Exception as e:
-                    logging.exception(e)
-                    logging.error(
-                        "Error reading cache: " + utils.error_msg_from_exception(e)
-                    )
-                logging.info("Serving from cache")
 
-        if query_obj and not is_loaded:
+        def compute():
+            nonlocal stacktrace
+            cached_dttm = datetime.utcnow().isoformat().split(".")[0]
+            df = None
             try:
                 df = self.get_df(query_obj)
                 if self.status != utils.QueryStatus.FAILED:
                     stats_logger.incr("loaded_from_source")
-                    is_loaded = True
             except Exception as e:
                 logging.exception(e)
                 if not self.error_message:
                     self.error_message = "{}".format(e)
                 self.status = utils.QueryStatus.FAILED
                 stacktrace = utils.get_stacktrace()
-
-            if (
-                is_loaded
-                and cache_key
-                and cache
-                and self.status != utils.QueryStatus.FAILED
-            ):
-                try:
-                    cache_value = dict(
-                        dttm=cached_dttm,
-                        df=df if df is not None else None,
-                        query=self.query,
-                    )
-                    cache_value = pkl.dumps(cache_value, protocol=pkl.HIGHEST_PROTOCOL)
-
-                    logging.info(
-                        "Caching {} chars at key {}".format(len(cache_value), cache_key)
-                    )
-
-                    stats_logger.incr("set_cache_key")
-                    cache.set(cache_key, cache_value, timeout=self.cache_timeout)
-                except Exception as e:
-                    # cache.set call can fail if the backend is down or if
-                    # the key is too large or whatever other reasons
-                    logging.warning("Could not cache key {}".format(cache_key))
-                    logging.exception(e)
-                    cache.delete(cache_key)
+            cache_value = dict(dttm=cached_dttm, df=df, query=self.query)
+            return cache_value, self.status != utils.QueryStatus.FAILED
+
+        if query_obj:
+            cache_value, is_cached = chart_data_cache.fetch(
+                cache_key,
+                compute,
+                self.cache_timeout,
+                force=self.force,
+                preloaded=self.preloaded_cache_values.pop(cache_key, None),
+            )
+            df = cache_value["df"]
+            if is_cached:
+                logging.info("Serving from cache")
+                self.query = cache_value["query"]
+                self._any_cached_dttm = cache_value["dttm"]
+                self._any_cache_key = cache_key
+                self.status = utils.QueryStatus.SUCCESS
         return {
             "cache_key": self._any_cache_key,
             "cached_dttm": self._any_cached_dttm,
@@ -494,105 +455,166 @@ class BaseViz(object):
         }
         return content
 
-    def get_width_col(self,col,dataframe):
+    def sample_rows(self, dataframe):
+        """Returns at most XLSX_COLUMN_WIDTH_SAMPLE_SIZE evenly spaced rows"""
+        sample_size = config.get("XLSX_COLUMN_WIDTH_SAMPLE_SIZE")
+        if len(dataframe) <= sample_size:
+            return dataframe
+        return dataframe.iloc[:: -(-len(dataframe) // sample_size)]
+
+    def get_width_col(self, col, dataframe):
         """
         Returns the max_width which we want to set for a column, points take in consideration
         are: 1. Max_width limit of a column = 100
              2. Max_width initially considered as the no of characters in the column's header
-             3. If any content while iteration is more than the length of header than we update
+             3. If any content of the sampled rows is longer than the header than we update
         """
-        max_width = len(col)
         max_limit = 100
-        len_df_col = len(dataframe)
-        if len_df_col < 0:
-            return None
-        if len_df_col < 1 and len_df_col > 0:
-            max_width = len(str(dataframe[col][0]))
-            return max_width
-        else:
-            row_c = 2
-            while(row_c < len_df_col):
-                if dataframe[col][row_c] != None:
-                    max_w = len(str(dataframe[col][row_c]))
-                    if max_w > max_width:
-                        max_width = max_w
-                row_c *= 4
-            if max_limit < max_width:
-                return max_limit
-            return max_width
-
-
-    def get_max_widths(self,dataframe):
+        max_width = len(str(col))
+        values = self.sample_rows(dataframe)[col].dropna()
+        if len(values):
+            max_width = max(max_width, values.astype(str).str.len().max())
+        return int(min(max_width, max_limit))
 
-        cols = dataframe.columns
-        widths = []
-        for col in cols:
-            widths.append(self.get_width_col(col,dataframe))
-
-        return widths
+    def get_max_widths(self, dataframe):
+        sample = self.sample_rows(dataframe)
+        return [self.get_width_col(col, sample) for col in sample.columns]
 
     def get_xlsx(self):
         df = self.get_df(limit=True)
         include_index = not isinstance(df.index, pd.RangeIndex)
-        output = BytesIO()
-        writer = pd.ExcelWriter(output, engine='xlsxwriter')
-        df.to_excel(writer,index=include_index,merge_cells=False)
-        workbook  = writer.book
-        worksheet = writer.sheets['Sheet1']
-        widths = self.get_max_widths(df)
-        for index in range(len(widths)):
-            worksheet.set_column(index,index,widths[index]+2)
-        writer.close()
-        output.seek(0)
-        wrapped_file = FileWrapper(output)
-        return wrapped_file
+        return FileWrapper(self.write_xlsx(df, include_index))
+
+    @staticmethod
+    def to_xlsx_value(value):
+        """Converts the values xlsxwriter can't write to ones it can"""
+        if isinstance(value, datetime) and value.tzinfo:
+            return value.replace(tzinfo=None)
+        if isinstance(value, (str, int, float, bool, datetime, timedelta)):
+            return value
+        return str(value)
+
+    def write_xlsx(self, df, include_index=False):
+        """Writes the dataframe to a temporary xlsx file and returns it
+
+        xlsxwriter's constant_memory mode flushes each row to disk as soon as
+        the next one starts, which requires writing row by row, as opposed to
+        the column by column order of DataFrame.to_excel.
+        """
+        output = tempfile.TemporaryFile()
+        workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+        worksheet = workbook.add_worksheet("Sheet1")
+        header_format = workbook.add_format(
+            {"bold": True, "border": 1, "align": "center", "valign": "top"}
+        )
+        datetime_format = workbook.add_format({"num_format": "yyyy-mm-dd hh:mm:ss"})
+
+        sample = self.sample_rows(df)
+        if include_index:
+            sample = sample.reset_index()
+        columns = [
+            ".".join(str(c) for c in col) if isinstance(col, tuple) else col
+            for col in sample.columns
+        ]
+        # column formats apply to the cells written without one of their own
+        for index, width in enumerate(self.get_max_widths(sample)):
+            if is_datetime64_any_dtype(sample.dtypes.iloc[index]):
+                worksheet.set_column(index, index, width + 2, datetime_format)
+            else:
+                worksheet.set_column(index, index, width + 2)
+        worksheet.write_row(0, 0, [str(col) for col in columns], header_format)
+
+        row_index = 1
+        chunk_size = config.get("XLSX_EXPORT_CHUNK_SIZE")
+        for start in range(0, len(df), chunk_size):
+            chunk = df.iloc[start : start + chunk_size]
+            if include_index:
+                chunk = chunk.reset_index()
+            chunk = chunk.astype(object).where(chunk.notnull(), None)
+            for row in chunk.itertuples(index=False, name=None):
+                try:
+                    worksheet.write_row(row_index, 0, row)
+                except TypeError:
+                    values = [self.to_xlsx_value(v) for v in row]
+                    worksheet.write_row(row_index, 0, values)
+                row_index += 1
 
+        workbook.close()
+        output.seek(0)
+        return output
 
     def get_pdf(self):
         df = self.get_df(limit=True)
         no_of_col = len(df.columns)
-        include_index = not isinstance(df.index, pd.RangeIndex)
         pd.set_option('display.width', 1000)
         pd.set_option('colheader_justify', 'center')
 
-        html_string = """<html>	
-		                    <head></head>	
-                            <style>	
-                                    .tablestyle {	
-                                        font-size: 11pt;	
-                                        font-family: Arial;	
-                                        border-collapse: collapse;	
-                                        border: 1px solid silver;	
-                                    }	
-                                    .tablestyle td, th {	
-                                        padding: 5px;	
-                                    }	
-                                    .tablestyle tr:nth-child(even) {	
-                                        background: #E0E0E0;	
-                                    }	
-                                    .tablestyle tr:hover {	
-                                        background: silver;	
-                                        cursor: pointer;	
-                                    }	
-                            </style>	
-		                <body>	
-		        """+ df.to_html(classes='tablestyle')+"""</body></html>"""
+        html_string = """<html>
+                            <head></head>
+                            <style>
+                                    .tablestyle {
+                                        font-size: 11pt;
+                                        font-family: Arial;
+                                        border-collapse: collapse;
+                                        border: 1px solid silver;
+                                    }
+                                    .tablestyle td, th {
+                                        padding: 5px;
+                                    }
+                                    .tablestyle tr:nth-child(even) {
+                                        background: #E0E0E0;
+                                    }
+                                    .tablestyle tr:hover {
+                                        background: silver;
+                                        cursor: pointer;
+                                    }
+                            </style>
+                            <body>
+                            """
 
         if no_of_col > config.get("CHART_TO_PDF_COLUMN_LIMIT_A3"):
             size_css = weasyprint.CSS(string=("@page {size: A3; margin: 0in 0.44in 0.2in 0.44in;}"))
         else:
             size_css = weasyprint.CSS(string=("@page {size: A4;}"))
-        pdf = weasyprint.HTML(string=html_string).write_pdf(stylesheets=[size_css])
-        return pdf
 
+        # Laying out a table gets slower the longer it is, so the rows are
+        # rendered a chunk at a time and the pages put together at the end
+        row_limit = config.get("CHART_TO_PDF_ROW_LIMIT")
+        note = ""
+        if len(df) > row_limit:
+            note = f"<p>Showing the first {row_limit} out of {len(df)} rows</p>"
+            df = df.iloc[:row_limit]
+        chunk_size = config.get("CHART_TO_PDF_CHUNK_SIZE")
+        documents = []
+        for start in range(0, max(len(df), 1), chunk_size):
+            html = note + df.iloc[start : start + chunk_size].to_html(
+                classes='tablestyle'
+            )
+            note = ""
+            documents.append(
+                weasyprint.HTML(string=html_string + html + "</body></html>").render(
+                    stylesheets=[size_css]
+                )
+            )
+        pages = [page for document in documents for page in document.pages]
+        return documents[0].copy(pages).write_pdf()
 
     def get_csv(self):
         df = self.get_df(limit=True)
         include_index = not isinstance(df.index, pd.RangeIndex)
         return df.to_csv(index=include_index, **config.get("CSV_EXPORT"))
 
+    @property
+    def result_format(self):
+        """The layout of the data of charts whose data is the dataframe itself,
+        clients that can handle ``ResultFormat.COLUMNAR`` ask for it in the
+        form data"""
+        return self.form_data.get("result_format") or ResultFormat.RECORDS
+
     def get_data(self, df):
-        return df.to_dict(orient="records")
+        if self.result_format == ResultFormat.COLUMNAR:
+            return SupersetDataFrame.format_columnar(df)
+        return SupersetDataFrame.format_data(df)
 
     @property
     def json_data(self):
@@ -688,11 +710,9 @@ class TableViz(BaseViz):
             ):
                 del df[m]
 
-        data = self.handle_js_int_overflow(
-            dict(records=df.to_dict(orient="records"), columns=list(df.columns))
-        )
-
-        return data
+        if self.result_format == ResultFormat.COLUMNAR:
+            return SupersetDataFrame.format_columnar(df)
+        return dict(records=SupersetDataFrame.format_data(df), columns=list(df.columns))
 
     def json_dumps(self, obj, sort_keys=False):
         return json.dumps(
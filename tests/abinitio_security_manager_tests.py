@@ -0,0 +1,112 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the Ab Initio auth gateway logins"""
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+from superset.abinitio_security_manager import (
+    AbinitioAuthGateway,
+    AbinitioSecurityManager,
+    RoleCache,
+)
+from superset.security import SupersetSecurityManager
+
+GATEWAY_CONFIG = {
+    "host": "gateway",
+    "port": "53501",
+    "root_path": "/ag/",
+    "get_user_roles_path": "apm/getUserInfo.do",
+    "product_name": "IOU Core",
+    "role_mapping": {"1": "Admin", "2": "Gamma"},
+    "connect_timeout": 1,
+    "read_timeout": 2,
+    "role_cache_ttl": 60,
+}
+
+USER_INFO = b"""<?xml version="1.0" encoding="UTF-8"?>
+<user><roles><role id="1"/><role id="9"/></roles></user>"""
+
+
+class RoleCacheTests(unittest.TestCase):
+    def test_get(self):
+        cache = RoleCache(ttl=60)
+        self.assertIsNone(cache.get("alice", "secret"))
+        cache.set("alice", "secret", ["Admin"])
+        self.assertEqual(["Admin"], cache.get("alice", "secret"))
+        self.assertIsNone(cache.get("alice", "wrong"))
+        self.assertIsNone(cache.get("bob", "secret"))
+
+    def test_tampered_entry(self):
+        cache = RoleCache(ttl=60)
+        cache.set("alice", "secret", ["Gamma"])
+        _, _, expires_at = cache._entries["alice"]
+        cache._entries["alice"] = ("0" * 64, ["Admin"], expires_at)
+        self.assertIsNone(cache.get("alice", "secret"))
+
+    def test_expired_entry(self):
+        cache = RoleCache(ttl=60)
+        cache.set("alice", "secret", ["Admin"])
+        with mock.patch("time.time", return_value=time.time() + 61):
+            self.assertIsNone(cache.get("alice", "secret"))
+
+    def test_update_user_invalidates(self):
+        sm = AbinitioSecurityManager.__new__(AbinitioSecurityManager)
+        sm.abinitio_gateway = AbinitioAuthGateway(GATEWAY_CONFIG)
+        sm.abinitio_gateway.role_cache.set("alice", "secret", ["Admin"])
+        user = mock.Mock(username="alice")
+        with mock.patch.object(SupersetSecurityManager, "update_user") as update_user:
+            sm.update_user(user)
+        update_user.assert_called_once_with(user)
+        self.assertIsNone(sm.abinitio_gateway.role_cache.get("alice", "secret"))
+
+
+class AbinitioAuthGatewayTests(unittest.TestCase):
+    def setUp(self):
+        self.gateway = AbinitioAuthGateway(GATEWAY_CONFIG)
+        patch = mock.patch.object(self.gateway.session, "get")
+        self.get = patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_get_user_roles(self):
+        self.get.return_value = mock.Mock(status_code=200, content=USER_INFO)
+        self.assertEqual(["Admin"], self.gateway.get_user_roles("alice", "secret"))
+        self.assertEqual((1, 2), self.get.call_args[1]["timeout"])
+        # served from the cache
+        self.assertEqual(["Admin"], self.gateway.get_user_roles("alice", "secret"))
+        self.assertEqual(1, self.get.call_count)
+
+    def test_user_without_roles_not_cached(self):
+        self.get.return_value = mock.Mock(
+            status_code=200, content=b"<user><roles/></user>"
+        )
+        self.assertEqual([], self.gateway.get_user_roles("alice", "secret"))
+        self.gateway.get_user_roles("alice", "secret")
+        self.assertEqual(2, self.get.call_count)
+
+    def test_gateway_errors(self):
+        self.get.side_effect = requests.exceptions.Timeout()
+        with self.assertRaises(requests.exceptions.Timeout):
+            self.gateway.get_user_roles("alice", "secret")
+
+        self.get.side_effect = None
+        self.get.return_value = mock.Mock(status_code=503, content=b"")
+        with self.assertRaises(Exception):
+            self.gateway.get_user_roles("alice", "secret")
+        self.assertIsNone(self.gateway.role_cache.get("alice", "secret"))
@@ -0,0 +1,146 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the chart data cache serializers"""
+import threading
+import time
+from unittest import mock, TestCase
+
+import pandas as pd
+from werkzeug.contrib.cache import SimpleCache
+
+from superset.utils.chart_cache import (
+    ArrowChartCacheSerializer,
+    ChartDataCache,
+    loads,
+    ParquetChartCacheSerializer,
+    PickleChartCacheSerializer,
+)
+
+
+class ChartCacheSerializerTests(TestCase):
+    def get_cache_value(self):
+        df = pd.DataFrame(
+            {
+                "name": ["Aaron", "Abigail", None],
+                "num": [1, 2, 3],
+                "ratio": [0.5, None, 1.5],
+                "__timestamp": pd.to_datetime(
+                    ["2019-01-01", "2019-01-02", "2019-01-03"]
+                ),
+            }
+        )
+        return {"dttm": "2019-01-01T00:00:00", "df": df, "query": "SELECT 1"}
+
+    def assert_round_trip(self, serializer):
+        cache_value = self.get_cache_value()
+        loaded = serializer.loads(serializer.dumps(cache_value))
+        self.assertEqual(loaded["dttm"], cache_value["dttm"])
+        self.assertEqual(loaded["query"], cache_value["query"])
+        pd.testing.assert_frame_equal(loaded["df"], cache_value["df"])
+
+    def test_pickle_round_trip(self):
+        self.assert_round_trip(PickleChartCacheSerializer())
+
+    def test_arrow_round_trip(self):
+        self.assert_round_trip(ArrowChartCacheSerializer())
+        self.assert_round_trip(ArrowChartCacheSerializer(compression="lz4"))
+        self.assert_round_trip(ArrowChartCacheSerializer(compression="zstd"))
+
+    def test_parquet_round_trip(self):
+        self.assert_round_trip(ParquetChartCacheSerializer())
+        self.assert_round_trip(ParquetChartCacheSerializer(compression="zstd"))
+
+    def test_unsupported_compression(self):
+        with self.assertRaises(ValueError):
+            ArrowChartCacheSerializer(compression="rar")
+
+    def test_reads_legacy_pickle(self):
+        cache_value = self.get_cache_value()
+        blob = PickleChartCacheSerializer().dumps(cache_value)
+        loaded = ArrowChartCacheSerializer().loads(blob)
+        pd.testing.assert_frame_equal(loaded["df"], cache_value["df"])
+
+    def test_falls_back_to_pickle(self):
+        cache_value = self.get_cache_value()
+        cache_value["df"]["mixed"] = [1, "a", {"b": 2}]
+        blob = ArrowChartCacheSerializer().dumps(cache_value)
+        pd.testing.assert_frame_equal(loads(blob)["df"], cache_value["df"])
+
+        cache_value["df"] = None
+        blob = ArrowChartCacheSerializer().dumps(cache_value)
+        self.assertIsNone(loads(blob)["df"])
+
+
+class ChartDataCacheTests(TestCase):
+    def get_chart_data_cache(self, **kwargs):
+        return ChartDataCache(
+            SimpleCache(), PickleChartCacheSerializer(), mock.Mock(), **kwargs
+        )
+
+    def compute(self, calls, value="new", delay=0):
+        def compute():
+            calls.append(value)
+            time.sleep(delay)
+            return {"df": value, "dttm": "2019-01-01T00:00:00", "query": ""}, True
+
+        return compute
+
+    def test_concurrent_misses_are_coalesced(self):
+        chart_data_cache = self.get_chart_data_cache(lock_wait=5)
+        calls = []
+        results = []
+
+        def fetch():
+            results.append(
+                chart_data_cache.fetch("key", self.compute(calls, delay=0.2), 60)
+            )
+
+        threads = [threading.Thread(target=fetch) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(["new"], calls)
+        self.assertEqual(["new"] * 5, [value["df"] for value, _ in results])
+        self.assertEqual(4, len([is_cached for _, is_cached in results if is_cached]))
+
+    def test_failures_are_not_cached(self):
+        chart_data_cache = self.get_chart_data_cache()
+        compute = mock.Mock(return_value=({"df": None}, False))
+        chart_data_cache.fetch("key", compute, 60)
+        chart_data_cache.fetch("key", compute, 60)
+        self.assertEqual(2, compute.call_count)
+
+    def test_stale_while_revalidate(self):
+        chart_data_cache = self.get_chart_data_cache(stale_timeout=60)
+        calls = []
+        chart_data_cache.fetch("key", self.compute(calls, "old"), 60)
+        value, is_cached = chart_data_cache.fetch("key", self.compute(calls), 60)
+        self.assertEqual(("old", True), (value["df"], is_cached))
+
+        # expired, another request holds the lock: the stale value is served
+        with mock.patch("time.time", return_value=time.time() + 61):
+            self.assertTrue(chart_data_cache._acquire("key"))
+            value, is_cached = chart_data_cache.fetch("key", self.compute(calls), 60)
+            self.assertEqual(("old", True), (value["df"], is_cached))
+            chart_data_cache.cache.delete("key__lock")
+
+            # the first request to find it expired refreshes it
+            value, is_cached = chart_data_cache.fetch("key", self.compute(calls), 60)
+            self.assertEqual(("new", False), (value["df"], is_cached))
+        self.assertEqual(["old", "new"], calls)
@@ -27,6 +27,7 @@ import re
 import string
 import unittest
 from unittest import mock
+import zlib
 
 import pandas as pd
 import psycopg2
@@ -36,6 +37,7 @@ from superset import dataframe, db, jinja_context, security_manager, sql_lab
 from superset.connectors.sqla.models import SqlaTable
 from superset.db_engine_specs.base import BaseEngineSpec
 from superset.db_engine_specs.mssql import MssqlEngineSpec
+from superset.db_engine_specs.presto import PrestoEngineSpec
 from superset.models import core as models
 from superset.models.sql_lab import Query
 from superset.utils import core as utils
@@ -482,6 +484,32 @@ class CoreTests(SupersetTestCase):
         self.assertEqual(list(expected_data), list(data))
         self.logout()
 
+    @mock.patch.dict(views.config, {"CSV_EXPORT_CHUNK_SIZE": 1})
+    def test_csv_endpoint_streams_chunks(self):
+        self.login("admin")
+        sql = """
+            SELECT DISTINCT name
+            FROM birth_names
+            WHERE name IN ('Aaron', 'James')
+            ORDER BY name
+        """
+        client_id = "{}".format(random.getrandbits(64))[:10]
+        self.run_sql(sql, client_id, raise_on_error=True)
+
+        resp = self.get_resp("/superset/csv/{}".format(client_id))
+        self.assertEqual(
+            list(csv.reader(io.StringIO(resp))), [["name"], ["Aaron"], ["James"]]
+        )
+
+        with mock.patch.dict(views.config, {"CSV_EXPORT_GZIP": True}):
+            resp = self.client.get("/superset/csv/{}".format(client_id))
+        self.assertEqual(resp.mimetype, "application/gzip")
+        self.assertEqual(
+            zlib.decompress(resp.data, 16 + zlib.MAX_WBITS).decode("utf-8"),
+            "name\nAaron\nJames\n",
+        )
+        self.logout()
+
     def test_extra_table_metadata(self):
         self.login("admin")
         dbid = utils.get_example_database().id
@@ -510,6 +538,17 @@ class CoreTests(SupersetTestCase):
         rendered = tp.process_template(s, foo="bar")
         self.assertEqual("bar", rendered)
 
+    def test_process_template_is_compiled_once(self):
+        maindb = utils.get_example_database()
+        s = "SELECT '{{ foo }}'"
+        jinja_context.template_cache.clear()
+        tp = jinja_context.get_template_processor(database=maindb, foo="bar")
+        self.assertEqual("SELECT 'bar'", tp.process_template(s))
+        tp = jinja_context.get_template_processor(database=maindb, foo="baz")
+        self.assertEqual("SELECT 'baz'", tp.process_template(s))
+        self.assertEqual(1, jinja_context.template_cache.misses)
+        self.assertEqual(1, jinja_context.template_cache.hits)
+
     def test_templated_sql_json(self):
         self.login("admin")
         sql = "SELECT '{{ datetime(2017, 1, 1).isoformat() }}' as test"
@@ -729,6 +768,39 @@ class CoreTests(SupersetTestCase):
             data["error"], "The datasource associated with this chart no longer exists"
         )
 
+    def test_explore_json_batch(self):
+        self.login(username="admin")
+        girls = self.get_slice("Girls", db.session)
+        boys = self.get_slice("Boys", db.session)
+        queries = [
+            {"key": "girls", "form_data": {"slice_id": girls.id}},
+            {"key": "boys", "form_data": {"slice_id": boys.id}},
+            {"key": "none", "form_data": {}},
+        ]
+        resp = self.client.post(
+            "/superset/explore_json_batch/?force=true",
+            json={"dashboard_id": None, "queries": queries},
+        )
+        self.assertEqual(resp.mimetype, "application/x-ndjson")
+        lines = [json.loads(line) for line in resp.data.decode("utf-8").splitlines()]
+        results = {line["key"]: line for line in lines}
+        self.assertEqual(set(results), {"girls", "boys", "none"})
+        self.assertEqual(results["girls"]["status"], 200)
+        self.assertIn("Jennifer", json.dumps(results["girls"]["payload"]["data"]))
+        self.assertEqual(results["boys"]["status"], 200)
+        self.assertEqual(results["none"]["status"], 500)
+        self.assertEqual(
+            results["none"]["payload"]["error"],
+            "The datasource associated with this chart no longer exists",
+        )
+
+        # served from the cache, all at once
+        resp = self.client.post(
+            "/superset/explore_json_batch/", json={"queries": queries[:2]}
+        )
+        lines = [json.loads(line) for line in resp.data.decode("utf-8").splitlines()]
+        self.assertEqual([line["key"] for line in lines], ["girls", "boys"])
+
     @mock.patch("superset.security.SupersetSecurityManager.schemas_accessible_by_user")
     @mock.patch("superset.security.SupersetSecurityManager.database_access")
     @mock.patch("superset.security.SupersetSecurityManager.all_datasource_access")
@@ -841,10 +913,98 @@ class CoreTests(SupersetTestCase):
                 serialized_payload, query_mock, use_new_deserialization
             )
             payload["data"] = dataframe.SupersetDataFrame.format_data(cdf.raw_df)
+            payload["result_format"] = dataframe.ResultFormat.RECORDS
 
             self.assertDictEqual(deserialized_payload, payload)
             expand_data.assert_called_once()
 
+        query_mock = mock.Mock()
+        query_mock.database.db_engine_spec = db_engine_spec
+        deserialized_payload = views._deserialize_results_payload(
+            serialized_payload,
+            query_mock,
+            use_new_deserialization,
+            dataframe.ResultFormat.COLUMNAR,
+        )
+        self.assertEqual(
+            dataframe.ResultFormat.COLUMNAR, deserialized_payload["result_format"]
+        )
+        self.assertEqual(
+            [["a", 4, 4.0, "2019-08-18T16:39:16.660000"]], deserialized_payload["data"]
+        )
+
+    @mock.patch.dict(
+        "superset._feature_flags", {"PRESTO_EXPAND_DATA": True}, clear=True
+    )
+    def test_format_results_nested_columns(self):
+        df = pd.DataFrame({"array_column": [[1, 2], [3]]})
+        columns = [{"name": "array_column", "type": "ARRAY(BIGINT)"}]
+        data, all_columns, expanded_columns, result_format = views._format_results(
+            df, columns, PrestoEngineSpec, dataframe.ResultFormat.COLUMNAR
+        )
+        # the arrays are unnested on records
+        self.assertEqual(dataframe.ResultFormat.RECORDS, result_format)
+        self.assertEqual(
+            [{"array_column": 1}, {"array_column": 2}, {"array_column": 3}], data
+        )
+        self.assertEqual(columns, all_columns)
+
+        with mock.patch.dict("superset._feature_flags", {}, clear=True):
+            data, _, _, result_format = views._format_results(
+                df, columns, PrestoEngineSpec, dataframe.ResultFormat.COLUMNAR
+            )
+        self.assertEqual(dataframe.ResultFormat.COLUMNAR, result_format)
+
+    def test_results_payload_chunks(self):
+        data = [("a", 1), ("b", 2), ("c", 3)]
+        cursor_descr = (("a", "string"), ("b", "int"))
+        db_engine_spec = BaseEngineSpec()
+        query_mock = mock.Mock()
+        query_mock.database.db_engine_spec = db_engine_spec
+        for use_msgpack in (False, True):
+            cdf = dataframe.SupersetDataFrame(data, cursor_descr, db_engine_spec)
+            serialized_data, selected_columns, all_columns, expanded_columns = sql_lab._serialize_and_expand_data(
+                cdf, db_engine_spec, use_msgpack
+            )
+            payload = {
+                "data": serialized_data,
+                "columns": all_columns,
+                "selected_columns": selected_columns,
+                "expanded_columns": expanded_columns,
+            }
+            serialized_payload = sql_lab._serialize_payload(payload, use_msgpack)
+
+            chunks = list(
+                views._deserialize_results_payload_chunks(
+                    serialized_payload, query_mock, use_msgpack, 2
+                )
+            )
+            self.assertEqual([2, 1], [len(df.index) for df in chunks])
+            self.assertEqual(
+                [["a", 1], ["b", 2], ["c", 3]],
+                pd.concat(chunks).values.tolist(),
+            )
+            self.assertEqual(["a", "b"], list(chunks[0].columns))
+
+            cdf = dataframe.SupersetDataFrame([], cursor_descr, db_engine_spec)
+            serialized_data, selected_columns, all_columns, expanded_columns = sql_lab._serialize_and_expand_data(
+                cdf, db_engine_spec, use_msgpack
+            )
+            payload.update(
+                {
+                    "data": serialized_data,
+                    "columns": all_columns,
+                    "selected_columns": selected_columns,
+                }
+            )
+            serialized_payload = sql_lab._serialize_payload(payload, use_msgpack)
+            chunks = list(
+                views._deserialize_results_payload_chunks(
+                    serialized_payload, query_mock, use_msgpack, 2
+                )
+            )
+            self.assertEqual([0], [len(df.index) for df in chunks])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,102 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the dashboard PDF export"""
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from werkzeug.contrib.cache import SimpleCache
+
+from superset.tasks import dashboard_pdf
+
+URL = "http://localhost:8088/superset/dashboard/1/"
+
+
+class DashboardPdfTests(unittest.TestCase):
+    def setUp(self):
+        self.reports_dir = tempfile.mkdtemp()
+        self.patches = [
+            mock.patch.object(dashboard_pdf, "cache", SimpleCache()),
+            mock.patch.object(dashboard_pdf, "REPORTS_DIR", self.reports_dir),
+            mock.patch.dict(dashboard_pdf.config, {"PDF_EXPORT_ASYNC": True}),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def touch(self, file_name):
+        path = dashboard_pdf.get_file_path(file_name)
+        open(path, "w").close()
+        return path
+
+    @mock.patch.object(dashboard_pdf, "render_dashboard_pdf_task")
+    def test_concurrent_requests_share_a_job(self, render_task):
+        render_task.AsyncResult.return_value.successful.return_value = False
+        render_task.AsyncResult.return_value.failed.return_value = False
+
+        first = dashboard_pdf.request_dashboard_pdf(URL, "a", "Null", "")
+        second = dashboard_pdf.request_dashboard_pdf(URL, "b", "Null", "")
+        other_tab = dashboard_pdf.request_dashboard_pdf(URL, "c", "TAB", "")
+
+        self.assertEqual(dashboard_pdf.PdfStatus.PENDING, first["status"])
+        self.assertEqual(first["task_id"], second["task_id"])
+        self.assertNotEqual(first["task_id"], other_tab["task_id"])
+        self.assertEqual(2, render_task.apply_async.call_count)
+
+    @mock.patch.object(dashboard_pdf, "render_dashboard_pdf_task")
+    def test_cached_pdf(self, render_task):
+        render_task.AsyncResult.return_value.successful.return_value = True
+        render_task.AsyncResult.return_value.result = {"file_name": "a"}
+        self.touch("a")
+
+        dashboard_pdf.request_dashboard_pdf(URL, "a", "Null", "")
+        data = dashboard_pdf.request_dashboard_pdf(URL, "b", "Null", "")
+        self.assertEqual(dashboard_pdf.PdfStatus.SUCCESS, data["status"])
+        self.assertEqual("a", data["file_name"])
+
+        # the file got pruned, the dashboard is rendered again
+        os.remove(dashboard_pdf.get_file_path("a"))
+        data = dashboard_pdf.request_dashboard_pdf(URL, "b", "Null", "")
+        self.assertEqual(dashboard_pdf.PdfStatus.PENDING, data["status"])
+        self.assertEqual(2, render_task.apply_async.call_count)
+
+    @mock.patch.object(dashboard_pdf, "render_dashboard_pdf_task")
+    def test_job_not_queued(self, render_task):
+        render_task.apply_async.side_effect = ConnectionError("broker is down")
+        with self.assertRaises(ConnectionError):
+            dashboard_pdf.request_dashboard_pdf(URL, "a", "Null", "")
+
+        # the next request queues its own job instead of waiting on the lost one
+        render_task.apply_async.side_effect = None
+        data = dashboard_pdf.request_dashboard_pdf(URL, "b", "Null", "")
+        self.assertEqual(dashboard_pdf.PdfStatus.PENDING, data["status"])
+        self.assertEqual(
+            data["task_id"], render_task.apply_async.call_args[1]["task_id"]
+        )
+        self.assertEqual(2, render_task.apply_async.call_count)
+
+    def test_prune_dashboard_pdfs(self):
+        old = self.touch("old")
+        os.utime(old, (time.time() - 120, time.time() - 120))
+        self.touch("new")
+        self.assertEqual(1, dashboard_pdf.prune_dashboard_pdfs(max_age=60))
+        self.assertEqual(["new.pdf"], os.listdir(self.reports_dir))
@@ -84,6 +84,33 @@ class DashboardTests(SupersetTestCase):
         self.assertIn("standalone_mode&#34;: true", resp)
         self.assertIn('<body class="standalone">', resp)
 
+    def test_dashboard_data_cache_invalidation(self):
+        self.login(username="admin")
+        dash = db.session.query(models.Dashboard).filter_by(slug="births").first()
+        url = f"/superset/dashboard/{dash.id}/?json=true"
+        slc = dash.slices[0]
+        slice_name = slc.slice_name
+        datasource = slc.datasource
+        description = datasource.description
+
+        data = self.get_json_resp(url)
+        slice_names = [s["slice_name"] for s in data["dashboard_data"]["slices"]]
+        self.assertIn(slice_name, slice_names)
+
+        slc.slice_name = "Renamed slice"
+        datasource.description = "Updated description"
+        db.session.commit()
+        data = self.get_json_resp(url)
+        slice_names = [s["slice_name"] for s in data["dashboard_data"]["slices"]]
+        self.assertIn("Renamed slice", slice_names)
+        self.assertEqual(
+            "Updated description", data["datasources"][datasource.uid]["description"]
+        )
+
+        slc.slice_name = slice_name
+        datasource.description = description
+        db.session.commit()
+
     def test_save_dash(self, username="admin"):
         self.login(username=username)
         dash = db.session.query(models.Dashboard).filter_by(slug="births").first()
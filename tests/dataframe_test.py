@@ -20,6 +20,7 @@ import pandas as pd
 from superset.dataframe import dedup, SupersetDataFrame
 from superset.db_engine_specs import BaseEngineSpec
 from superset.db_engine_specs.presto import PrestoEngineSpec
+from superset.utils.core import JS_MAX_INTEGER
 from .base_tests import SupersetTestCase
 
 
@@ -156,3 +157,40 @@ class SupersetDataFrameTestCase(SupersetTestCase):
         cdf = SupersetDataFrame(data, cursor_descr, PrestoEngineSpec)
         self.assertEqual(cdf.raw_df.dtypes[0], np.dtype("O"))
         self.assertEqual(cdf.raw_df.dtypes[1], pd.Int64Dtype())
+
+    def test_chunked_data(self):
+        data = [("a", 1, None), ("b", None, 2.5), ("c", 3, 4.0)]
+        cursor_descr = (("a", "varchar"), ("b", "integer"), ("c", "double"))
+        for engine_spec in (BaseEngineSpec, PrestoEngineSpec):
+            cdf = SupersetDataFrame(data, cursor_descr, engine_spec)
+            chunked_cdf = SupersetDataFrame(
+                iter([data[:2], data[2:]]), cursor_descr, engine_spec
+            )
+            pd.testing.assert_frame_equal(chunked_cdf.raw_df, cdf.raw_df)
+
+        cdf = SupersetDataFrame(iter([]), cursor_descr, BaseEngineSpec)
+        self.assertEqual(cdf.size, 0)
+        self.assertEqual(cdf.column_names, ["a", "b", "c"])
+
+    def test_format_data(self):
+        big = JS_MAX_INTEGER + 1
+        df = pd.DataFrame(
+            {
+                "a": ["x", big],
+                "b": [1, -big],
+                "c": pd.Series([big, 2], dtype=pd.Int64Dtype()),
+                "d": pd.to_datetime(["2019-01-01", None]),
+            },
+            columns=["a", "b", "c", "d"],
+        )
+        records = SupersetDataFrame.format_data(df)
+        self.assertEqual(
+            [{"a": "x", "b": 1, "c": str(big)}, {"a": str(big), "b": str(-big), "c": 2}],
+            [{k: r[k] for k in ("a", "b", "c")} for r in records],
+        )
+        self.assertEqual(pd.Timestamp("2019-01-01"), records[0]["d"])
+        self.assertIs(pd.NaT, records[1]["d"])
+
+        columnar = SupersetDataFrame.format_columnar(df)
+        self.assertEqual(["a", "b", "c", "d"], columnar["columns"])
+        self.assertEqual([list(r.values()) for r in records], columnar["data"])
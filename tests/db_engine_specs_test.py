@@ -21,6 +21,7 @@ import pandas as pd
 from sqlalchemy import column, literal_column, table
 from sqlalchemy.dialects import mssql, oracle, postgresql
 from sqlalchemy.engine.result import RowProxy
+from sqlalchemy.engine.url import make_url
 from sqlalchemy.sql import select
 from sqlalchemy.types import String, UnicodeText
 
@@ -37,6 +38,7 @@ from superset.db_engine_specs.postgres import PostgresEngineSpec
 from superset.db_engine_specs.presto import PrestoEngineSpec
 from superset.db_engine_specs.sqlite import SqliteEngineSpec
 from superset.models.core import Database
+from superset.utils import partition_cache
 from superset.utils.core import get_example_database
 from .base_tests import SupersetTestCase
 
@@ -194,6 +196,15 @@ class DbEngineSpecsTestCase(SupersetTestCase):
         self.assertEqual(engine_spec_class.get_limit_from_sql(q10), None)
         self.assertEqual(engine_spec_class.get_limit_from_sql(q11), None)
 
+    def test_fetch_data_chunks(self):
+        cursor = mock.Mock()
+        rows = [(i,) for i in range(5)]
+        cursor.fetchmany.side_effect = lambda size: [
+            rows.pop(0) for _ in range(min(size, len(rows)))
+        ]
+        chunks = list(BaseEngineSpec.fetch_data_chunks(cursor, 100, 2))
+        self.assertEqual(chunks, [[(0,), (1,)], [(2,), (3,)], [(4,)]])
+
     def test_wrapped_query(self):
         self.sql_limit_regex(
             "SELECT * FROM a",
@@ -627,6 +638,68 @@ class DbEngineSpecsTestCase(SupersetTestCase):
         self.assertEqual(actual_data, expected_data)
         self.assertEqual(actual_expanded_cols, expected_expanded_cols)
 
+    @mock.patch.dict(
+        "superset._feature_flags", {"PRESTO_EXPAND_DATA": True}, clear=True
+    )
+    def test_presto_expand_data_with_multiple_array_columns(self):
+        cols = [
+            {"name": "array_a", "type": "ARRAY(BIGINT)"},
+            {"name": "array_b", "type": "ARRAY(BIGINT)"},
+        ]
+        data = [
+            {"array_a": [1], "array_b": [10, 11]},
+            {"array_a": [2, 3], "array_b": [12, 13]},
+            {"array_a": [4, 5], "array_b": None},
+        ]
+        actual_cols, actual_data, actual_expanded_cols = PrestoEngineSpec.expand_data(
+            cols, data
+        )
+        expected_data = [
+            {"array_a": 1, "array_b": 10},
+            {"array_a": "", "array_b": 11},
+            {"array_a": 2, "array_b": 12},
+            {"array_a": 3, "array_b": 13},
+            {"array_a": 4, "array_b": None},
+            {"array_a": 5, "array_b": ""},
+        ]
+        self.assertEqual(actual_cols, cols)
+        self.assertEqual(actual_data, expected_data)
+        self.assertEqual(actual_expanded_cols, [])
+
+    @mock.patch("superset.db_engine_specs.presto.time")
+    @mock.patch("superset.utils.query_status.shared_cache")
+    def test_presto_handle_cursor_publishes_progress(self, shared_cache, time):
+        shared_cache.get.return_value = None
+        cursor = mock.Mock()
+        cursor.poll.side_effect = [
+            {"stats": {"state": "RUNNING", "completedSplits": 1, "totalSplits": 4}},
+            {"stats": {"state": "RUNNING", "completedSplits": 2, "totalSplits": 4}},
+            {"stats": {"state": "FINISHED"}},
+        ]
+        query = mock.Mock(id=1, progress=0)
+        session = mock.Mock()
+        PrestoEngineSpec.handle_cursor(cursor, query, session)
+
+        progress_keys = [c[0][:2] for c in shared_cache.set.call_args_list]
+        self.assertEqual(
+            progress_keys,
+            [("sqllab_query_progress_1", 25.0), ("sqllab_query_progress_1", 50.0)],
+        )
+        # the progress is written to the database once, when done polling
+        session.commit.assert_called_once()
+        self.assertEqual(query.progress, 50.0)
+        session.query.assert_not_called()
+
+    @mock.patch("superset.db_engine_specs.presto.time")
+    @mock.patch("superset.utils.query_status.shared_cache")
+    def test_presto_handle_cursor_stop(self, shared_cache, time):
+        shared_cache.get.return_value = True
+        cursor = mock.Mock()
+        cursor.poll.return_value = {"stats": {"state": "RUNNING"}}
+        PrestoEngineSpec.handle_cursor(cursor, mock.Mock(id=1), mock.Mock())
+        shared_cache.get.assert_called_once_with("sqllab_query_stopped_1")
+        cursor.cancel.assert_called_once()
+
     def test_presto_extra_table_metadata(self):
         db = mock.Mock()
         db.get_indexes = mock.Mock(return_value=[{"column_names": ["ds", "hour"]}])
@@ -650,6 +723,52 @@ class DbEngineSpecsTestCase(SupersetTestCase):
         query_result = str(result.compile(compile_kwargs={"literal_binds": True}))
         self.assertEqual("SELECT  \nWHERE ds = '01-01-19' AND hour = 1", query_result)
 
+    def test_presto_latest_partition_is_cached(self):
+        db = mock.Mock(id=-1)
+        db.get_indexes = mock.Mock(return_value=[{"column_names": ["ds"]}])
+        db.get_df = mock.Mock(return_value=pd.DataFrame({"ds": ["01-01-19"]}))
+        for _ in range(2):
+            self.assertEqual(
+                (["ds"], ("01-01-19",)),
+                PrestoEngineSpec.latest_partition("test_table", "test_schema", db),
+            )
+        db.get_df.assert_called_once()
+
+        partition_cache.invalidate(db, "test_schema", "test_table")
+        PrestoEngineSpec.latest_partition("test_table", "test_schema", db)
+        self.assertEqual(db.get_df.call_count, 2)
+
+        # the other tables of the database are left alone
+        partition_cache.invalidate(db, "test_schema", "other_table")
+        PrestoEngineSpec.latest_partition("test_table", "test_schema", db)
+        self.assertEqual(db.get_df.call_count, 2)
+
+        partition_cache.invalidate(db)
+        PrestoEngineSpec.latest_partition("test_table", "test_schema", db)
+        self.assertEqual(db.get_df.call_count, 3)
+
+    def test_partition_cache_default_schema(self):
+        db = mock.Mock(id=-1, db_engine_spec=PrestoEngineSpec)
+        db.url_object = make_url("presto://localhost/hive/test_schema")
+        dependencies = partition_cache._dependencies(db, "test_schema", "test_table")
+        self.assertEqual(
+            dependencies, partition_cache._dependencies(db, None, "test_table")
+        )
+        self.assertEqual(
+            dependencies,
+            partition_cache._dependencies(db, None, "test_schema.test_table"),
+        )
+
+    def test_get_default_schema(self):
+        for engine_spec, uri, schema in [
+            (PrestoEngineSpec, "presto://localhost/hive/test_schema", "test_schema"),
+            (PrestoEngineSpec, "presto://localhost/hive", None),
+            (HiveEngineSpec, "hive://localhost/test_schema", "test_schema"),
+            (HiveEngineSpec, "hive://localhost", "default"),
+            (BaseEngineSpec, "sqlite://", None),
+        ]:
+            self.assertEqual(schema, engine_spec.get_default_schema(make_url(uri)))
+
     def test_hive_get_view_names_return_empty_list(self):
         self.assertEquals(
             [], HiveEngineSpec.get_view_names(mock.ANY, mock.ANY, mock.ANY)
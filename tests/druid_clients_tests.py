@@ -0,0 +1,93 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the shared Druid sessions"""
+import unittest
+from unittest.mock import Mock, patch
+
+import requests
+
+from superset.connectors.druid.clients import (
+    DruidClientRegistry,
+    DruidClusterUnavailable,
+)
+from superset.connectors.druid.models import DruidCluster
+
+
+class DruidClientRegistryTests(unittest.TestCase):
+    def setUp(self):
+        self.registry = DruidClientRegistry(
+            version_ttl=60, failure_threshold=2, retry_after=30
+        )
+        self.cluster = DruidCluster(
+            cluster_name="test_cluster", broker_host="localhost", broker_port=7980
+        )
+
+    def response(self, status_code=200, payload=None):
+        response = Mock(status_code=status_code)
+        response.json.return_value = payload
+        return response
+
+    @patch("requests.Session.request")
+    def test_version_is_cached(self, request):
+        request.return_value = self.response(payload={"version": "0.15.0"})
+        self.assertEqual("0.15.0", self.registry.get_version(self.cluster))
+        self.assertEqual("0.15.0", self.registry.get_version(self.cluster))
+        self.assertEqual(1, request.call_count)
+
+        with patch("time.time", return_value=1e12):
+            self.registry.get_version(self.cluster)
+        self.assertEqual(2, request.call_count)
+
+    @patch("superset.connectors.druid.clients.SessionPyDruid")
+    def test_time_boundary_is_cached(self, PyDruid):
+        time_boundary = PyDruid.return_value.time_boundary
+        time_boundary.return_value = [{"result": {"maxTime": "2016-01-01"}}]
+        for _ in range(2):
+            self.assertEqual(
+                "2016-01-01", self.registry.get_time_boundary(self.cluster, "ds")
+            )
+        time_boundary.return_value = []
+        self.assertIsNone(self.registry.get_time_boundary(self.cluster, "other"))
+        self.assertEqual(2, time_boundary.call_count)
+
+    @patch("requests.Session.request")
+    def test_clients_share_the_session(self, request):
+        first = self.registry.get_client(self.cluster)
+        second = self.registry.get_client(self.cluster)
+        self.assertIsNot(first, second)
+        self.assertIs(
+            self.registry._get_state(first.cluster),
+            self.registry._get_state(second.cluster),
+        )
+
+    @patch("requests.Session.request")
+    def test_unavailable_cluster_fails_fast(self, request):
+        request.side_effect = requests.ConnectionError("refused")
+        for _ in range(2):
+            with self.assertRaises(requests.ConnectionError):
+                self.registry.get_version(self.cluster)
+        with self.assertRaises(DruidClusterUnavailable):
+            self.registry.get_version(self.cluster)
+        self.assertEqual(2, request.call_count)
+        self.assertFalse(self.registry.health()["test_cluster"]["available"])
+
+    @patch("requests.Session.request")
+    def test_query_errors_dont_count_as_failures(self, request):
+        request.return_value = self.response(status_code=500)
+        for _ in range(3):
+            self.registry.request(self.cluster, "POST", "http://localhost:7980")
+        self.assertEqual(0, self.registry.health()["test_cluster"]["failures"])
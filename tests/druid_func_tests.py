@@ -16,7 +16,10 @@
 # under the License.
 import json
 import unittest
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
+
+from dateutil import tz
+import pandas as pd
 
 try:
     from pydruid.utils.dimensions import (
@@ -1090,3 +1093,70 @@ class DruidFuncTestCase(unittest.TestCase):
         self.assertRaises(
             SupersetException, ds.get_aggregations, metrics_dict, metric_names
         )
+
+    @unittest.skipUnless(
+        SupersetTestCase.is_module_installed("pydruid"), "pydruid not installed"
+    )
+    def test_add_filter_from_pre_query_data_single_dimension(self):
+        ds = DruidDatasource(datasource_name="datasource")
+        df = pd.DataFrame({"col1": ["a", "b", "a", None], "count": [4, 3, 2, 1]})
+        f = ds._add_filter_from_pre_query_data(df, ["col1"], None)
+        self.assertEqual("in", f.filter["filter"]["type"])
+        self.assertEqual("col1", f.filter["filter"]["dimension"])
+        self.assertEqual(["a", "b", None], f.filter["filter"]["values"])
+
+    @unittest.skipUnless(
+        SupersetTestCase.is_module_installed("pydruid"), "pydruid not installed"
+    )
+    def test_add_filter_from_pre_query_data_multiple_dimensions(self):
+        ds = DruidDatasource(datasource_name="datasource")
+        df = pd.DataFrame(
+            {"col1": ["a", "a", "a"], "col2": ["x", "y", "x"], "count": [3, 2, 1]}
+        )
+        dim_filter = Mock()
+        f = ds._add_filter_from_pre_query_data(df, ["col1", "col2"], dim_filter)
+        self.assertEqual("and", f.filter["filter"]["type"])
+        ff, other = f.filter["filter"]["fields"]
+        self.assertIs(dim_filter, other)
+        terms = [
+            {
+                field.filter["filter"]["dimension"]: field.filter["filter"]["value"]
+                for field in term.filter["filter"]["fields"]
+            }
+            for term in ff.filter["filter"]["fields"]
+        ]
+        self.assertEqual(
+            [{"col1": "a", "col2": "x"}, {"col1": "a", "col2": "y"}], terms
+        )
+
+    def test_increment_timestamps(self):
+        timestamps = pd.Series(
+            ["2019-01-05T00:00:00.000Z", "2019-01-12T00:00:00.000Z"]
+        )
+        week_ending_saturday = DruidDatasource.time_offset("week_ending_saturday")
+        shifted = DruidDatasource.increment_timestamps(timestamps, week_ending_saturday)
+        self.assertEqual(
+            [
+                pd.Timestamp("2019-01-11", tz=models.DRUID_TZ),
+                pd.Timestamp("2019-01-18", tz=models.DRUID_TZ),
+            ],
+            shifted.tolist(),
+        )
+
+    def test_increment_timestamps_non_utc(self):
+        druid_tz = tz.gettz("America/Los_Angeles")
+        timestamps = pd.Series(
+            ["2019-01-05T00:00:00.000-08:00", "2019-01-12T00:00:00.000-08:00"]
+        )
+        week_ending_saturday = DruidDatasource.time_offset("week_ending_saturday")
+        with patch.object(models, "DRUID_TZ", druid_tz):
+            shifted = DruidDatasource.increment_timestamps(
+                timestamps, week_ending_saturday
+            )
+        self.assertEqual(
+            [
+                pd.Timestamp("2019-01-11", tz=druid_tz),
+                pd.Timestamp("2019-01-18", tz=druid_tz),
+            ],
+            shifted.tolist(),
+        )
@@ -28,6 +28,7 @@ try:
         DruidColumn,
         DruidDatasource,
         DruidMetric,
+        fetch_latest_metadata,
     )
 except ImportError:
     pass
@@ -138,7 +139,7 @@ class DruidTests(SupersetTestCase):
     @unittest.skipUnless(
         SupersetTestCase.is_module_installed("pydruid"), "pydruid not installed"
     )
-    @patch("superset.connectors.druid.models.PyDruid")
+    @patch("superset.connectors.druid.clients.SessionPyDruid")
     def test_client(self, PyDruid):
         self.login(username="admin")
         cluster = self.get_cluster(PyDruid)
@@ -327,7 +328,7 @@ class DruidTests(SupersetTestCase):
     @unittest.skipUnless(
         SupersetTestCase.is_module_installed("pydruid"), "pydruid not installed"
     )
-    @patch("superset.connectors.druid.models.PyDruid")
+    @patch("superset.connectors.druid.clients.SessionPyDruid")
     def test_sync_druid_perm(self, PyDruid):
         self.login(username="admin")
         instance = PyDruid.return_value
@@ -373,7 +374,7 @@ class DruidTests(SupersetTestCase):
     @unittest.skipUnless(
         SupersetTestCase.is_module_installed("pydruid"), "pydruid not installed"
     )
-    @patch("superset.connectors.druid.models.PyDruid")
+    @patch("superset.connectors.druid.clients.SessionPyDruid")
     def test_refresh_metadata(self, PyDruid):
         self.login(username="admin")
         cluster = self.get_cluster(PyDruid)
@@ -403,7 +404,7 @@ class DruidTests(SupersetTestCase):
     @unittest.skipUnless(
         SupersetTestCase.is_module_installed("pydruid"), "pydruid not installed"
     )
-    @patch("superset.connectors.druid.models.PyDruid")
+    @patch("superset.connectors.druid.clients.SessionPyDruid")
     def test_refresh_metadata_augment_type(self, PyDruid):
         self.login(username="admin")
         cluster = self.get_cluster(PyDruid)
@@ -438,7 +439,53 @@ class DruidTests(SupersetTestCase):
     @unittest.skipUnless(
         SupersetTestCase.is_module_installed("pydruid"), "pydruid not installed"
     )
-    @patch("superset.connectors.druid.models.PyDruid")
+    @patch("superset.connectors.druid.clients.SessionPyDruid")
+    def test_refresh_metadata_timings(self, PyDruid):
+        self.login(username="admin")
+        cluster = self.get_cluster(PyDruid)
+        timings = cluster.refresh_datasources()
+        self.assertEqual(["test_datasource"], list(timings))
+        columns = {col.column_name for col in cluster.datasources[0].columns}
+        self.assertEqual({"dim1", "dim2", "metric1"}, columns)
+
+        # only the new datasources get scanned
+        instance = PyDruid.return_value
+        instance.segment_metadata.reset_mock()
+        self.assertEqual({}, cluster.refresh_datasources(refresh_all=False))
+        instance.segment_metadata.assert_not_called()
+
+    @unittest.skipUnless(
+        SupersetTestCase.is_module_installed("pydruid"), "pydruid not installed"
+    )
+    @patch("superset.connectors.druid.clients.SessionPyDruid")
+    def test_fetch_latest_metadata_scans_all_segments(self, PyDruid):
+        cluster = self.get_cluster(PyDruid)
+        instance = PyDruid.return_value
+        with patch(
+            "superset.connectors.druid.models.druid_clients.get_time_boundary",
+            return_value="2016-01-01",
+        ):
+            # the latest segment starts at the max time
+            instance.segment_metadata.side_effect = [[], SEGMENT_METADATA]
+            columns = fetch_latest_metadata(cluster, "test_datasource", False)
+            self.assertEqual(SEGMENT_METADATA[0]["columns"], columns)
+            intervals = [
+                call[1]["intervals"]
+                for call in instance.segment_metadata.call_args_list
+            ]
+            self.assertEqual(
+                ["2015-12-25T00:00:00/2016-01-01T00:00:00", "1901-01-01/2050-01-01"],
+                intervals,
+            )
+
+            instance.segment_metadata.side_effect = [IOError(), SEGMENT_METADATA]
+            columns = fetch_latest_metadata(cluster, "test_datasource", False)
+            self.assertEqual(SEGMENT_METADATA[0]["columns"], columns)
+
+    @unittest.skipUnless(
+        SupersetTestCase.is_module_installed("pydruid"), "pydruid not installed"
+    )
+    @patch("superset.connectors.druid.clients.SessionPyDruid")
     def test_refresh_metadata_augment_verbose_name(self, PyDruid):
         self.login(username="admin")
         cluster = self.get_cluster(PyDruid)
@@ -491,7 +538,7 @@ class DruidTests(SupersetTestCase):
     @unittest.skipUnless(
         SupersetTestCase.is_module_installed("pydruid"), "pydruid not installed"
     )
-    @patch("superset.connectors.druid.models.PyDruid")
+    @patch("superset.connectors.druid.clients.SessionPyDruid")
     def test_druid_time_granularities(self, PyDruid):
         self.login(username="admin")
         cluster = self.get_cluster(PyDruid)
@@ -552,7 +599,7 @@ class DruidTests(SupersetTestCase):
     @unittest.skipUnless(
         SupersetTestCase.is_module_installed("pydruid"), "pydruid not installed"
     )
-    @patch("superset.connectors.druid.models.PyDruid")
+    @patch("superset.connectors.druid.clients.SessionPyDruid")
     def test_external_metadata(self, PyDruid):
         self.login(username="admin")
         self.login(username="admin")
@@ -0,0 +1,70 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the registry of pooled engines"""
+import unittest
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+from superset.utils.engine_registry import EngineRegistry
+
+
+class EngineRegistryTests(unittest.TestCase):
+    def setUp(self):
+        self.registry = EngineRegistry(max_engines=2)
+
+    def tearDown(self):
+        self.registry.clear()
+
+    def get_engine(self, database_id, fingerprint="a", user_name=None):
+        return self.registry.get_engine(
+            database_id,
+            fingerprint,
+            None,
+            user_name,
+            None,
+            lambda: create_engine("sqlite://", poolclass=QueuePool),
+        )
+
+    def test_engines_are_reused(self):
+        engine = self.get_engine(1)
+        self.assertIs(engine, self.get_engine(1))
+        self.assertIsNot(engine, self.get_engine(1, user_name="gamma"))
+        self.assertIsNot(engine, self.get_engine(2))
+
+    def test_settings_change_invalidates_engines(self):
+        self.registry.max_engines = 10
+        engine = self.get_engine(1)
+        self.get_engine(1, user_name="gamma")
+        other = self.get_engine(2)
+
+        self.assertIsNot(engine, self.get_engine(1, fingerprint="b"))
+        self.assertEqual(
+            [(1, None), (2, None)],
+            sorted((s["database_id"], s["user_name"]) for s in self.registry.stats()),
+        )
+        self.assertIs(other, self.get_engine(2))
+
+    def test_least_recently_used_idle_engines_are_evicted(self):
+        first = self.get_engine(1)
+        second = self.get_engine(2)
+        with second.connect():
+            self.get_engine(1)
+            self.get_engine(3)
+            self.get_engine(4)
+        self.assertEqual([4, 2], [s["database_id"] for s in self.registry.stats()])
+        self.assertIsNot(first, self.get_engine(1))
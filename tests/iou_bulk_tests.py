@@ -0,0 +1,197 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the IOU bulk api helpers"""
+from datetime import datetime
+import io
+import unittest
+from unittest import mock
+
+from superset.iou import bulk, views
+from superset.iou.models import DropdownBoolean, IOUBlacklist, Subscriber
+from .base_tests import SupersetTestCase
+from .utils import create_iou_session
+
+
+class IouBulkTests(unittest.TestCase):
+    def test_read_rows(self):
+        csv_file = io.BytesIO(b"subscriber_id,loans_disabled\n1,true\n2,no\n")
+        self.assertEqual(
+            [
+                {"subscriber_id": "1", "loans_disabled": "true"},
+                {"subscriber_id": "2", "loans_disabled": "no"},
+            ],
+            bulk.read_rows(file=csv_file),
+        )
+        self.assertEqual([{"a": 1}], bulk.read_rows(data=[{"a": 1}]))
+        with self.assertRaises(bulk.BulkRowError):
+            bulk.read_rows(data={"a": 1})
+
+    def test_validate(self):
+        def validate_row(row):
+            return {
+                "subscriber_id": bulk.to_int(row, "subscriber_id"),
+                "loans_disabled": bulk.to_bool(row, "loans_disabled"),
+            }
+
+        rows = [
+            {"subscriber_id": "1", "loans_disabled": "true"},
+            {"subscriber_id": "x", "loans_disabled": "true"},
+            {"subscriber_id": "2", "loans_disabled": "maybe"},
+            {"loans_disabled": "0"},
+            {"subscriber_id": "1", "loans_disabled": "0"},
+        ]
+        valid, errors = bulk.validate(rows, validate_row)
+        self.assertEqual({1: {"subscriber_id": 1, "loans_disabled": False}}, valid)
+        self.assertEqual([2, 3, 4], [error["row"] for error in errors])
+
+    def test_batches(self):
+        self.assertEqual([[1, 2], [3]], list(bulk.batches(iter([1, 2, 3]), 2)))
+
+
+class IouBulkOperationsTests(unittest.TestCase):
+    def setUp(self):
+        self.session = create_iou_session()
+        patch = mock.patch.object(bulk, "db")
+        patch.start().session = self.session
+        self.addCleanup(patch.stop)
+        self.addCleanup(self.session.close)
+
+    def get_blacklist(self):
+        return self.session.query(
+            IOUBlacklist.subscriber_id, IOUBlacklist.opted_out, IOUBlacklist.note
+        ).all()
+
+    def test_upsert_blacklist(self):
+        self.session.add_all(
+            [DropdownBoolean(id=1, value="Yes"), DropdownBoolean(id=2, value="No")]
+        )
+        # inserted without the ORM, whose events write dates as strings
+        self.session.execute(
+            IOUBlacklist.__table__.insert(),
+            {
+                "subscriber_id": 1,
+                "opted_out": 2,
+                "note": "opted in",
+                "last_updated_dt": datetime(2019, 1, 1),
+            },
+        )
+        self.session.commit()
+        rows = [
+            {"subscriber_id": "1", "blacklisted": "yes", "note": "fraud"},
+            {"subscriber_id": "2", "blacklisted": "1", "note": "asked to"},
+            {"subscriber_id": "3", "blacklisted": "maybe", "note": "fraud"},
+            {"subscriber_id": "4", "blacklisted": "no", "note": ""},
+        ]
+        summaries = []
+
+        def fail_second_batch(batch, summary):
+            summaries.append(summary)
+            if len(summaries) == 2:
+                raise Exception("the second batch failed")
+
+        with self.assertRaises(Exception):
+            bulk.upsert_blacklist(rows, 1, on_batch=fail_second_batch)
+        # the first batch got rolled back along with the second one
+        self.assertEqual([(1, 2, "opted in")], self.get_blacklist())
+
+        summaries = []
+        result = bulk.upsert_blacklist(
+            rows, 1, on_batch=lambda batch, summary: summaries.append(summary)
+        )
+        self.assertEqual(1, result["inserted"])
+        self.assertEqual(1, result["updated"])
+        self.assertEqual([3, 4], [error["row"] for error in result["errors"]])
+        self.assertEqual(
+            [{"inserted": 0, "updated": 1}, {"inserted": 1, "updated": 0}], summaries
+        )
+        self.assertEqual([(1, 1, "fraud"), (2, 1, "asked to")], self.get_blacklist())
+
+    def test_update_loans_disabled(self):
+        for subscriber_id in [1, 2]:
+            self.session.add(
+                Subscriber(
+                    subscriber_id=subscriber_id,
+                    msisdn=str(subscriber_id),
+                    company_brand_id=1,
+                    first_seen_dt=datetime(2019, 1, 1),
+                    last_seen_dt=datetime(2019, 1, 1),
+                    loans_disabled=False,
+                )
+            )
+        self.session.commit()
+        rows = [
+            {"subscriber_id": "1", "loans_disabled": "yes"},
+            {"subscriber_id": "9", "loans_disabled": "no"},
+            {"subscriber_id": "x", "loans_disabled": "no"},
+            {"subscriber_id": "2", "loans_disabled": "0"},
+        ]
+        result = bulk.update_loans_disabled(rows, 2)
+        self.assertEqual(
+            {
+                "updated": 2,
+                "errors": [
+                    {"row": 2, "error": "Unknown subscriber_id: 9"},
+                    {"row": 3, "error": "Invalid subscriber_id: x"},
+                ],
+            },
+            result,
+        )
+        self.assertEqual(
+            [(1, True), (2, False)],
+            self.session.query(Subscriber.subscriber_id, Subscriber.loans_disabled)
+            .order_by(Subscriber.subscriber_id)
+            .all(),
+        )
+
+
+class IouBulkApiTests(SupersetTestCase):
+    def post_rows(self, bulk_operation):
+        with mock.patch.object(
+            views.IOUBlacklistView, "bulk_operation", staticmethod(bulk_operation)
+        ), mock.patch.object(views.IOUBlacklistView, "audit_log") as audit_log:
+            resp = self.client.post(
+                "/ioublacklistview/api/bulk/",
+                json=[{"subscriber_id": 1}, {"subscriber_id": 2}],
+            )
+        return resp, [call[0][3:] for call in audit_log.call_args_list]
+
+    def test_bulk(self):
+        self.login("admin")
+
+        def apply_rows(rows, batch_size, on_batch=None):
+            for row in rows:
+                on_batch([row], {"updated": 1})
+            return {"updated": len(rows), "errors": []}
+
+        resp, audit_logs = self.post_rows(apply_rows)
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual({"updated": 2, "errors": []}, resp.json)
+        self.assertEqual([True, True], [success for success, _, _ in audit_logs])
+        self.assertEqual('{"updated": 1}', audit_logs[0][2])
+
+    def test_bulk_rolled_back(self):
+        self.login("admin")
+
+        def fail_second_batch(rows, batch_size, on_batch=None):
+            on_batch(rows[:1], {"updated": 1})
+            raise Exception("the second batch failed")
+
+        resp, audit_logs = self.post_rows(fail_second_batch)
+        self.assertEqual(500, resp.status_code)
+        # the first batch isn't reported as applied
+        self.assertEqual([False, False], [success for success, _, _ in audit_logs])
+        self.assertEqual("the second batch failed", audit_logs[-1][2])
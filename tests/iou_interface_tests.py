@@ -0,0 +1,131 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the paginated IOU lists"""
+from datetime import datetime
+import unittest
+
+from itsdangerous import URLSafeSerializer
+
+from superset.iou.interface import IouSQLAInterface
+from superset.iou.models import Subscriber
+from .base_tests import SupersetTestCase
+from .utils import create_iou_session
+
+
+class IouSQLAInterfaceTests(unittest.TestCase):
+    def setUp(self):
+        self.session = create_iou_session()
+        # the subscribers seen on the same day share their sort value
+        for subscriber_id, day in [(5, 1), (1, 1), (3, 1), (2, 2), (4, 2), (6, 3)]:
+            self.session.add(
+                Subscriber(
+                    subscriber_id=subscriber_id,
+                    msisdn=str(subscriber_id),
+                    company_brand_id=1,
+                    first_seen_dt=datetime(2019, 1, 1),
+                    last_seen_dt=datetime(2019, 1, day),
+                )
+            )
+        self.session.commit()
+        self.interface = IouSQLAInterface(
+            Subscriber, session=self.session, count_limit=4
+        )
+
+    def tearDown(self):
+        self.session.close()
+
+    def get_pages(self, order_direction, order_column="last_seen_dt"):
+        pages = []
+        after = None
+        while True:
+            items, after = self.interface.query_keyset(
+                order_column=order_column,
+                order_direction=order_direction,
+                after=after,
+                page_size=2,
+            )
+            pages.append([item.subscriber_id for item in items])
+            if after is None:
+                return pages
+
+    def test_cursor_round_trip(self):
+        cursor = self.interface.encode_cursor(datetime(2019, 1, 2, 3, 4), 4)
+        self.assertEqual(
+            (datetime(2019, 1, 2, 3, 4), 4),
+            self.interface.decode_cursor("last_seen_dt", cursor),
+        )
+        cursor = self.interface.encode_cursor("628123", 4)
+        self.assertEqual(("628123", 4), self.interface.decode_cursor("msisdn", cursor))
+
+    def test_invalid_cursor(self):
+        cursor = self.interface.encode_cursor("628123", 4)
+        other_cursor = self.interface.encode_cursor("628124", 4)
+        tampered = other_cursor.split(".")[0] + "." + cursor.split(".")[1]
+        foreign = URLSafeSerializer("another key", salt="iou-keyset-cursor").dumps(
+            ["628123", 4]
+        )
+        for invalid in [tampered, foreign, "628123", ""]:
+            with self.assertRaises(ValueError):
+                self.interface.decode_cursor("msisdn", invalid)
+
+    def test_query_keyset(self):
+        # the last page is full, no empty page follows it
+        self.assertEqual([[1, 3], [5, 2], [4, 6]], self.get_pages("asc"))
+        self.assertEqual([[6, 4], [2, 5], [3, 1]], self.get_pages("desc"))
+
+        self.session.query(Subscriber).filter_by(subscriber_id=6).delete()
+        self.session.commit()
+        self.assertEqual([[1, 3], [5, 2], [4]], self.get_pages("asc"))
+        self.assertEqual([[4, 2], [5, 3], [1]], self.get_pages("desc"))
+
+    def test_query_keyset_nulls(self):
+        loans_disabled = {1: None, 2: True, 3: False, 4: None, 5: False, 6: None}
+        for subscriber_id, value in loans_disabled.items():
+            self.session.query(Subscriber).filter_by(
+                subscriber_id=subscriber_id
+            ).update({"loans_disabled": value})
+        self.session.commit()
+        # NULLs come last in ascending order, first in descending order
+        self.assertEqual(
+            [[3, 5], [2, 1], [4, 6]], self.get_pages("asc", "loans_disabled")
+        )
+        self.assertEqual(
+            [[6, 4], [1, 2], [5, 3]], self.get_pages("desc", "loans_disabled")
+        )
+
+    def test_count_limit(self):
+        self.assertEqual(4, self.interface.approximate_count())
+        count, items = self.interface.query(
+            order_column="subscriber_id", order_direction="asc", page=1, page_size=2
+        )
+        self.assertEqual(4, count)
+        self.assertEqual([3, 4], [item.subscriber_id for item in items])
+
+        self.interface.count_limit = 10
+        self.assertEqual(6, self.interface.approximate_count())
+
+
+class IouKeysetApiTests(SupersetTestCase):
+    def test_keyset_invalid_requests(self):
+        self.login("admin")
+        resp = self.client.get("/loanview/api/keyset/?after=invalid")
+        self.assertEqual(400, resp.status_code)
+        resp = self.client.get("/loanview/api/keyset/?page_size=all")
+        self.assertEqual(400, resp.status_code)
+        # the subscribers aren't listed with an IouSQLAInterface
+        resp = self.client.get("/subscriberview/api/keyset/")
+        self.assertEqual(404, resp.status_code)
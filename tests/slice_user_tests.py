@@ -0,0 +1,127 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the slice and dashboard membership sync"""
+from unittest import mock
+
+from sqlalchemy import func, select
+
+from superset import abinitio_security_manager, db, security_manager
+from superset.abinitio_security_manager import (
+    delete_duplicate_memberships,
+    reconcile_slice_n_dashboard_users,
+    SliceUserView,
+    sync_slice_n_dashboard_user,
+)
+from superset.models.core import dashboard_user, slice_user
+
+from .base_tests import SupersetTestCase
+
+
+class SliceUserTests(SupersetTestCase):
+    def setUp(self):
+        self.user_id = security_manager.find_user("gamma").id
+        self.memberships = self.get_memberships()
+
+    def tearDown(self):
+        with db.engine.begin() as conn:
+            conn.execute(
+                slice_user.delete().where(slice_user.c.user_id == self.user_id)
+            )
+            if self.memberships:
+                conn.execute(slice_user.insert(), self.memberships)
+
+    def get_memberships(self):
+        query = select([slice_user.c.user_id, slice_user.c.slice_id]).where(
+            slice_user.c.user_id == self.user_id
+        )
+        with db.engine.connect() as conn:
+            return [dict(row) for row in conn.execute(query)]
+
+    def test_sync_is_idempotent(self):
+        view = SliceUserView("gamma")
+        view.delete_user_in_slice_n_dashboard()
+        view.sync_slice_n_dashboard(True)
+        with db.engine.connect() as conn:
+            slice_ids = {
+                row[0]
+                for row in conn.execute(select([slice_user.c.slice_id]).distinct())
+            }
+        synced = self.get_memberships()
+        self.assertEqual(slice_ids, {row["slice_id"] for row in synced})
+        self.assertEqual(len(slice_ids), len(synced))
+
+        self.assertEqual(0, view.insert_user_in_slice_n_dashboard())
+        self.assertEqual(synced, self.get_memberships())
+
+    def test_delete_duplicate_memberships(self):
+        SliceUserView("gamma").sync_slice_n_dashboard(True)
+        with db.engine.begin() as conn:
+            conn.execute(slice_user.insert(), self.get_memberships()[:1])
+            self.assertEqual(1, delete_duplicate_memberships(conn))
+            duplicates = conn.execute(
+                select([func.count()])
+                .select_from(slice_user)
+                .group_by(slice_user.c.user_id, slice_user.c.slice_id)
+                .having(func.count() > 1)
+            ).fetchall()
+        self.assertEqual([], duplicates)
+
+    def restore_all_memberships(self):
+        # reconciling changes the memberships of all the users
+        tables = (slice_user, dashboard_user)
+        with db.engine.connect() as conn:
+            rows = [
+                [dict(row) for row in conn.execute(table.select())] for table in tables
+            ]
+
+        def restore():
+            with db.engine.begin() as conn:
+                for table, table_rows in zip(tables, rows):
+                    conn.execute(table.delete())
+                    if table_rows:
+                        conn.execute(table.insert(), table_rows)
+
+        self.addCleanup(restore)
+
+    def test_reconcile_leaves_excluded_users_alone(self):
+        self.restore_all_memberships()
+        view = SliceUserView("gamma")
+        view.sync_slice_n_dashboard(True)
+        kept = self.get_memberships()[:1]
+        view.delete_user_in_slice_n_dashboard()
+        with db.engine.begin() as conn:
+            conn.execute(slice_user.insert(), kept)
+        with mock.patch.object(
+            abinitio_security_manager, "MEMBERSHIP_EXCLUDED_ROLE", "Gamma"
+        ):
+            reconcile_slice_n_dashboard_users(db.engine)
+        self.assertEqual(kept, self.get_memberships())
+
+        counts = reconcile_slice_n_dashboard_users(db.engine)
+        self.assertEqual(0, counts["duplicates"])
+        self.assertLess(1, len(self.get_memberships()))
+
+    @mock.patch("superset.tasks.membership.sync_slice_n_dashboard_user_task")
+    def test_sync_without_broker(self, task):
+        task.delay.side_effect = ConnectionError("broker unreachable")
+        SliceUserView("gamma").delete_user_in_slice_n_dashboard()
+        with mock.patch.object(
+            abinitio_security_manager.config, "SLICE_USER_SYNC_ASYNC", True
+        ):
+            sync_slice_n_dashboard_user("gamma", member=True)
+        task.delay.assert_called_once_with("gamma", True)
+        self.assertTrue(self.get_memberships())
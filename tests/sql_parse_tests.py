@@ -17,6 +17,7 @@
 import unittest
 
 from superset import sql_parse
+from superset.utils.lru_cache import LRUCache
 
 
 class SupersetTestCase(unittest.TestCase):
@@ -467,6 +468,36 @@ class SupersetTestCase(unittest.TestCase):
         expected = "SELECT * FROM birth_names LIMIT 1000"
         self.assertEquals(newsql, expected)
 
+    def test_parsed_query_is_cached(self):
+        sql = "SELECT * FROM cached_table LIMIT 555"
+        sql_parse.ParsedQuery(sql)
+        hits = sql_parse.parse_cache.hits
+        parsed = sql_parse.ParsedQuery(sql + ";\n")
+        self.assertEquals(sql_parse.parse_cache.hits, hits + 1)
+        self.assertEquals({"cached_table"}, parsed.tables)
+        self.assertEquals(555, parsed.limit)
+
+        # the shared parse tree isn't modified by the new limits
+        self.assertEquals(
+            parsed.get_query_with_new_limit(1000),
+            "SELECT * FROM cached_table LIMIT 1000",
+        )
+        self.assertEquals(
+            sql_parse.ParsedQuery(sql).get_query_with_new_limit(10),
+            "SELECT * FROM cached_table LIMIT 10",
+        )
+
+    def test_lru_cache(self):
+        cache = LRUCache(2)
+        cache.get("a", lambda: 1)
+        cache.get("b", lambda: 2)
+        self.assertEquals(cache.get("a", lambda: 0), 1)
+        cache.get("c", lambda: 3)
+        # b was the least recently used
+        self.assertEquals(cache.get("b", lambda: 0), 0)
+        self.assertEquals(cache.get("c", lambda: 0), 3)
+        self.assertEquals((cache.hits, cache.misses), (2, 4))
+
     def test_basic_breakdown_statements(self):
         multi_sql = """
         SELECT * FROM birth_names;
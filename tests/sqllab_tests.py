@@ -17,14 +17,21 @@
 """Unit tests for Sql Lab"""
 from datetime import datetime, timedelta
 import json
+import threading
+from unittest import mock
 
 import prison
 
-from superset import db, security_manager
+from superset import db, security_manager, sql_lab
 from superset.dataframe import SupersetDataFrame
 from superset.db_engine_specs import BaseEngineSpec
 from superset.models.sql_lab import Query
-from superset.utils.core import datetime_to_epoch, get_example_database
+from superset.utils import query_status
+from superset.utils.core import (
+    datetime_to_epoch,
+    get_example_database,
+    QueryStatus,
+)
 from .base_tests import SupersetTestCase
 
 QUERY_1 = "SELECT * FROM birth_names LIMIT 1"
@@ -413,3 +420,66 @@ class SqlLabTests(SupersetTestCase):
             {"examples", "fake_db_100"},
             {r.get("database_name") for r in self.get_json_resp(url)["result"]},
         )
+
+    def test_parallel_statements(self):
+        self.login("admin")
+        sql = "SELECT * FROM birth_names LIMIT 1;SELECT * FROM birth_names LIMIT 2"
+        with mock.patch.dict(sql_lab.config, {"SQLLAB_PARALLEL_STATEMENTS": True}):
+            data = self.run_sql(sql, "client_id_parallel")
+        self.assertEqual([1, 2], [result["rows"] for result in data["results"]])
+        self.assertEqual(2, len(data["data"]))
+
+    def test_can_run_in_parallel(self):
+        query = Query(select_as_cta=False)
+        statements = ["SELECT 1", "SELECT 2"]
+        with mock.patch.dict(sql_lab.config, {"SQLLAB_PARALLEL_STATEMENTS": True}):
+            self.assertTrue(sql_lab.can_run_in_parallel(statements, query))
+            self.assertFalse(sql_lab.can_run_in_parallel(statements[:1], query))
+            self.assertFalse(
+                sql_lab.can_run_in_parallel(statements + ["DROP TABLE t"], query)
+            )
+        self.assertFalse(sql_lab.can_run_in_parallel(statements, query))
+
+    @mock.patch.object(sql_lab, "SQLLAB_STOP_POLL_INTERVAL", 0.01)
+    @mock.patch.object(query_status, "shared_cache", None)
+    def test_parallel_statements_stopped_through_database(self):
+        query = Query(
+            client_id="parallel_stop",
+            database=get_example_database(),
+            sql="SELECT 1;SELECT 2",
+            status=QueryStatus.STOPPED,
+        )
+        db.session.add(query)
+        db.session.commit()
+        released = threading.Event()
+
+        def raw_connection():
+            released.wait(5)
+            raise Exception("released")
+
+        engine = mock.Mock()
+        engine.raw_connection.side_effect = raw_connection
+        try:
+            with self.assertRaises(sql_lab.SqlLabQueryStoppedException):
+                sql_lab.execute_sql_statements_in_parallel(
+                    ["SELECT 1", "SELECT 2"], query, None, db.session, engine
+                )
+        finally:
+            released.set()
+            db.session.delete(query)
+            db.session.commit()
+
+    def test_local_stop_requests_expire(self):
+        with mock.patch.dict(
+            query_status.config, {"SQLLAB_ASYNC_TIME_LIMIT_SEC": -1}
+        ), mock.patch.object(query_status, "shared_cache", None):
+            query_status.request_stop(1001)
+            self.assertFalse(query_status.is_stop_requested(1001))
+            query_status.request_stop(1002)
+        self.assertNotIn(1001, query_status._local_stop_requests)
+
+        query_status.request_stop(1003)
+        self.assertTrue(query_status.is_stop_requested(1003))
+        query_status.clear(1003)
+        self.assertFalse(query_status.is_stop_requested(1003))
+        query_status.clear(1002)
@@ -16,16 +16,26 @@
 # under the License.
 """Unit tests for Superset cache warmup"""
 import json
+import threading
+import time
+from unittest import mock
 from unittest.mock import MagicMock
 
+from werkzeug.contrib.cache import SimpleCache
+
 from superset import db
 from superset.models.core import Log
 from superset.models.tags import get_tag, ObjectTypes, TaggedObject, TagTypes
+from superset.tasks import cache as cache_tasks
 from superset.tasks.cache import (
+    CostAwareStrategy,
     DashboardTagsStrategy,
     get_form_data,
+    get_warmup_items,
     TopNDashboardsStrategy,
+    warm_up_charts,
 )
+from superset.utils.chart_cache import ChartDataCache, PickleChartCacheSerializer
 from .base_tests import SupersetTestCase
 
 
@@ -209,3 +219,97 @@ class CacheWarmUpTests(SupersetTestCase):
         result = sorted(strategy.get_urls())
         expected = sorted(tag1_urls + tag2_urls)
         self.assertEqual(result, expected)
+
+    def test_get_warmup_items(self):
+        dash = self.get_dash_by_slug("births")
+        charts = [(slc, dash) for slc in dash.slices]
+        items = get_warmup_items(charts + charts)
+        self.assertEqual(len(dash.slices), len(items))
+        for item, slc in zip(items, dash.slices):
+            self.assertEqual(slc.id, item["chart_id"])
+            self.assertEqual(slc.viz_type, item["form_data"]["viz_type"])
+            self.assertEqual(f"Database_{slc.datasource.database.id}", item["database"])
+
+    def test_warm_up_charts_per_database_limit(self):
+        running = {"a": 0, "b": 0}
+        peaks = {"a": 0, "b": 0}
+        lock = threading.Lock()
+
+        def warm_up_chart(item, deadline=None):
+            with lock:
+                running[item["database"]] += 1
+                peaks[item["database"]] = max(
+                    peaks[item["database"]], running[item["database"]]
+                )
+            time.sleep(0.01)
+            with lock:
+                running[item["database"]] -= 1
+            return {"chart_id": item["chart_id"], "status": "miss"}
+
+        items = [
+            {"chart_id": i, "database": "a" if i % 2 else "b"} for i in range(12)
+        ]
+        with mock.patch.object(cache_tasks, "warm_up_chart", warm_up_chart):
+            results = warm_up_charts(items, max_workers=6, max_workers_per_database=2)
+        self.assertEqual(list(range(12)), [r["chart_id"] for r in results])
+        self.assertEqual({"a": 2, "b": 2}, peaks)
+
+    def test_cost_aware_strategy_requests(self):
+        db.session.query(Log).delete()
+
+        def log(slice_id, duration_ms, form_data):
+            record = {"form_data": json.dumps(form_data)}
+            db.session.add(
+                Log(
+                    action="explore_json",
+                    slice_id=slice_id,
+                    duration_ms=duration_ms,
+                    json=json.dumps(record),
+                )
+            )
+
+        for _ in range(3):
+            log(1, 100, {"slice_id": 1})
+        log(1, 5000, {"slice_id": 1})
+        log(2, 200, {"slice_id": 2, "extra_filters": []})
+        log(2, 300, {"slice_id": 2})
+        db.session.commit()
+
+        requests = CostAwareStrategy(since="1 day ago").get_requests(db.session)
+        self.assertEqual(
+            [(1, 4, 5.0), (2, 1, 0.2), (2, 1, 0.3)],
+            sorted((r["chart_id"], r["hits"], r["cost"]) for r in requests),
+        )
+        # most requested first
+        self.assertEqual(1, requests[0]["chart_id"])
+
+    def test_stale_chart_cache_entries(self):
+        backend = SimpleCache()
+        serializer = PickleChartCacheSerializer()
+        chart_data_cache = ChartDataCache(
+            backend, serializer, mock.Mock(), stale_timeout=60
+        )
+        flask_cache = mock.Mock(cache=backend, get=backend.get)
+        with mock.patch.object(cache_tasks, "cache", flask_cache), mock.patch.object(
+            cache_tasks, "chart_data_cache", chart_data_cache
+        ), mock.patch.object(cache_tasks, "chart_cache_serializer", serializer):
+            value = {"df": None, "dttm": "2019-01-01T00:00:00", "query": ""}
+            chart_data_cache.store("key", value, 10)
+            self.assertTrue(cache_tasks.is_fresh("key"))
+            self.assertLessEqual(cache_tasks.get_time_to_live("key", 10), 10)
+            with mock.patch("time.time", return_value=time.time() + 11):
+                # kept in the cache to be served while it's refreshed
+                self.assertTrue(backend.has("key"))
+                self.assertFalse(cache_tasks.is_fresh("key"))
+                self.assertEqual(0, cache_tasks.get_time_to_live("key", 10))
+            self.assertFalse(cache_tasks.is_fresh("missing"))
+            self.assertEqual(0, cache_tasks.get_time_to_live("missing", 10))
+
+            # Redis tells the time to live, which includes the stale timeout
+            backend._client = mock.Mock()
+            backend._client.ttl.return_value = 100
+            self.assertTrue(cache_tasks.is_fresh("key"))
+            self.assertEqual(40, cache_tasks.get_time_to_live("key", 10))
+            backend._client.ttl.return_value = 30
+            self.assertFalse(cache_tasks.is_fresh("key"))
+            self.assertEqual(0, cache_tasks.get_time_to_live("key", 10))
@@ -17,6 +17,11 @@
 import json
 from os import path
 
+from sqlalchemy import create_engine, MetaData
+from sqlalchemy.orm import sessionmaker
+
+from superset import db
+
 FIXTURES_DIR = "tests/fixtures"
 
 
@@ -27,3 +32,17 @@ def read_fixture(fixture_file_name):
 
 def load_fixture(fixture_file_name):
     return json.loads(read_fixture(fixture_file_name))
+
+
+def create_iou_session():
+    """Returns a session on an in-memory SQLite database holding the IOU tables"""
+    engine = create_engine("sqlite://")
+    metadata = MetaData()
+    for table in db.Model.metadata.sorted_tables:
+        if table.info.get("bind_key") == "iou":
+            table = table.tometadata(metadata)
+            for column in table.columns:
+                # defaults such as sysdate() can't be compiled for SQLite
+                column.server_default = None
+    metadata.create_all(engine)
+    return sessionmaker(bind=engine)()
@@ -16,6 +16,7 @@
 # under the License.
 from datetime import date, datetime, time, timedelta
 from decimal import Decimal
+import threading
 import unittest
 from unittest.mock import patch
 import uuid
@@ -36,6 +37,7 @@ from superset.utils.core import (
     get_or_create_db,
     get_since_until,
     get_stacktrace,
+    is_shared_cache,
     json_int_dttm_ser,
     json_iso_dttm_ser,
     JSONEncodedDict,
@@ -44,6 +46,7 @@ from superset.utils.core import (
     merge_request_params,
     parse_human_timedelta,
     parse_js_uri_path_item,
+    run_concurrently,
     parse_past_timedelta,
     setup_cache,
     split,
@@ -832,6 +835,26 @@ class UtilsTestCase(unittest.TestCase):
 
         assert isinstance(setup_cache(app, init_cache), CustomCache) is True
 
+    def test_is_shared_cache(self):
+        self.assertFalse(is_shared_cache(None))
+        self.assertFalse(is_shared_cache({"CACHE_TYPE": "null"}))
+        self.assertFalse(is_shared_cache({"CACHE_TYPE": "simple"}))
+        self.assertTrue(is_shared_cache({"CACHE_TYPE": "redis"}))
+        self.assertTrue(is_shared_cache(lambda app: None))
+
+    def test_run_concurrently(self):
+        b_started = threading.Event()
+
+        def run(item):
+            if item == "b":
+                b_started.set()
+                return item
+            # the items of "a" don't hold the threads "b" needs
+            return item if b_started.wait(5) else None
+
+        results = run_concurrently(run, ["a", "a", "a", "b"], lambda item: item, 2, 1)
+        self.assertEqual([(0, "a"), (1, "a"), (2, "a"), (3, "b")], sorted(results))
+
     def test_get_stacktrace(self):
         with app.app_context():
             app.config["SHOW_STACKTRACE"] = True
@@ -0,0 +1,66 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""Unit tests for the versioned cache"""
+import unittest
+from unittest.mock import Mock
+
+from werkzeug.contrib.cache import SimpleCache
+
+from superset.utils.versioned_cache import VersionedCache
+
+
+class VersionedCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.cache = VersionedCache(SimpleCache(), Mock(), timeout=60)
+        self.computed = []
+
+    def compute(self, names):
+        self.computed += names
+        return {name: f"{name}_{len(self.computed)}" for name in names}
+
+    def get_many(self, entries):
+        return self.cache.get_many(entries, self.compute)
+
+    def test_values_are_cached(self):
+        entries = {"a": ["x", "y"], "b": ["y"]}
+        self.assertEqual({"a": "a_2", "b": "b_2"}, self.get_many(entries))
+        self.assertEqual({"a": "a_2", "b": "b_2"}, self.get_many(entries))
+        self.assertEqual(["a", "b"], self.computed)
+
+    def test_invalidate(self):
+        entries = {"a": ["x", "y"], "b": ["y"], "c": ["z"]}
+        self.get_many(entries)
+        self.cache.invalidate(["y"])
+        self.assertEqual({"a": "a_5", "b": "b_5", "c": "c_3"}, self.get_many(entries))
+        self.assertEqual(["a", "b", "c", "a", "b"], self.computed)
+
+    def test_disabled(self):
+        self.cache = VersionedCache(SimpleCache(), Mock(), timeout=None)
+        self.get_many({"a": ["x"]})
+        self.get_many({"a": ["x"]})
+        self.assertEqual(["a", "a"], self.computed)
+
+    def test_shared_between_instances(self):
+        # another process, invalidating through its own instance
+        backend = SimpleCache()
+        self.cache = VersionedCache(backend, Mock(), timeout=60)
+        other = VersionedCache(backend, Mock(), timeout=60)
+        self.get_many({"a": ["x"]})
+        other.invalidate(["x"])
+        self.assertEqual({"a": "a_2"}, self.get_many({"a": ["x"]}))
+        self.assertEqual({"a": "a_2"}, other.get_many({"a": ["x"]}, self.compute))
+        self.assertEqual(["a", "a"], self.computed)
@@ -17,6 +17,8 @@
 from datetime import datetime
 from unittest.mock import Mock, patch
 import uuid
+from xml.etree import ElementTree
+import zipfile
 
 import numpy as np
 import pandas as pd
@@ -157,6 +159,112 @@ class BaseVizTestCase(SupersetTestCase):
         test_viz = viz.BaseViz(datasource, form_data={})
         self.assertEqual(app.config["CACHE_DEFAULT_TIMEOUT"], test_viz.cache_timeout)
 
+    def test_get_max_widths(self):
+        datasource = self.get_datasource_mock()
+        test_viz = viz.BaseViz(datasource, form_data={})
+        df = pd.DataFrame(
+            {"a": ["x", None, "xxxx"], "long_name": [1, 22, 333], "c": ["x" * 200] * 3}
+        )
+        self.assertEqual([4, 9, 100], test_viz.get_max_widths(df))
+        self.assertEqual([1, 9, 100], test_viz.get_max_widths(df.iloc[:0]))
+
+    @patch.dict(viz.config, {"XLSX_COLUMN_WIDTH_SAMPLE_SIZE": 10})
+    def test_sample_rows(self):
+        test_viz = viz.BaseViz(self.get_datasource_mock(), form_data={})
+        df = pd.DataFrame({"a": range(19)})
+        self.assertEqual(10, len(test_viz.sample_rows(df)))
+        self.assertEqual([0, 2, 4], list(test_viz.sample_rows(df)["a"])[:3])
+        self.assertEqual(10, len(test_viz.sample_rows(df.iloc[:10])))
+
+    @staticmethod
+    def read_xlsx_cells(output):
+        """Returns the text of the written cells of the first sheet by reference"""
+        namespace = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+        with zipfile.ZipFile(output) as workbook:
+            sheet = ElementTree.fromstring(workbook.read("xl/worksheets/sheet1.xml"))
+        return {
+            cell.get("r"): "".join(cell.itertext())
+            for cell in sheet.iter(namespace + "c")
+        }
+
+    @patch.dict(viz.config, {"XLSX_EXPORT_CHUNK_SIZE": 2})
+    def test_write_xlsx(self):
+        test_viz = viz.BaseViz(self.get_datasource_mock(), form_data={})
+        df = pd.DataFrame(
+            {"name": ["a", "b", None, "d", "e"], "value": [1, 2, 3, 4, 5]}
+        )
+        cells = self.read_xlsx_cells(test_viz.write_xlsx(df))
+        self.assertEqual("name", cells["A1"])
+        self.assertEqual("value", cells["B1"])
+        # rows on either side of the chunk boundaries
+        self.assertEqual(["a", "b", "d", "e"], [cells[f"A{i}"] for i in (2, 3, 5, 6)])
+        self.assertEqual(
+            ["1", "2", "3", "4", "5"], [cells[f"B{i}"] for i in range(2, 7)]
+        )
+        self.assertNotIn("A4", cells)
+        self.assertNotIn("A7", cells)
+
+    @patch.dict(viz.config, {"XLSX_EXPORT_CHUNK_SIZE": 2})
+    def test_write_xlsx_index_and_objects(self):
+        test_viz = viz.BaseViz(self.get_datasource_mock(), form_data={})
+        df = pd.DataFrame(
+            {"value": [{"x": 1}, [2], 3]}, index=pd.Index(["i", "j", "k"], name="key")
+        )
+        cells = self.read_xlsx_cells(test_viz.write_xlsx(df, include_index=True))
+        self.assertEqual(["key", "value"], [cells["A1"], cells["B1"]])
+        self.assertEqual(["i", "j", "k"], [cells[f"A{i}"] for i in range(2, 5)])
+        self.assertEqual(
+            ["{'x': 1}", "[2]", "3"], [cells[f"B{i}"] for i in range(2, 5)]
+        )
+
+    def test_write_xlsx_empty(self):
+        test_viz = viz.BaseViz(self.get_datasource_mock(), form_data={})
+        cells = self.read_xlsx_cells(test_viz.write_xlsx(pd.DataFrame({"a": []})))
+        self.assertEqual({"A1": "a"}, cells)
+
+    def get_pdf_html(self, df):
+        """Exports a chart with the given data to pdf and returns the html
+        handed to weasyprint for each chunk"""
+        test_viz = viz.BaseViz(self.get_datasource_mock(), form_data={})
+        test_viz.get_df = Mock(return_value=df)
+        with patch("superset.viz.weasyprint") as weasyprint:
+            weasyprint.HTML.return_value.render.return_value.pages = ["page"]
+            pdf = test_viz.get_pdf()
+        document = weasyprint.HTML.return_value.render.return_value
+        document.copy.assert_called_once_with(
+            ["page"] * len(weasyprint.HTML.call_args_list)
+        )
+        self.assertEqual(document.copy.return_value.write_pdf.return_value, pdf)
+        return [call[1]["string"] for call in weasyprint.HTML.call_args_list]
+
+    @patch.dict(viz.config, {"CHART_TO_PDF_ROW_LIMIT": 5, "CHART_TO_PDF_CHUNK_SIZE": 2})
+    def test_get_pdf(self):
+        df = pd.DataFrame({"name": [f"row{i}" for i in range(7)]})
+        html = self.get_pdf_html(df)
+        self.assertEqual(3, len(html))
+        self.assertIn("<p>Showing the first 5 out of 7 rows</p>", html[0])
+        self.assertNotIn("Showing the first", html[1] + html[2])
+        self.assertIn("row0", html[0])
+        self.assertIn("row1", html[0])
+        self.assertNotIn("row2", html[0])
+        self.assertIn("row2", html[1])
+        self.assertIn("row3", html[1])
+        self.assertIn("row4", html[2])
+        self.assertNotIn("row5", "".join(html))
+
+    @patch.dict(viz.config, {"CHART_TO_PDF_ROW_LIMIT": 5, "CHART_TO_PDF_CHUNK_SIZE": 2})
+    def test_get_pdf_within_row_limit(self):
+        df = pd.DataFrame({"name": [f"row{i}" for i in range(4)]})
+        html = self.get_pdf_html(df)
+        self.assertEqual(2, len(html))
+        self.assertNotIn("Showing the first", "".join(html))
+
+    def test_get_pdf_empty(self):
+        html = self.get_pdf_html(pd.DataFrame({"name": []}))
+        self.assertEqual(1, len(html))
+        self.assertIn("<th>name</th>", html[0])
+        self.assertNotIn("Showing the first", html[0])
+
 
 class TableVizTestCase(SupersetTestCase):
     def test_get_data_applies_percentage(self):